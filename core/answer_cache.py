@@ -0,0 +1,80 @@
+import json
+from typing import Callable, Dict, Optional
+
+import numpy as np
+from django.conf import settings
+
+from .retrieval import embed_query
+
+# Fields of a stored answer that follow from the retrieved context alone. A
+# cache hit may come from another user's conversation, so nothing else of it
+# (their question, their expanded query, timings) is passed on.
+SHARED_ANSWER_FIELDS = ("thinking_process", "answer", "references", "context_hash", "language")
+
+
+def question_vector(vectorstore, question: str) -> np.ndarray:
+    """Unit-length question embedding (through the query cache, so usually already computed by retrieval)"""
+    vector = np.array(embed_query(vectorstore, question), dtype=np.float32)
+    norm = np.linalg.norm(vector)
+    return vector / norm if norm else vector
+
+
+def embedding_model_name(vectorstore) -> str:
+    return getattr(vectorstore.embedding_function, "name", type(vectorstore.embedding_function).__name__)
+
+
+def find_cached_answer(conversations, vectorstore, question: str, context_hash: str,
+                       expanded_query: Optional[str] = None) -> Optional[Dict]:
+    """Most similar earlier answer from conversations built on the same retrieved context.
+
+    conversations is a PDFConversation/YouTubeConversation queryset already
+    limited to the same document. Only rows whose context_hash matches, i.e.
+    whose answer was generated from exactly the chunks retrieved now, and
+    whose question embedding (same embedding model) is within
+    ANSWER_CACHE_SIMILARITY cosine similarity are considered. The hit carries
+    only SHARED_ANSWER_FIELDS of the stored answer, with this request's
+    question and expanded_query.
+    """
+    rows = list(
+        conversations.filter(
+            context_hash=context_hash,
+            embedding_model=embedding_model_name(vectorstore),
+            question_embedding__isnull=False
+        ).order_by('-created_at').values_list('answer', 'question_embedding')[:settings.ANSWER_CACHE_MAX_CANDIDATES]
+    )
+    if not rows:
+        return None
+
+    query = question_vector(vectorstore, question)
+    stored = np.stack([np.frombuffer(blob, dtype=np.float32) for _, blob in rows])
+    similarities = stored @ query
+    best = int(np.argmax(similarities))
+    if similarities[best] < settings.ANSWER_CACHE_SIMILARITY:
+        return None
+
+    stored_answer = json.loads(rows[best][0])
+    return {
+        "question": question,
+        "expanded_query": expanded_query,
+        **{field: stored_answer[field] for field in SHARED_ANSWER_FIELDS if field in stored_answer},
+        "cached": True,
+        "cache_similarity": round(float(similarities[best]), 4),
+    }
+
+
+def answer_lookup(conversations, vectorstore, question: str) -> Callable[..., Optional[Dict]]:
+    """The lookup_answer(context_hash, expanded_query) hook for a processor's answer_question / stream_answer"""
+    return lambda context_hash, expanded_query=None: find_cached_answer(
+        conversations, vectorstore, question, context_hash, expanded_query
+    )
+
+
+def conversation_cache_fields(vectorstore, question: str, answer: Dict) -> Dict:
+    """Fields that make a new conversation row findable by find_cached_answer"""
+    if not answer.get("context_hash"):
+        return {}
+    return {
+        "context_hash": answer["context_hash"],
+        "embedding_model": embedding_model_name(vectorstore),
+        "question_embedding": question_vector(vectorstore, question).tobytes(),
+    }
@@ -6,11 +6,12 @@ from django.contrib.auth import get_user_model
 from rest_framework.permissions import AllowAny
 from django.middleware.csrf import get_token
 from rest_framework.decorators import api_view
-from django.http import JsonResponse
+from django.http import JsonResponse, StreamingHttpResponse
 from .pdf_processor import PDFProcessor
 import os
+import hashlib
 from django.conf import settings
-from .models import UserPDF, PDFConversation, ChapterGeneration
+from .models import UserPDF, PDFConversation, ChapterGeneration, IngestionJob
 import json
 from .firebase_auth import FirebaseAuthentication
 from rest_framework.permissions import IsAuthenticated
@@ -23,6 +24,20 @@ from .yt_processor import YouTubeProcessor
 from .models import ChapterVideoResource, ChapterWebResource
 from .utils import get_video_resources, get_web_resources   
 from django.contrib.auth import get_user_model
+from .ingestion import ingest_pdf, ingest_youtube
+from .jobs import enqueue_job
+from .store_cache import get_store_cache
+from .embedding_cache import get_embedding_cache
+from .query_cache import get_query_cache
+from .llm_client import get_llm_client
+from .llm_router import get_llm_router
+from .streaming import sse_event
+from .timings import get_stage_timings
+from .answer_cache import answer_lookup, conversation_cache_fields
+from .batch_qa import answer_batch
+from .store_registry import delete_store, registry_stats
+from .library import SOURCE_TYPES, library_reference, search_library, update_library
+from rest_framework.permissions import IsAdminUser
 
 
 
@@ -30,6 +45,112 @@ from django.contrib.auth import get_user_model
 User = get_user_model()
 
 
+def parse_bool(value):
+    """Interpret a JSON or multipart form flag"""
+    if isinstance(value, str):
+        return value.strip().lower() in ('1', 'true', 'yes', 'on')
+    return bool(value)
+
+
+def retrieval_params(data):
+    """Optional k / fetch_k / lambda for answer retrieval, clamped to the server limits.
+
+    Missing values are left as None so the retrieval defaults apply. Raises
+    ValueError for values that are not numbers.
+    """
+    params = {'k': None, 'fetch_k': None, 'lambda_mult': None}
+    try:
+        if data.get('k') not in (None, ''):
+            params['k'] = min(max(int(data.get('k')), 1), settings.RETRIEVAL_MAX_K)
+        if data.get('fetch_k') not in (None, ''):
+            params['fetch_k'] = min(
+                max(int(data.get('fetch_k')), params['k'] or settings.RETRIEVAL_K),
+                settings.RETRIEVAL_MAX_FETCH_K
+            )
+        if data.get('lambda') not in (None, ''):
+            params['lambda_mult'] = min(max(float(data.get('lambda')), 0.0), 1.0)
+    except (TypeError, ValueError):
+        raise ValueError('k and fetch_k must be integers and lambda a number between 0 and 1')
+    return params
+
+
+def batch_questions(value):
+    """The questions list of a batch request; raises ValueError unless it is 1..BATCH_QA_MAX_QUESTIONS non-empty strings"""
+    if isinstance(value, str):
+        # Multipart forms send the list as JSON text
+        try:
+            value = json.loads(value)
+        except ValueError:
+            raise ValueError('questions must be a list of strings')
+    if not isinstance(value, list) or not value:
+        raise ValueError('questions must be a non-empty list of strings')
+    if len(value) > settings.BATCH_QA_MAX_QUESTIONS:
+        raise ValueError(f'At most {settings.BATCH_QA_MAX_QUESTIONS} questions can be asked in one batch')
+    if not all(isinstance(question, str) and question.strip() for question in value):
+        raise ValueError('questions must be a non-empty list of strings')
+    return value
+
+
+def batch_conversations(model, vectorstore, results, **owner):
+    """Unsaved conversation rows for the answered questions of a batch, for one bulk_create"""
+    rows = []
+    for result in results:
+        if not result['status']:
+            continue
+        answer = result['data']
+        answer.setdefault('cached', False)
+        rows.append(model(
+            question=answer['question'],
+            answer=json.dumps(answer),
+            # Served-from-cache rows are not cache sources themselves, so matches never chain
+            **({} if answer['cached'] else conversation_cache_fields(vectorstore, answer['question'], answer)),
+            **owner
+        ))
+    return rows
+
+
+def batch_response(results, timings):
+    answered = sum(1 for result in results if result['status'])
+    return JsonResponse({
+        'status': True,
+        'data': {
+            'results': results,
+            'answered': answered,
+            'failed': len(results) - answered,
+            'timings': timings
+        }
+    })
+
+
+def stream_answer_response(events, save_conversation):
+    """StreamingHttpResponse of Server-Sent Events for a processor's stream_answer().
+
+    Text events carry {"text": ...}; "references" and "done" carry the
+    processor's dicts. The conversation is saved from the "done" payload, so
+    a stream that fails or is abandoned by the client leaves no row; a
+    failure is reported as an "error" event since the 200 is already sent.
+    """
+    def generate():
+        try:
+            for event, data in events:
+                if event == "done":
+                    save_conversation(data)
+                    yield sse_event("done", data)
+                elif event == "references":
+                    yield sse_event("references", data)
+                else:
+                    yield sse_event(event, {"text": data})
+        except Exception as e:
+            print(traceback.format_exc())
+            yield sse_event("error", {"error": str(e), "message": "Failed to answer question"})
+
+    response = StreamingHttpResponse(generate(), content_type="text/event-stream")
+    response['Cache-Control'] = 'no-cache'
+    # Stop nginx from buffering the stream
+    response['X-Accel-Buffering'] = 'no'
+    return response
+
+
 class FirebaseLoginAPI(APIView):
     authentication_classes = [FirebaseAuthentication]
     permission_classes = [AllowAny]
@@ -135,6 +256,24 @@ class ChapterAPI(APIView):
         except Exception as e:
             return JsonResponse({'error': str(e)}, status=500)
         
+class CacheStatsAPI(APIView):
+    authentication_classes = [FirebaseAuthentication]
+    permission_classes = [IsAdminUser]
+
+    def get(self, request):
+        return JsonResponse({
+            'status': True,
+            'data': {
+                'vectorstore_cache': get_store_cache().stats(),
+                'embedding_cache': get_embedding_cache().stats(),
+                'query_cache': get_query_cache().stats(),
+                'llm': get_llm_client().stats(),
+                'llm_router': get_llm_router().stats(),
+                'answer_timings': get_stage_timings().stats(),
+                'vectorstores': registry_stats()
+            }
+        })
+
 @api_view(['GET'])
 def get_csrf_token(request):
     return JsonResponse({'csrfToken': get_token(request)})
@@ -373,22 +512,30 @@ class PDFQAAPI(APIView):
             os.makedirs(upload_dir, exist_ok=True)
             file_path = os.path.join(upload_dir, pdf_file.name)
             
+            # Hash while streaming to disk so identical books can share one store
+            hasher = hashlib.sha256()
             with open(file_path, 'wb+') as destination:
                 for chunk in pdf_file.chunks():
+                    hasher.update(chunk)
                     destination.write(chunk)
-
-            # Process the PDF
-            processor = PDFProcessor()
-            chunks = processor.process_pdf(file_path)
-            store_name = f"book_{request.user.firebase_uid}_{os.path.splitext(pdf_file.name)[0]}"
-            processor.create_vector_store(chunks, store_name)
-            
-            # Save to database
-            user_pdf = UserPDF.objects.create(
-                user=request.user,
-                file_name=pdf_file.name,
-                vector_store=store_name
-            )
+            content_hash = hasher.hexdigest()
+
+            if parse_bool(request.data.get('async')):
+                job = enqueue_job(request.user, IngestionJob.KIND_PDF, {
+                    'file_path': file_path,
+                    'file_name': pdf_file.name,
+                    'content_hash': content_hash
+                })
+                return JsonResponse({
+                    'status': True,
+                    'message': 'PDF queued for processing',
+                    'data': {
+                        'job_id': str(job.id),
+                        'status': job.status
+                    }
+                }, status=status.HTTP_202_ACCEPTED)
+
+            user_pdf = ingest_pdf(request.user, file_path, pdf_file.name, content_hash)
             
             return JsonResponse({
                 'status': True,
@@ -426,14 +573,20 @@ class QuestionAnswerAPI(APIView):
                 {'error': 'Both pdf_id and question are required'},
                 status=status.HTTP_400_BAD_REQUEST
             )
+        try:
+            params = retrieval_params(request.data)
+        except ValueError as e:
+            return JsonResponse({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
 
         try:
             print(f"!! DEBUG: Looking for PDF ID {pdf_id} for user {request.user}")
             user_pdf = UserPDF.objects.get(id=pdf_id, user=request.user)
             print(f"!! DEBUG: Found PDF: {user_pdf.file_name}")
             
+            processor = PDFProcessor()
+
             # Verify vector store exists
-            vs_path = os.path.join(settings.BASE_DIR, "vectorstores", user_pdf.vector_store)
+            vs_path = processor.get_store_path(user_pdf.vector_store)
             print(f"!! DEBUG: Vector store path: {vs_path}")
             
             if not os.path.exists(vs_path):
@@ -443,21 +596,41 @@ class QuestionAnswerAPI(APIView):
                     status=status.HTTP_404_NOT_FOUND
                 )
             
-            processor = PDFProcessor()
             print("!! DEBUG: Loading vector store...")
             vs = processor.load_vector_store(user_pdf.vector_store)
             print("!! DEBUG: Vector store loaded successfully")
             
+            # Conversations of every upload sharing this store; context_hash pins the exact chunks
+            lookup_answer = None
+            if settings.ANSWER_CACHE_ENABLED and not parse_bool(request.data.get('bypass_cache')):
+                lookup_answer = answer_lookup(
+                    PDFConversation.objects.filter(pdf__vector_store=user_pdf.vector_store),
+                    vs,
+                    question
+                )
+
+            def save_conversation(answer):
+                answer.setdefault('cached', False)
+                PDFConversation.objects.create(
+                    pdf=user_pdf,
+                    question=question,
+                    answer=json.dumps(answer),
+                    # Served-from-cache rows are not cache sources themselves, so matches never chain
+                    **({} if answer['cached'] else conversation_cache_fields(vs, question, answer))
+                )
+
+            if parse_bool(request.data.get('stream')):
+                return stream_answer_response(
+                    processor.stream_answer(vs, question, lookup_answer=lookup_answer, **params),
+                    save_conversation
+                )
+
             print("!! DEBUG: Generating answer...")
-            answer = processor.answer_question(vs, question)
+            answer = processor.answer_question(vs, question, lookup_answer=lookup_answer, **params)
             print("!! DEBUG: Answer generated:", answer)
             
             # Save conversation
-            PDFConversation.objects.create(
-                pdf=user_pdf,
-                question=question,
-                answer=json.dumps(answer)
-            )
+            save_conversation(answer)
             
             return JsonResponse({
                 'status': True,
@@ -482,6 +655,58 @@ class QuestionAnswerAPI(APIView):
                 'message': 'Failed to answer question'
             }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
+class BatchQuestionAnswerAPI(APIView):
+    """Answer a list of questions about one PDF: one store load, one batched retrieval, answers in order"""
+    authentication_classes = [FirebaseAuthentication]
+    permission_classes = [IsAuthenticated]
+
+    def post(self, request):
+        pdf_id = request.data.get('pdf_id')
+        if not pdf_id:
+            return JsonResponse(
+                {'error': 'Both pdf_id and questions are required'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        try:
+            questions = batch_questions(request.data.get('questions'))
+            params = retrieval_params(request.data)
+        except ValueError as e:
+            return JsonResponse({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+        try:
+            user_pdf = UserPDF.objects.get(id=pdf_id, user=request.user)
+            processor = PDFProcessor()
+            if not os.path.exists(processor.get_store_path(user_pdf.vector_store)):
+                return JsonResponse(
+                    {'error': 'Vector store not found. Please re-upload the PDF.'},
+                    status=status.HTTP_404_NOT_FOUND
+                )
+            vs = processor.load_vector_store(user_pdf.vector_store)
+
+            lookup_for = None
+            if settings.ANSWER_CACHE_ENABLED and not parse_bool(request.data.get('bypass_cache')):
+                conversations = PDFConversation.objects.filter(pdf__vector_store=user_pdf.vector_store)
+                lookup_for = lambda question: answer_lookup(conversations, vs, question)
+
+            timings = {}
+            results = answer_batch(processor, vs, questions, lookup_for=lookup_for, timings=timings, **params)
+            PDFConversation.objects.bulk_create(batch_conversations(PDFConversation, vs, results, pdf=user_pdf))
+            return batch_response(results, timings)
+
+        except UserPDF.DoesNotExist:
+            return JsonResponse({
+                'status': False,
+                'error': 'PDF not found',
+                'message': 'You do not have access to this PDF'
+            }, status=status.HTTP_404_NOT_FOUND)
+        except Exception as e:
+            print(traceback.format_exc())
+            return JsonResponse({
+                'status': False,
+                'error': str(e),
+                'message': 'Failed to answer questions'
+            }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
 class UserPDFListAPI(APIView):
     authentication_classes = [FirebaseAuthentication]
     permission_classes = [IsAuthenticated]
@@ -524,16 +749,12 @@ class DeletePDFAPI(APIView):
         try:
             user_pdf = UserPDF.objects.get(id=pdf_id, user=request.user)
             
-            # Delete vector store
-            processor = PDFProcessor()
-            vectorstore_path = os.path.join(
-                settings.BASE_DIR, 
-                "vectorstores", 
-                user_pdf.vector_store
-            )
-            if os.path.exists(vectorstore_path):
-                import shutil
-                shutil.rmtree(vectorstore_path)
+            # Delete vector store once no other upload references it
+            shared_store = user_pdf.shared_store
+            if shared_store:
+                shared_store.release(on_last_reference=lambda: delete_store(user_pdf.vector_store))
+            else:
+                delete_store(user_pdf.vector_store)
             
             # Delete the file
             file_path = os.path.join(
@@ -547,6 +768,7 @@ class DeletePDFAPI(APIView):
             
             # Delete database record
             user_pdf.delete()
+            update_library(request.user)
             
             return JsonResponse({
                 'status': True,
@@ -568,6 +790,84 @@ class DeletePDFAPI(APIView):
 
 
 
+class IngestionJobStatusAPI(APIView):
+    authentication_classes = [FirebaseAuthentication]
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request, job_id):
+        try:
+            job = IngestionJob.objects.get(id=job_id, user=request.user)
+        except IngestionJob.DoesNotExist:
+            return JsonResponse({
+                'status': False,
+                'error': 'Job not found'
+            }, status=status.HTTP_404_NOT_FOUND)
+
+        return JsonResponse({
+            'status': True,
+            'data': {
+                'job_id': str(job.id),
+                'kind': job.kind,
+                'status': job.status,
+                'pages_total': job.pages_total,
+                'pages_parsed': job.pages_parsed,
+                'chunks_total': job.chunks_total,
+                'chunks_embedded': job.chunks_embedded,
+                'progress': round(job.progress_fraction(), 3),
+                'eta_seconds': job.eta_seconds(),
+                'result_id': job.result_id,
+                'error': job.error,
+                'created_at': job.created_at,
+                'started_at': job.started_at,
+                'finished_at': job.finished_at
+            }
+        })
+
+
+class LibrarySearchAPI(APIView):
+    authentication_classes = [FirebaseAuthentication]
+    permission_classes = [IsAuthenticated]
+
+    def post(self, request):
+        query = request.data.get('query')
+        source_type = request.data.get('source_type') or None
+        if not query:
+            return JsonResponse(
+                {'error': 'query is required'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        if source_type is not None and source_type not in SOURCE_TYPES:
+            return JsonResponse(
+                {'error': f"source_type must be one of: {', '.join(SOURCE_TYPES)}"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        try:
+            k = min(max(int(request.data.get('k', 5)), 1), 20)
+        except (TypeError, ValueError):
+            return JsonResponse(
+                {'error': 'k must be an integer'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        try:
+            docs = search_library(request.user, query, k=k, fetch_k=max(25, 5 * k), source_type=source_type)
+            return JsonResponse({
+                'status': True,
+                'data': {
+                    'query': query,
+                    'source_type': source_type,
+                    'references': [library_reference(doc) for doc in docs]
+                }
+            })
+        except Exception as e:
+            print(traceback.format_exc())
+            return JsonResponse({
+                'status': False,
+                'error': str(e),
+                'message': 'Failed to search library'
+            }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+
 class YouTubeVideoAPI(APIView):
     authentication_classes = [FirebaseAuthentication]
     permission_classes = [IsAuthenticated]
@@ -581,24 +881,18 @@ class YouTubeVideoAPI(APIView):
             )
         
         try:
-            processor = YouTubeProcessor()
-            
-            # Process video
-            video_id = processor.extract_video_id(video_url)
-            store_name = f"yt_{request.user.firebase_uid}_{video_id}"
-            
-            # This handles transcript loading and vector store creation
-            processing_result = processor.process_video(video_url, store_name)
-            
-            # Save to database
-            user_video = UserYouTubeVideo.objects.create(
-                user=request.user,
-                video_url=video_url,
-                video_id=video_id,
-                video_title=processing_result['video_info'].get('title', ''),
-                thumbnail_url=processing_result['video_info'].get('thumbnail', ''),
-                vector_store=store_name
-            )
+            if parse_bool(request.data.get('async')):
+                job = enqueue_job(request.user, IngestionJob.KIND_YOUTUBE, {'video_url': video_url})
+                return JsonResponse({
+                    'status': True,
+                    'message': 'YouTube video queued for processing',
+                    'data': {
+                        'job_id': str(job.id),
+                        'status': job.status
+                    }
+                }, status=status.HTTP_202_ACCEPTED)
+
+            user_video = ingest_youtube(request.user, video_url)
             
             return JsonResponse({
                 'status': True,
@@ -631,6 +925,10 @@ class YouTubeQuestionAPI(APIView):
                 {'error': 'Both video_id and question are required'},
                 status=status.HTTP_400_BAD_REQUEST
             )
+        try:
+            params = retrieval_params(request.data)
+        except ValueError as e:
+            return JsonResponse({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
 
         try:
             # Verify video belongs to user
@@ -640,15 +938,36 @@ class YouTubeQuestionAPI(APIView):
             # Load vector store
             vs = processor.load_vector_store(user_video.vector_store)
             
+            # Any user's conversations about the same video; context_hash pins the exact transcript chunks
+            lookup_answer = None
+            if settings.ANSWER_CACHE_ENABLED and not parse_bool(request.data.get('bypass_cache')):
+                lookup_answer = answer_lookup(
+                    YouTubeConversation.objects.filter(video__video_id=user_video.video_id),
+                    vs,
+                    question
+                )
+
+            def save_conversation(answer):
+                answer.setdefault('cached', False)
+                YouTubeConversation.objects.create(
+                    video=user_video,
+                    question=question,
+                    answer=json.dumps(answer),
+                    # Served-from-cache rows are not cache sources themselves, so matches never chain
+                    **({} if answer['cached'] else conversation_cache_fields(vs, question, answer))
+                )
+
+            if parse_bool(request.data.get('stream')):
+                return stream_answer_response(
+                    processor.stream_answer(vs, question, lookup_answer=lookup_answer, **params),
+                    save_conversation
+                )
+
             # Generate answer
-            answer = processor.answer_question(vs, question)
+            answer = processor.answer_question(vs, question, lookup_answer=lookup_answer, **params)
             
             # Save conversation
-            YouTubeConversation.objects.create(
-                video=user_video,
-                question=question,
-                answer=json.dumps(answer)
-            )
+            save_conversation(answer)
             
             return JsonResponse({
                 'status': True,
@@ -668,6 +987,60 @@ class YouTubeQuestionAPI(APIView):
             }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
 
+class YouTubeBatchQuestionAPI(APIView):
+    """Answer a list of questions about one video: one store load, one batched retrieval, answers in order"""
+    authentication_classes = [FirebaseAuthentication]
+    permission_classes = [IsAuthenticated]
+
+    def post(self, request):
+        video_id = request.data.get('video_id')
+        if not video_id:
+            return JsonResponse(
+                {'error': 'Both video_id and questions are required'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        try:
+            questions = batch_questions(request.data.get('questions'))
+            params = retrieval_params(request.data)
+        except ValueError as e:
+            return JsonResponse({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+        try:
+            user_video = UserYouTubeVideo.objects.get(id=video_id, user=request.user)
+            processor = YouTubeProcessor()
+            if not os.path.exists(processor.get_store_path(user_video.vector_store)):
+                return JsonResponse(
+                    {'error': 'Vector store not found. Please re-process the video.'},
+                    status=status.HTTP_404_NOT_FOUND
+                )
+            vs = processor.load_vector_store(user_video.vector_store)
+
+            lookup_for = None
+            if settings.ANSWER_CACHE_ENABLED and not parse_bool(request.data.get('bypass_cache')):
+                conversations = YouTubeConversation.objects.filter(video__video_id=user_video.video_id)
+                lookup_for = lambda question: answer_lookup(conversations, vs, question)
+
+            timings = {}
+            results = answer_batch(processor, vs, questions, lookup_for=lookup_for, timings=timings, **params)
+            YouTubeConversation.objects.bulk_create(
+                batch_conversations(YouTubeConversation, vs, results, video=user_video)
+            )
+            return batch_response(results, timings)
+
+        except UserYouTubeVideo.DoesNotExist:
+            return JsonResponse({
+                'status': False,
+                'error': 'Video not found or access denied'
+            }, status=status.HTTP_404_NOT_FOUND)
+        except Exception as e:
+            print(traceback.format_exc())
+            return JsonResponse({
+                'status': False,
+                'error': str(e),
+                'message': 'Failed to answer questions'
+            }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+
 class YouTubeVideoListAPI(APIView):
     authentication_classes = [FirebaseAuthentication]
     permission_classes = [IsAuthenticated]
@@ -692,17 +1065,11 @@ class YouTubeVideoDeleteAPI(APIView):
             user_video = UserYouTubeVideo.objects.get(id=video_id, user=request.user)
             
             # Delete vector store
-            vectorstore_path = os.path.join(
-                settings.BASE_DIR, 
-                "vectorstores", 
-                user_video.vector_store
-            )
-            if os.path.exists(vectorstore_path):
-                import shutil
-                shutil.rmtree(vectorstore_path)
+            delete_store(user_video.vector_store)
             
             # Delete database record
             user_video.delete()
+            update_library(request.user)
             
             return JsonResponse({
                 'status': True,
@@ -0,0 +1,45 @@
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, List, Optional
+
+from django.conf import settings
+from django.db import connection
+
+from .retrieval import retrieve_batch
+from .timings import timed
+
+
+def answer_batch(processor, vectorstore, questions: List[str], k: Optional[int] = None,
+                 fetch_k: Optional[int] = None, lambda_mult: Optional[float] = None,
+                 lookup_for: Optional[Callable[[str], Callable[[str], Optional[Dict]]]] = None,
+                 timings: Optional[Dict] = None) -> List[Dict]:
+    """Answer several questions on one loaded store, results in question order.
+
+    Retrieval for all questions is one batched embedding and one FAISS
+    search (retrieve_batch); the answers are then generated by
+    processor.answer_from_documents, at most BATCH_QA_CONCURRENCY LLM calls
+    at a time. A question that fails does not fail the batch: its result is
+    {"status": False, "question": ..., "error": ...}, the others are
+    {"status": True, "data": answer}. lookup_for(question) gives the
+    answer-cache lookup for a question, or None to skip the cache.
+    """
+    with timed(timings, "retrieval_ms"):
+        docs_per_question = retrieve_batch(vectorstore, questions, k=k, fetch_k=fetch_k, lambda_mult=lambda_mult,
+                                           timings=timings)
+
+    def answer(index: int) -> Dict:
+        question = questions[index]
+        try:
+            lookup_answer = lookup_for(question) if lookup_for is not None else None
+            data = processor.answer_from_documents(question, docs_per_question[index], question, lookup_answer)
+            data.setdefault("question", question)
+            return {"status": True, "data": data}
+        except Exception as e:
+            print(f"Batch question {index + 1} failed: {str(e)}")
+            return {"status": False, "question": question, "error": str(e)}
+        finally:
+            # Worker threads open their own database connection for the answer cache
+            connection.close()
+
+    with timed(timings, "answer_ms"):
+        with ThreadPoolExecutor(max_workers=max(1, min(settings.BATCH_QA_CONCURRENCY, len(questions)))) as pool:
+            return list(pool.map(answer, range(len(questions))))
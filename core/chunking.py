@@ -0,0 +1,153 @@
+import re
+from bisect import bisect_right
+from collections import deque
+from typing import List, Optional, Tuple
+
+CHUNK_SIZE = 800
+CHUNK_OVERLAP = 200
+
+# (chunk_text, start, end) with text[start:end] == chunk_text
+Chunk = Tuple[str, int, int]
+Span = Tuple[int, int]
+
+
+class OffsetTextSplitter:
+    """RecursiveCharacterTextSplitter that reports where every chunk came from.
+
+    Produces exactly the chunks LangChain's RecursiveCharacterTextSplitter does
+    with its defaults (separators kept at the start of the following piece,
+    whitespace stripped), but works on (start, end) spans of the original text
+    instead of copied strings. Offsets therefore come out of the split itself,
+    in a single pass, and stay correct when the same passage repeats.
+    """
+
+    def __init__(self, chunk_size: int = CHUNK_SIZE, chunk_overlap: int = CHUNK_OVERLAP,
+                 separators: Optional[List[str]] = None):
+        if chunk_overlap > chunk_size:
+            raise ValueError(f"Chunk overlap ({chunk_overlap}) is larger than chunk size ({chunk_size})")
+        self.chunk_size = chunk_size
+        self.chunk_overlap = chunk_overlap
+        self.separators = separators or ["\n\n", "\n", " ", ""]
+
+    def split_text(self, text: str) -> List[str]:
+        return [chunk_text for chunk_text, _, _ in self.split_text_with_offsets(text)]
+
+    def split_text_with_offsets(self, text: str) -> List[Chunk]:
+        spans = self._split_span(text, 0, len(text), self.separators)
+        return [(text[start:end], start, end) for start, end in spans]
+
+    def _split_span(self, text: str, start: int, end: int, separators: List[str]) -> List[Span]:
+        # Use the first separator that occurs in this span, recursing with the rest
+        separator = separators[-1]
+        new_separators = []
+        for i, candidate in enumerate(separators):
+            if candidate == "":
+                separator = candidate
+                break
+            if text.find(candidate, start, end) != -1:
+                separator = candidate
+                new_separators = separators[i + 1:]
+                break
+
+        final_spans = []
+        good_splits = []
+        for split_start, split_end in self._separator_splits(text, start, end, separator):
+            if split_end - split_start < self.chunk_size:
+                good_splits.append((split_start, split_end))
+                continue
+            if good_splits:
+                final_spans.extend(self._merge_splits(text, good_splits))
+                good_splits = []
+            if not new_separators:
+                final_spans.append((split_start, split_end))
+            else:
+                final_spans.extend(self._split_span(text, split_start, split_end, new_separators))
+        if good_splits:
+            final_spans.extend(self._merge_splits(text, good_splits))
+        return final_spans
+
+    @staticmethod
+    def _separator_splits(text: str, start: int, end: int, separator: str) -> List[Span]:
+        """Contiguous pieces of text[start:end], each (but the first) beginning with separator"""
+        if not separator:
+            return [(i, i + 1) for i in range(start, end)]
+        splits = []
+        piece_start = start
+        match = text.find(separator, start, end)
+        while match != -1:
+            if match > piece_start:
+                splits.append((piece_start, match))
+            piece_start = match
+            match = text.find(separator, match + len(separator), end)
+        if end > piece_start:
+            splits.append((piece_start, end))
+        return splits
+
+    def _merge_splits(self, text: str, splits: List[Span]) -> List[Span]:
+        """Greedily pack adjacent pieces into chunks, carrying up to chunk_overlap chars over"""
+        spans = []
+        current = deque()
+        total = 0
+        for split_start, split_end in splits:
+            length = split_end - split_start
+            if total + length > self.chunk_size and current:
+                span = self._strip_span(text, current[0][0], current[-1][1])
+                if span is not None:
+                    spans.append(span)
+                while total > self.chunk_overlap or (total + length > self.chunk_size and total > 0):
+                    popped_start, popped_end = current.popleft()
+                    total -= popped_end - popped_start
+            current.append((split_start, split_end))
+            total += length
+        if current:
+            span = self._strip_span(text, current[0][0], current[-1][1])
+            if span is not None:
+                spans.append(span)
+        return spans
+
+    @staticmethod
+    def _strip_span(text: str, start: int, end: int) -> Optional[Span]:
+        while start < end and text[start].isspace():
+            start += 1
+        while end > start and text[end - 1].isspace():
+            end -= 1
+        if start == end:
+            return None
+        return start, end
+
+
+class CleanedText:
+    """Result of dropping separator-only lines from a text, with an offset map back to it.
+
+    The cleaning is the same as the processors' clean_text; source_offset()
+    translates a position in the cleaned text to the matching position in the
+    original one.
+    """
+
+    def __init__(self, source: str):
+        kept_lines = []
+        source_pos = 0
+        for line in source.splitlines(keepends=True):
+            content = (line.splitlines() or [""])[0]
+            if not re.match(r'^[_\W\s]{5,}$', content.strip()):
+                kept_lines.append((source_pos, content))
+            source_pos += len(line)
+
+        joined = "\n".join(content for _, content in kept_lines)
+        leading = len(joined) - len(joined.lstrip())
+        self.text = joined.strip()
+
+        # Start of each kept line in the joined text, and where it came from
+        self._clean_starts = []
+        self._source_starts = []
+        clean_pos = -leading
+        for line_source_start, content in kept_lines:
+            self._clean_starts.append(clean_pos)
+            self._source_starts.append(line_source_start)
+            clean_pos += len(content) + 1
+
+    def source_offset(self, offset: int) -> int:
+        if not self._clean_starts:
+            return offset
+        line = max(bisect_right(self._clean_starts, offset) - 1, 0)
+        return self._source_starts[line] + (offset - self._clean_starts[line])
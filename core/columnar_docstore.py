@@ -0,0 +1,281 @@
+import json
+import mmap
+import os
+from typing import Dict, List, Tuple
+
+import numpy as np
+from langchain.schema import Document
+from langchain_community.docstore.base import Docstore
+
+DOCSTORE_FILE = "docstore.json"
+TEXTS_FILE = "texts.bin"
+TEXT_OFFSETS_FILE = "text_offsets.npy"
+DOCSTORE_VERSION = 1
+
+
+def make_preview(text: str) -> str:
+    """Same preview the processors store in chunk metadata"""
+    return text[:50] + ("..." if len(text) > 50 else "")
+
+
+def flatten_metadata(metadata: Dict, prefix: Tuple = ()) -> Dict[Tuple, object]:
+    """{"position": {"start": 3}} -> {("position", "start"): 3}, keeping key order"""
+    flat = {}
+    for key, value in metadata.items():
+        if isinstance(value, dict) and value:
+            flat.update(flatten_metadata(value, prefix + (key,)))
+        else:
+            flat[prefix + (key,)] = value
+    return flat
+
+
+def column_type(values: List) -> str:
+    present = [value for value in values if value is not None]
+    if not present:
+        return "json"
+    if all(isinstance(value, bool) for value in present):
+        return "bool"
+    if all(isinstance(value, int) and not isinstance(value, bool) for value in present):
+        return "int"
+    if all(isinstance(value, (int, float)) and not isinstance(value, bool) for value in present):
+        return "number"
+    if all(isinstance(value, str) for value in present):
+        # Dictionary-encode low-cardinality strings (sources, titles, page hashes)
+        return "category" if len(set(present)) <= max(1, len(values) // 4) else "str"
+    return "json"
+
+
+class _Buffer:
+    """Variable-length byte records: one contiguous file plus an offsets array"""
+
+    def __init__(self, data_path, offsets_path):
+        self.offsets = np.load(offsets_path, mmap_mode='r')
+        if os.path.getsize(data_path):
+            with open(data_path, 'rb') as f:
+                self.data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        else:
+            self.data = b""
+
+    def __getitem__(self, position: int) -> bytes:
+        return self.data[int(self.offsets[position]):int(self.offsets[position + 1])]
+
+
+def write_buffer(data_path, offsets_path, records: List[bytes]):
+    offsets = np.zeros(len(records) + 1, dtype=np.uint64)
+    with open(data_path, 'wb') as f:
+        for i, record in enumerate(records):
+            f.write(record)
+            offsets[i + 1] = offsets[i] + len(record)
+    save_array(offsets_path, offsets)
+
+
+def save_array(path, array: np.ndarray):
+    # np.save would append .npy to the .tmp names used while writing
+    with open(path, 'wb') as f:
+        np.save(f, array)
+
+
+def index_documents(vectorstore) -> List[Document]:
+    """A LangChain FAISS store's documents in index order"""
+    return [
+        vectorstore.docstore.search(vectorstore.index_to_docstore_id[position])
+        for position in range(vectorstore.index.ntotal)
+    ]
+
+
+def docstore_files(store_path) -> List[str]:
+    """Names of the files belonging to the columnar docstore in store_path, schema file included"""
+    schema_path = os.path.join(store_path, DOCSTORE_FILE)
+    if not os.path.exists(schema_path):
+        return []
+    with open(schema_path) as f:
+        columns = json.load(f)["columns"]
+    # Schema first, so a partially removed docstore is never taken for a complete one
+    names = [DOCSTORE_FILE, TEXTS_FILE, TEXT_OFFSETS_FILE]
+    for column in columns:
+        names += [column["file"] + suffix for suffix in
+                  (".npy", ".bin", "_offsets.npy", "_present.npy", "_null.npy", "_is_int.npy")]
+    return [name for name in names if os.path.exists(os.path.join(store_path, name))]
+
+
+def write_columnar_docstore(store_path, documents: List[Document]):
+    """Write documents (in index order) as a column-oriented docstore.
+
+    Texts go into one UTF-8 buffer. Every metadata field becomes a typed
+    column: integers and floats as NumPy arrays, repetitive strings
+    dictionary-encoded, other values as variable-length records. Columns
+    holding None values get a null mask, so None reads back as None rather
+    than as the column type's zero value. The preview field is recomputed
+    from the text on read when it matches, so it costs nothing on disk.
+
+    Other workers may have the previous files mapped, so everything is written
+    under temporary names and renamed into place (never truncated), with the
+    schema file last.
+    """
+    os.makedirs(store_path, exist_ok=True)
+    old_files = docstore_files(store_path)
+    written = [TEXTS_FILE, TEXT_OFFSETS_FILE]
+    count = len(documents)
+    write_buffer(
+        os.path.join(store_path, TEXTS_FILE + ".tmp"),
+        os.path.join(store_path, TEXT_OFFSETS_FILE + ".tmp"),
+        [doc.page_content.encode('utf-8') for doc in documents]
+    )
+
+    flat_metadata = [flatten_metadata(doc.metadata) for doc in documents]
+    paths = list(dict.fromkeys(path for flat in flat_metadata for path in flat))
+
+    columns = []
+    for i, path in enumerate(paths):
+        values = [flat.get(path) for flat in flat_metadata]
+        present = np.array([path in flat for flat in flat_metadata], dtype=np.uint8)
+        column = {"path": list(path), "file": f"col_{i}", "sparse": not present.all()}
+        base = os.path.join(store_path, column["file"])
+
+        def save(suffix, array):
+            written.append(column["file"] + suffix)
+            save_array(base + suffix + ".tmp", array)
+
+        if column["sparse"]:
+            save("_present.npy", present)
+
+        if path == ("preview",) and all(
+            value == make_preview(doc.page_content) for value, doc in zip(values, documents)
+        ):
+            column["type"] = "preview"
+            columns.append(column)
+            continue
+
+        column["type"] = column_type(values)
+        # Only present values count: missing keys are covered by the present mask
+        null = np.array([path in flat and flat[path] is None for flat in flat_metadata], dtype=np.uint8)
+        column["nullable"] = bool(null.any())
+        if column["nullable"]:
+            save("_null.npy", null)
+
+        if column["type"] == "bool":
+            save(".npy", np.array([bool(value) for value in values], dtype=np.uint8))
+        elif column["type"] == "int":
+            save(".npy", np.array([0 if value is None else value for value in values], dtype=np.int64))
+        elif column["type"] == "number":
+            # Remember which values were ints so 0 doesn't come back as 0.0
+            save(".npy", np.array([0 if value is None else value for value in values], dtype=np.float64))
+            save("_is_int.npy", np.array([isinstance(value, int) for value in values], dtype=np.uint8))
+        elif column["type"] == "category":
+            categories = list(dict.fromkeys(value for value in values if value is not None))
+            codes = {value: code for code, value in enumerate(categories)}
+            column["categories"] = categories
+            save(".npy", np.array([codes.get(value, -1) for value in values], dtype=np.int32))
+        else:
+            encode = (lambda value: value.encode('utf-8')) if column["type"] == "str" else \
+                (lambda value: json.dumps(value, ensure_ascii=False).encode('utf-8'))
+            written += [column["file"] + ".bin", column["file"] + "_offsets.npy"]
+            write_buffer(base + ".bin.tmp", base + "_offsets.npy.tmp", [
+                encode(value) if value is not None else b"" for value in values
+            ])
+        columns.append(column)
+
+    with open(os.path.join(store_path, DOCSTORE_FILE + ".tmp"), 'w') as f:
+        json.dump({"version": DOCSTORE_VERSION, "count": count, "columns": columns}, f, ensure_ascii=False)
+    for name in written + [DOCSTORE_FILE]:
+        os.replace(os.path.join(store_path, name + ".tmp"), os.path.join(store_path, name))
+    for name in set(old_files) - set(written) - {DOCSTORE_FILE}:
+        os.remove(os.path.join(store_path, name))
+
+
+class ReadOnlyDocstoreError(ValueError):
+    """A saved store's docstore was asked to change; saved stores are rebuilt, never edited in place.
+
+    A ValueError, like the one LangChain's FAISS raises for a docstore it cannot add to.
+    """
+
+
+class ColumnarDocstore(Docstore):
+    """Read-only docstore over the files written by write_columnar_docstore.
+
+    Documents are addressed by their position in the vector index (pair it
+    with PositionIds). A lookup reads one record from each column through
+    mmap, so it costs O(1) and never loads the whole store.
+    """
+
+    def __init__(self, store_path):
+        with open(os.path.join(store_path, DOCSTORE_FILE)) as f:
+            schema = json.load(f)
+        if schema.get("version") != DOCSTORE_VERSION:
+            raise ValueError(f"Unsupported docstore version {schema.get('version')} at {store_path}")
+        self.count = schema["count"]
+        self.texts = _Buffer(os.path.join(store_path, TEXTS_FILE), os.path.join(store_path, TEXT_OFFSETS_FILE))
+        self.columns = []
+        for column in schema["columns"]:
+            base = os.path.join(store_path, column["file"])
+            loaded = dict(column, path=tuple(column["path"]))
+            if column["sparse"]:
+                loaded["present"] = np.load(base + "_present.npy", mmap_mode='r')
+            if column.get("nullable"):
+                loaded["null"] = np.load(base + "_null.npy", mmap_mode='r')
+            if column["type"] in ("bool", "int", "number", "category"):
+                loaded["values"] = np.load(base + ".npy", mmap_mode='r')
+            if column["type"] == "number":
+                loaded["is_int"] = np.load(base + "_is_int.npy", mmap_mode='r')
+            if column["type"] in ("str", "json"):
+                loaded["values"] = _Buffer(base + ".bin", base + "_offsets.npy")
+            self.columns.append(loaded)
+
+    def __len__(self):
+        return self.count
+
+    def get_text(self, position: int) -> str:
+        return self.texts[position].decode('utf-8')
+
+    def _value(self, column, position: int, text: str):
+        kind = column["type"]
+        if kind == "preview":
+            return make_preview(text)
+        if column.get("nullable") and column["null"][position]:
+            return None
+        if kind == "bool":
+            return bool(column["values"][position])
+        if kind == "int":
+            return int(column["values"][position])
+        if kind == "number":
+            value = float(column["values"][position])
+            return int(value) if column["is_int"][position] else value
+        if kind == "category":
+            code = int(column["values"][position])
+            return column["categories"][code] if code >= 0 else None
+        raw = column["values"][position]
+        if kind == "str":
+            return raw.decode('utf-8')
+        return json.loads(raw) if raw else None
+
+    def get_metadata(self, position: int, text: str = None) -> Dict:
+        if text is None:
+            text = self.get_text(position)
+        metadata = {}
+        for column in self.columns:
+            if column["sparse"] and not column["present"][position]:
+                continue
+            target = metadata
+            for key in column["path"][:-1]:
+                target = target.setdefault(key, {})
+            target[column["path"][-1]] = self._value(column, position, text)
+        return metadata
+
+    def search(self, search) -> Document:
+        position = int(search)
+        if not 0 <= position < self.count:
+            return f"ID {search} not found."
+        text = self.get_text(position)
+        return Document(id=str(position), page_content=text, metadata=self.get_metadata(position, text))
+
+    def delete(self, ids: List) -> None:
+        raise ReadOnlyDocstoreError("Columnar docstores are read-only; rebuild the store instead")
+
+
+def is_columnar_docstore(store_path) -> bool:
+    return os.path.exists(os.path.join(store_path, DOCSTORE_FILE))
+
+
+def remove_columnar_docstore(store_path):
+    for name in docstore_files(store_path):
+        os.remove(os.path.join(store_path, name))
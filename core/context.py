@@ -0,0 +1,132 @@
+import hashlib
+from typing import List, Optional, Tuple
+
+from django.conf import settings
+from langchain.schema import Document
+
+from .chunking import CHUNK_SIZE
+
+# Rough characters per token for budgeting; no tokenizer is needed for a limit
+CHARS_PER_TOKEN = 4
+
+# Chunks at most this far apart are adjacent: the gap is separator whitespace the splitter stripped
+ADJACENT_GAP = 2
+
+# A passage cut to fit the budget is dropped instead if less than this would remain
+MIN_PASSAGE_TOKENS = 50
+
+
+def estimate_tokens(text: str) -> int:
+    return (len(text) + CHARS_PER_TOKEN - 1) // CHARS_PER_TOKEN
+
+
+def source_key(doc: Document) -> Optional[Tuple]:
+    """Chunks with the same key come from one contiguous text: a PDF page or a video transcript"""
+    metadata = doc.metadata
+    if "page_hash" in metadata:
+        return ("page", metadata.get("page"), metadata["page_hash"])
+    if "video_id" in metadata or "video_hash" in metadata:
+        return ("video", metadata.get("video_id"), metadata.get("video_hash"))
+    return None
+
+
+def source_span(doc: Document) -> Optional[Tuple[float, float]]:
+    """Where the chunk sits in its source: character positions, or the transcript timestamps"""
+    for field in ("position", "timestamp"):
+        span = doc.metadata.get(field)
+        if isinstance(span, dict) and "start" in span and "end" in span:
+            return span["start"], span["end"]
+    return None
+
+
+def text_overlap(before: str, after: str) -> int:
+    """Length of the longest suffix of before that is a prefix of after"""
+    for size in range(min(len(before), len(after), CHUNK_SIZE), 0, -1):
+        if before.endswith(after[:size]):
+            return size
+    return 0
+
+
+class Passage:
+    """One or more chunks of the same source merged into a single run of text"""
+
+    def __init__(self, doc: Document, rank: int):
+        self.text = doc.page_content
+        self.key = source_key(doc)
+        self.span = source_span(doc)
+        self.rank = rank
+
+    def absorb(self, other: "Passage") -> bool:
+        """Append other if it overlaps or touches the end of this passage; False if it does not"""
+        if other.text in self.text:
+            # A duplicate span adds nothing
+            self.rank = min(self.rank, other.rank)
+            return True
+        if self.key is None or other.key != self.key or self.span is None or other.span is None:
+            return False
+        if other.span[0] > self.span[1] + ADJACENT_GAP:
+            return False
+        overlap = text_overlap(self.text, other.text)
+        if overlap == 0 and other.span[0] < self.span[1]:
+            # Spans overlap but the texts don't line up (e.g. re-chunked source); keep both
+            return False
+        self.text += other.text[overlap:] if overlap else " " + other.text
+        self.span = (self.span[0], max(self.span[1], other.span[1]))
+        self.rank = min(self.rank, other.rank)
+        return True
+
+
+def merge_passages(docs: List[Document]) -> List[Passage]:
+    """Merge overlapping and adjacent chunks of the same source, best-ranked passage first"""
+    passages = [Passage(doc, rank) for rank, doc in enumerate(docs)]
+    # Within a source, in document order, so each chunk only has to be checked against the previous passage
+    ordered = sorted(
+        passages,
+        key=lambda passage: (passage.key is None, str(passage.key), passage.span or (0, 0), passage.rank)
+    )
+    merged: List[Passage] = []
+    for passage in ordered:
+        if merged and merged[-1].absorb(passage):
+            continue
+        if any(passage.text in kept.text for kept in merged):
+            continue
+        merged.append(passage)
+    return sorted(merged, key=lambda passage: passage.rank)
+
+
+def fit_to_budget(texts: List[str], token_budget: int) -> List[str]:
+    """Keep texts in order until the token budget is spent, cutting the last one at a word boundary"""
+    kept = []
+    remaining = token_budget
+    for text in texts:
+        tokens = estimate_tokens(text)
+        if tokens <= remaining:
+            kept.append(text)
+            remaining -= tokens
+            continue
+        if remaining >= MIN_PASSAGE_TOKENS:
+            cut = text[:remaining * CHARS_PER_TOKEN]
+            kept.append(cut[:cut.rfind(" ")] if " " in cut else cut)
+        break
+    return kept
+
+
+def assemble_context(docs: List[Document], token_budget: Optional[int] = None) -> str:
+    """The LLM context for retrieved chunks: overlap merged away, duplicates dropped, within the token budget.
+
+    Passages stay in retrieval order (a merged passage takes the place of
+    its best-ranked chunk). The references returned with an answer are still
+    built from the original chunks.
+    """
+    token_budget = token_budget or settings.CONTEXT_TOKEN_BUDGET
+    passages = merge_passages(docs)
+    texts = fit_to_budget([passage.text for passage in passages], token_budget)
+    context = "\n\n".join(texts)
+    print(f"Context: {len(docs)} chunks -> {len(texts)} passages, "
+          f"{sum(len(doc.page_content) for doc in docs)} -> {len(context)} chars")
+    return context
+
+
+def context_hash(context: str) -> str:
+    """Full SHA-256 of an assembled context, the answer cache's key for answers generated from exactly these chunks"""
+    return hashlib.sha256(context.encode('utf-8')).hexdigest()
@@ -0,0 +1,108 @@
+import hashlib
+import sqlite3
+import threading
+from array import array
+from typing import Dict, List, Optional
+
+from django.conf import settings
+
+# SQLite caps the number of bound parameters per statement
+LOOKUP_BATCH_SIZE = 500
+
+
+def content_hash(text: str) -> str:
+    """Full SHA-256 of a chunk's text (chunk metadata only keeps a short md5 prefix)"""
+    return hashlib.sha256(text.encode('utf-8')).hexdigest()
+
+
+class EmbeddingCache:
+    """Persistent embedding cache keyed by (embedding model, content hash).
+
+    Vectors are stored as float32 blobs in a local SQLite file, which is what
+    FAISS keeps in the index anyway, so a cached vector indexes identically to a
+    freshly computed one. A new connection is opened per call so the cache is
+    safe to use from request threads and forked ingestion workers.
+    """
+
+    def __init__(self, path):
+        self.path = str(path)
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS embeddings ("
+                " model TEXT NOT NULL,"
+                " text_hash TEXT NOT NULL,"
+                " vector BLOB NOT NULL,"
+                " PRIMARY KEY (model, text_hash))"
+            )
+
+    def _connect(self):
+        return sqlite3.connect(self.path, timeout=30)
+
+    def get_many(self, model_name: str, hashes: List[str]) -> Dict[str, List[float]]:
+        found = {}
+        unique_hashes = list(dict.fromkeys(hashes))
+        with self._connect() as conn:
+            for i in range(0, len(unique_hashes), LOOKUP_BATCH_SIZE):
+                batch = unique_hashes[i:i + LOOKUP_BATCH_SIZE]
+                placeholders = ",".join("?" * len(batch))
+                rows = conn.execute(
+                    f"SELECT text_hash, vector FROM embeddings WHERE model = ? AND text_hash IN ({placeholders})",
+                    [model_name, *batch]
+                )
+                for text_hash, blob in rows:
+                    found[text_hash] = array('f', blob).tolist()
+        return found
+
+    def put_many(self, model_name: str, items: Dict[str, List[float]]):
+        if not items:
+            return
+        with self._connect() as conn:
+            conn.executemany(
+                "INSERT OR REPLACE INTO embeddings (model, text_hash, vector) VALUES (?, ?, ?)",
+                [(model_name, text_hash, array('f', vector).tobytes()) for text_hash, vector in items.items()]
+            )
+
+    def embed_documents(self, texts: List[str], embedding_model, model_name: str) -> List[List[float]]:
+        """Return one vector per text, embedding only the texts not cached yet"""
+        hashes = [content_hash(text) for text in texts]
+        cached = self.get_many(model_name, hashes)
+
+        missing = {}
+        for text_hash, text in zip(hashes, texts):
+            if text_hash not in cached:
+                missing.setdefault(text_hash, text)
+
+        if missing:
+            vectors = embedding_model.embed_documents(list(missing.values()))
+            computed = dict(zip(missing.keys(), vectors))
+            self.put_many(model_name, computed)
+            # Round-trip through float32 so hits and misses index the same values
+            cached.update({h: array('f', v).tolist() for h, v in computed.items()})
+
+        hits = len(texts) - len(missing)
+        with self._lock:
+            self.hits += hits
+            self.misses += len(missing)
+        print(f"Embedding cache: {hits} hits, {len(missing)} misses")
+        return [cached[text_hash] for text_hash in hashes]
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {"hits": self.hits, "misses": self.misses}
+
+
+_embedding_cache: Optional[EmbeddingCache] = None
+_embedding_cache_lock = threading.Lock()
+
+
+def get_embedding_cache() -> EmbeddingCache:
+    """Process-wide cache instance backed by settings.EMBEDDING_CACHE_PATH"""
+    global _embedding_cache
+    with _embedding_cache_lock:
+        if _embedding_cache is None:
+            _embedding_cache = EmbeddingCache(settings.EMBEDDING_CACHE_PATH)
+        return _embedding_cache
@@ -0,0 +1,162 @@
+import random
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, List, Optional
+
+from django.conf import settings
+
+
+def is_rate_limited(error: Exception) -> bool:
+    """True for HTTP 429 / gRPC RESOURCE_EXHAUSTED errors from any embedding client.
+
+    Only structured signals count: a status code attribute or a
+    ResourceExhausted exception type, anywhere in the cause chain, since
+    langchain_google_genai re-raises API errors wrapped in its own type.
+    """
+    seen = set()
+    while error is not None and id(error) not in seen:
+        seen.add(id(error))
+        response = getattr(error, 'response', None)
+        code = getattr(error, 'code', None)
+        if callable(code):
+            # grpc.RpcError.code() returns a StatusCode enum
+            try:
+                code = code()
+            except Exception:
+                code = None
+        for status_code in (
+            getattr(error, 'status_code', None),
+            code,
+            getattr(response, 'status_code', None),
+        ):
+            if status_code == 429 or getattr(status_code, 'name', None) == 'RESOURCE_EXHAUSTED':
+                return True
+        if any(cls.__name__ == 'ResourceExhausted' for cls in type(error).__mro__):
+            return True
+        error = error.__cause__ or error.__context__
+    return False
+
+
+def get_retry_after(error: Exception) -> Optional[float]:
+    """Seconds requested by a Retry-After header, if the error carries one"""
+    response = getattr(error, 'response', None)
+    headers = getattr(response, 'headers', None) or {}
+    try:
+        return float(headers.get('Retry-After'))
+    except (TypeError, ValueError):
+        return None
+
+
+class RateLimiter:
+    """Sliding one-minute window shared by every batch sent from this process.
+
+    A 429 from the provider pauses all callers, not just the thread that got it,
+    since the quota is per API key rather than per request.
+    """
+
+    def __init__(self, requests_per_minute: int):
+        self.requests_per_minute = requests_per_minute
+        self._sent = deque()
+        self._paused_until = 0.0
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                while self._sent and now - self._sent[0] >= 60:
+                    self._sent.popleft()
+                wait = self._paused_until - now
+                if wait <= 0 and len(self._sent) < self.requests_per_minute:
+                    self._sent.append(now)
+                    return
+                if wait <= 0:
+                    wait = 60 - (now - self._sent[0])
+            time.sleep(wait)
+
+    def pause(self, seconds: float):
+        with self._lock:
+            self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+
+
+class EmbeddingScheduler:
+    """Send embedding batches concurrently within a requests-per-minute budget.
+
+    embed_batch is any callable taking a list of texts and returning one vector
+    per text, e.g. GoogleGenerativeAIEmbeddings.embed_documents or a client for a
+    local fake server. Rate-limited batches are retried with jittered
+    exponential backoff (honouring Retry-After) instead of failing the upload;
+    other errors propagate. Exposes embed_documents so it can stand in for an
+    embedding model wherever only document embedding is needed.
+    """
+
+    def __init__(
+        self,
+        embed_batch: Callable[[List[str]], List[List[float]]],
+        batch_size: int = 100,
+        max_concurrency: int = 4,
+        rate_limiter: Optional[RateLimiter] = None,
+        max_retries: int = 8,
+        base_delay: float = 1.0,
+        max_delay: float = 60.0,
+    ):
+        self.embed_batch = embed_batch
+        self.batch_size = batch_size
+        self.max_concurrency = max_concurrency
+        self.rate_limiter = rate_limiter or RateLimiter(requests_per_minute=60)
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+
+    def _send(self, batch: List[str]) -> List[List[float]]:
+        attempt = 0
+        while True:
+            self.rate_limiter.acquire()
+            try:
+                return self.embed_batch(batch)
+            except Exception as e:
+                if not is_rate_limited(e) or attempt >= self.max_retries:
+                    raise
+                delay = get_retry_after(e)
+                if delay is None:
+                    delay = min(self.max_delay, self.base_delay * 2 ** attempt) * random.uniform(0.5, 1.5)
+                print(f"Embedding batch rate limited, retrying in {delay:.1f}s (attempt {attempt + 1}/{self.max_retries})")
+                self.rate_limiter.pause(delay)
+                attempt += 1
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        batches = [texts[i:i + self.batch_size] for i in range(0, len(texts), self.batch_size)]
+        if len(batches) <= 1 or self.max_concurrency <= 1:
+            results = [self._send(batch) for batch in batches]
+        else:
+            with ThreadPoolExecutor(max_workers=min(self.max_concurrency, len(batches))) as executor:
+                results = list(executor.map(self._send, batches))
+        return [vector for batch_vectors in results for vector in batch_vectors]
+
+
+_rate_limiter: Optional[RateLimiter] = None
+_rate_limiter_lock = threading.Lock()
+
+
+def get_embedding_scheduler(embedding_model):
+    """Scheduler for embedding_model configured from settings.
+
+    All schedulers in the process share one rate limiter, so concurrent uploads
+    together stay within EMBEDDING_REQUESTS_PER_MINUTE. Local backends have no
+    rate limit and batch internally, so they are returned as they are.
+    """
+    if not getattr(embedding_model, "remote", True):
+        return embedding_model
+    global _rate_limiter
+    with _rate_limiter_lock:
+        if _rate_limiter is None:
+            _rate_limiter = RateLimiter(settings.EMBEDDING_REQUESTS_PER_MINUTE)
+    return EmbeddingScheduler(
+        embedding_model.embed_documents,
+        batch_size=settings.EMBEDDING_BATCH_SIZE,
+        max_concurrency=settings.EMBEDDING_MAX_CONCURRENCY,
+        rate_limiter=_rate_limiter,
+        max_retries=settings.EMBEDDING_MAX_RETRIES,
+    )
@@ -0,0 +1,221 @@
+import hashlib
+import json
+import os
+import threading
+from typing import Dict, List, Optional
+
+import numpy as np
+from django.conf import settings
+from langchain_core.embeddings import Embeddings
+
+from .lexical_index import tokenize
+
+# Written next to every store: the backend and model its vectors came from
+EMBEDDING_FILE = "embedding.json"
+
+# Stores saved before backends were recorded were all built with this model
+LEGACY_IDENTITY = {"backend": "google", "model": "models/embedding-001"}
+
+DEFAULT_MODELS = {
+    "google": "models/embedding-001",
+    "local": "sentence-transformers/all-MiniLM-L6-v2",
+}
+
+
+class EmbeddingMismatchError(Exception):
+    """A store is being opened with a different embedding model than the one that built it"""
+
+
+class EmbeddingBackend(Embeddings):
+    """Embedding model used for chunks and queries.
+
+    name is the key the embedding cache stores vectors under. remote backends
+    are called through the rate-limited EmbeddingScheduler; local ones batch
+    internally and are called directly.
+    """
+    backend = ""
+    remote = False
+
+    def __init__(self, model: str):
+        self.model = model
+
+    @property
+    def name(self) -> str:
+        return self.model
+
+    def identity(self) -> Dict[str, str]:
+        return {"backend": self.backend, "model": self.model}
+
+    def embed_queries(self, texts: List[str]) -> List[List[float]]:
+        """Query vectors (embed_query semantics) for several texts, in as few model calls as the backend allows"""
+        return [self.embed_query(text) for text in texts]
+
+
+class GoogleEmbeddingBackend(EmbeddingBackend):
+    """Gemini embeddings through the API (the original behaviour)"""
+    backend = "google"
+    remote = True
+
+    def __init__(self, model: str):
+        # Imported here so the offline backends work without the Google packages
+        from langchain_google_genai import GoogleGenerativeAIEmbeddings
+        super().__init__(model)
+        self.client = GoogleGenerativeAIEmbeddings(model=model)
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return self.client.embed_documents(texts)
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.client.embed_query(text)
+
+    def embed_queries(self, texts: List[str]) -> List[List[float]]:
+        # One batched request, with the task type embed_query uses
+        return self.client.embed_documents(texts, task_type="retrieval_query")
+
+
+class LocalEmbeddingBackend(EmbeddingBackend):
+    """sentence-transformers model run on the CPU (optional dependency: pip install sentence-transformers)"""
+    backend = "local"
+
+    def __init__(self, model: str, batch_size: int = 64, device: str = "cpu"):
+        try:
+            from sentence_transformers import SentenceTransformer
+        except ImportError:
+            raise Exception(
+                "EMBEDDING_BACKEND=local needs the sentence-transformers package: pip install sentence-transformers"
+            )
+        super().__init__(model)
+        self.batch_size = batch_size
+        self.encoder = SentenceTransformer(model, device=device)
+
+    def embed_array(self, texts: List[str]) -> np.ndarray:
+        # encode() sorts by length and pads per batch; normalized vectors make L2 rank like cosine
+        return self.encoder.encode(
+            texts,
+            batch_size=self.batch_size,
+            convert_to_numpy=True,
+            normalize_embeddings=True,
+            show_progress_bar=False
+        ).astype(np.float32)
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        if not texts:
+            return []
+        return self.embed_array(texts).tolist()
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.embed_array([text])[0].tolist()
+
+    def embed_queries(self, texts: List[str]) -> List[List[float]]:
+        return self.embed_documents(texts)
+
+
+class HashingEmbeddingBackend(EmbeddingBackend):
+    """Deterministic, dependency-free embedder for tests and offline benchmarks.
+
+    Word unigrams and bigrams are hashed (blake2b, so the same in every
+    process) into a signed bag of features, then L2-normalized. Texts sharing
+    words land close together, which is enough to exercise retrieval end to
+    end without any model.
+    """
+    backend = "hashing"
+
+    def __init__(self, dimension: int = 384):
+        super().__init__(f"hashing-{dimension}")
+        self.dimension = dimension
+
+    def features(self, text: str) -> List[int]:
+        tokens = tokenize(text)
+        return [
+            int.from_bytes(hashlib.blake2b(feature.encode('utf-8'), digest_size=8).digest(), 'little')
+            for feature in tokens + [f"{a} {b}" for a, b in zip(tokens, tokens[1:])]
+        ]
+
+    def embed_array(self, texts: List[str]) -> np.ndarray:
+        rows, hashes = [], []
+        for row, text in enumerate(texts):
+            features = self.features(text)
+            rows.extend([row] * len(features))
+            hashes.extend(features)
+        hashes = np.array(hashes, dtype=np.uint64)
+        columns = (hashes % np.uint64(self.dimension)).astype(np.int64)
+        signs = np.where((hashes >> np.uint64(63)) == 1, -1.0, 1.0).astype(np.float32)
+
+        vectors = np.zeros((len(texts), self.dimension), dtype=np.float32)
+        np.add.at(vectors, (np.array(rows, dtype=np.int64), columns), signs)
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        return vectors / np.where(norms == 0, 1, norms)
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return self.embed_array(texts).tolist()
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.embed_array([text])[0].tolist()
+
+    def embed_queries(self, texts: List[str]) -> List[List[float]]:
+        return self.embed_documents(texts)
+
+
+_backends: Dict[tuple, EmbeddingBackend] = {}
+_backends_lock = threading.Lock()
+
+
+def get_embedding_backend(backend: Optional[str] = None, model: Optional[str] = None) -> EmbeddingBackend:
+    """The process-wide backend selected by settings.EMBEDDING_BACKEND / EMBEDDING_MODEL"""
+    backend = backend or settings.EMBEDDING_BACKEND
+    model = model or settings.EMBEDDING_MODEL or DEFAULT_MODELS.get(backend)
+    key = (backend, model)
+    with _backends_lock:
+        if key not in _backends:
+            if backend == "google":
+                _backends[key] = GoogleEmbeddingBackend(model)
+            elif backend == "local":
+                _backends[key] = LocalEmbeddingBackend(
+                    model,
+                    batch_size=settings.EMBEDDING_LOCAL_BATCH_SIZE,
+                    device=settings.EMBEDDING_LOCAL_DEVICE
+                )
+            elif backend == "hashing":
+                _backends[key] = HashingEmbeddingBackend(settings.EMBEDDING_HASHING_DIMENSION)
+            else:
+                raise Exception(f"Unknown embedding backend: {backend}")
+        return _backends[key]
+
+
+def embedding_identity(embedding) -> Dict[str, str]:
+    if isinstance(embedding, EmbeddingBackend):
+        return embedding.identity()
+    # A bare LangChain embeddings object, e.g. in a one-off script
+    return {"backend": type(embedding).__name__, "model": getattr(embedding, "model", "")}
+
+
+def identity_key(identity: Dict[str, str]) -> str:
+    """Compact string form of an embedding identity, e.g. for database keys"""
+    return f"{identity['backend']}:{identity['model']}"
+
+
+def write_embedding_identity(store_path, embedding):
+    tmp_path = os.path.join(store_path, EMBEDDING_FILE + ".tmp")
+    with open(tmp_path, 'w') as f:
+        json.dump(embedding_identity(embedding), f)
+    os.replace(tmp_path, os.path.join(store_path, EMBEDDING_FILE))
+
+
+def read_embedding_identity(store_path) -> Dict[str, str]:
+    try:
+        with open(os.path.join(store_path, EMBEDDING_FILE)) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return LEGACY_IDENTITY
+
+
+def check_embedding_identity(store_path, embedding):
+    """Raise EmbeddingMismatchError unless embedding is the model the store was built with"""
+    stored = read_embedding_identity(store_path)
+    current = embedding_identity(embedding)
+    if stored != current:
+        raise EmbeddingMismatchError(
+            f"Vector store at {store_path} was built with {stored['backend']} embeddings ({stored['model']}) "
+            f"but the configured backend is {current['backend']} ({current['model']}); "
+            f"rebuild the store or switch EMBEDDING_BACKEND back"
+        )
@@ -0,0 +1,35 @@
+import threading
+
+from django.db import close_old_connections
+
+
+class Heartbeat:
+    """Calls renew from a background thread every interval seconds until stopped.
+
+    Used to keep a database lease alive while long work runs; a failed renewal
+    is logged and retried on the next beat, so leases should cover a few beats.
+    """
+
+    def __init__(self, renew, interval, name):
+        self.renew = renew
+        self.interval = interval
+        self.name = name
+        self._stopped = threading.Event()
+        self._thread = threading.Thread(target=self._run, name=name, daemon=True)
+
+    def _run(self):
+        while not self._stopped.wait(self.interval):
+            try:
+                self.renew()
+            except Exception as e:
+                print(f"{self.name} failed: {str(e)}")
+            finally:
+                close_old_connections()
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self._stopped.set()
+        self._thread.join()
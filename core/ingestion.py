@@ -0,0 +1,208 @@
+import hashlib
+import os
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+
+from .embeddings import embedding_identity, identity_key, read_embedding_identity
+from .heartbeat import Heartbeat
+from .library import update_library
+from .models import SharedPDFStore, UserPDF, UserYouTubeVideo
+from .pdf_processor import PDFProcessor
+from .store_registry import delete_store
+from .yt_processor import YouTubeProcessor
+
+
+def build_lease_expiry():
+    return timezone.now() + timedelta(seconds=settings.PDF_BUILD_LEASE_SECONDS)
+
+
+def _reference_store(user, file_name, shared_store, job=None):
+    shared_store.add_reference()
+    return UserPDF.objects.create(
+        user=user,
+        file_name=file_name,
+        vector_store=shared_store.vector_store,
+        shared_store=shared_store,
+        job=job
+    )
+
+
+def shared_store_name(content_hash, embedding):
+    """Store name for a file embedded with embedding (an identity_key); one store per file and model"""
+    model_hash = hashlib.sha256(embedding.encode('utf-8')).hexdigest()[:8]
+    return f"book_{content_hash[:32]}_{model_hash}"
+
+
+def _find_shared_store(content_hash, embedding, processor):
+    """The locked SharedPDFStore row for this file and embedding model, or None.
+
+    Rows from before the model was recorded are matched by the identity their
+    store's files declare, and the field is filled in when they match.
+    """
+    stores = SharedPDFStore.objects.select_for_update()
+    shared_store = stores.filter(content_hash=content_hash, embedding=embedding).first()
+    if shared_store is not None:
+        return shared_store
+    legacy_store = stores.filter(content_hash=content_hash, embedding='').first()
+    if legacy_store is not None:
+        store_path = processor.get_store_path(legacy_store.vector_store)
+        if os.path.exists(store_path) and identity_key(read_embedding_identity(store_path)) == embedding:
+            legacy_store.embedding = embedding
+            legacy_store.save(update_fields=['embedding'])
+            return legacy_store
+    return None
+
+
+def _reference_or_claim_store(user, file_name, content_hash, processor, job=None):
+    """Reference the shared store for content_hash, or claim the right to build it.
+
+    Stores are shared per file and embedding model, so after EMBEDDING_BACKEND
+    changes an upload builds a store for the new model instead of reusing one
+    it can't query. Runs in one transaction with the SharedPDFStore row locked.
+    Returns (user_pdf, None) when a finished store was referenced,
+    (None, shared_store) when this upload claimed the build (a new row, a row
+    whose files went missing, or one whose builder stopped renewing its claim)
+    and (None, None) while another upload is building it. A job that already
+    recorded its UserPDF (an earlier attempt of it) gets that row back.
+    """
+    embedding = identity_key(embedding_identity(processor.embedding_model))
+    try:
+        with transaction.atomic():
+            if job is not None:
+                user_pdf = UserPDF.objects.filter(job=job).first()
+                if user_pdf:
+                    return user_pdf, None
+            shared_store = _find_shared_store(content_hash, embedding, processor)
+            if shared_store is None:
+                return None, SharedPDFStore.objects.create(
+                    content_hash=content_hash,
+                    embedding=embedding,
+                    vector_store=shared_store_name(content_hash, embedding),
+                    build_expires_at=build_lease_expiry()
+                )
+            if shared_store.is_building():
+                return None, None
+            if os.path.exists(processor.get_store_path(shared_store.vector_store)):
+                return _reference_store(user, file_name, shared_store, job), None
+            shared_store.build_expires_at = build_lease_expiry()
+            shared_store.save(update_fields=['build_expires_at'])
+            return None, shared_store
+    except IntegrityError:
+        # Another upload of the file created the row first; wait for its build
+        return None, None
+
+
+def _finish_store_build(user, file_name, shared_store, job=None):
+    """Release the build claim and reference the finished store in one transaction"""
+    with transaction.atomic():
+        # The claim keeps release() from deleting the row while it is being built
+        shared_store = SharedPDFStore.objects.select_for_update().get(pk=shared_store.pk)
+        shared_store.build_expires_at = None
+        shared_store.save(update_fields=['build_expires_at'])
+        user_pdf = UserPDF.objects.filter(job=job).first() if job is not None else None
+        return user_pdf or _reference_store(user, file_name, shared_store, job)
+
+
+def _abandon_store_build(shared_store):
+    """Release the build claim after a failed build, removing the store if nothing references it"""
+    with transaction.atomic():
+        shared_store = SharedPDFStore.objects.select_for_update().filter(pk=shared_store.pk).first()
+        if shared_store is None:
+            return
+        if shared_store.ref_count == 0:
+            delete_store(shared_store.vector_store)
+            shared_store.delete()
+        else:
+            shared_store.build_expires_at = None
+            shared_store.save(update_fields=['build_expires_at'])
+
+
+def _renew_build_claim(shared_store):
+    SharedPDFStore.objects.filter(pk=shared_store.pk).update(build_expires_at=build_lease_expiry())
+
+
+def ingest_pdf(user, file_path, file_name, content_hash, progress=None, job=None):
+    """Build (or reuse) the vector store for an uploaded PDF and record it for user.
+
+    Used both inline by PDFQAAPI and by background ingestion jobs. Only one
+    upload of a file builds its store; concurrent uploads of the same file wait
+    for that build and then reference it. job, when given, is recorded on the
+    UserPDF and running the same job again returns that row instead of adding
+    another. Returns the UserPDF.
+    """
+    processor = PDFProcessor()
+    while True:
+        user_pdf, shared_store = _reference_or_claim_store(user, file_name, content_hash, processor, job)
+        if user_pdf or shared_store:
+            break
+        time.sleep(settings.PDF_BUILD_POLL_INTERVAL)
+
+    if user_pdf:
+        print(f"Reusing vector store {user_pdf.vector_store} for identical upload")
+    else:
+        store_name = shared_store.vector_store
+        heartbeat = Heartbeat(
+            lambda: _renew_build_claim(shared_store),
+            settings.PDF_BUILD_LEASE_SECONDS / 3,
+            f"store-build-heartbeat-{store_name}"
+        )
+        try:
+            with heartbeat:
+                # Process the PDF
+                if progress or os.path.getsize(file_path) >= settings.PDF_STREAMING_MIN_BYTES:
+                    # Large books (and background jobs, which report per-page progress)
+                    # are embedded page by page to keep worker memory bounded
+                    processor.create_vector_store_streaming(file_path, store_name, progress=progress)
+                else:
+                    chunks = processor.process_pdf(file_path)
+                    processor.create_vector_store(chunks, store_name)
+        except Exception:
+            _abandon_store_build(shared_store)
+            raise
+        user_pdf = _finish_store_build(user, file_name, shared_store, job)
+
+    update_library(user)
+    return user_pdf
+
+
+def ingest_youtube(user, video_url, progress=None, job=None):
+    """Fetch, chunk and embed a video's transcript and record it for user.
+
+    job, when given, is recorded on the UserYouTubeVideo and running the same
+    job again returns that row instead of adding another. Returns the UserYouTubeVideo.
+    """
+    if job is not None:
+        user_video = UserYouTubeVideo.objects.filter(job=job).first()
+        if user_video:
+            return user_video
+
+    processor = YouTubeProcessor()
+
+    # Process video
+    video_id = processor.extract_video_id(video_url)
+    store_name = f"yt_{user.firebase_uid}_{video_id}"
+
+    # This handles transcript loading and vector store creation
+    processing_result = processor.process_video(video_url, store_name, progress=progress)
+
+    # Save to database
+    try:
+        with transaction.atomic():
+            user_video = UserYouTubeVideo.objects.create(
+                user=user,
+                video_url=video_url,
+                video_id=video_id,
+                video_title=processing_result['video_info'].get('title', ''),
+                thumbnail_url=processing_result['video_info'].get('thumbnail', ''),
+                vector_store=store_name,
+                job=job
+            )
+    except IntegrityError:
+        # Another attempt of the same job recorded the video first
+        return UserYouTubeVideo.objects.get(job=job)
+    update_library(user)
+    return user_video
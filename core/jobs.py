@@ -0,0 +1,230 @@
+import threading
+import time
+import traceback
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import close_old_connections, transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from .heartbeat import Heartbeat
+from .ingestion import ingest_pdf, ingest_youtube
+from .models import IngestionJob
+
+# Progress rows are written at most this often per job
+PROGRESS_INTERVAL = 1.0
+
+_executor = None
+_executor_lock = threading.Lock()
+
+# Jobs this process has submitted to its pool and not finished, so polling doesn't submit them twice
+_pending = set()
+_pending_lock = threading.Lock()
+
+_poller = None
+
+
+def get_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=settings.INGESTION_WORKERS,
+                thread_name_prefix="ingestion"
+            )
+        return _executor
+
+
+def enqueue_job(user, kind, payload):
+    """Queue an ingestion job and return it immediately.
+
+    The job row is the queue entry. When INGESTION_RUN_IN_PROCESS is set it is
+    also handed to this process's worker pool once the row is committed;
+    otherwise the `manage.py process_ingestion_jobs` worker runs it. That
+    worker also picks up jobs a stopped process left behind.
+    """
+    job = IngestionJob.objects.create(user=user, kind=kind, payload=payload)
+    if settings.INGESTION_RUN_IN_PROCESS:
+        transaction.on_commit(lambda: submit_job(job.id))
+    return job
+
+
+def lease_expiry():
+    return timezone.now() + timedelta(seconds=settings.INGESTION_LEASE_SECONDS)
+
+
+def claim_job(job_id):
+    """Atomically move a queued job to running under a fresh lease.
+
+    Returns the claim token the worker's later updates must match, or None if
+    another worker got the job first.
+    """
+    claim_token = uuid.uuid4().hex
+    claimed = IngestionJob.objects.filter(id=job_id, status=IngestionJob.STATUS_QUEUED).update(
+        status=IngestionJob.STATUS_RUNNING,
+        started_at=timezone.now(),
+        lease_expires_at=lease_expiry(),
+        claim_token=claim_token
+    )
+    return claim_token if claimed == 1 else None
+
+
+def claimed_job(job_id, claim_token):
+    """The job's row while claim_token still holds it; once the job is requeued the updates match nothing"""
+    return IngestionJob.objects.filter(id=job_id, claim_token=claim_token)
+
+
+def requeue_expired_jobs():
+    """Put running jobs whose worker stopped renewing the lease back in the queue. Returns how many."""
+    expired = Q(lease_expires_at__lt=timezone.now()) | Q(lease_expires_at__isnull=True)
+    return IngestionJob.objects.filter(expired, status=IngestionJob.STATUS_RUNNING).update(
+        status=IngestionJob.STATUS_QUEUED,
+        started_at=None,
+        lease_expires_at=None,
+        claim_token=''
+    )
+
+
+class JobHeartbeat(Heartbeat):
+    """Renews a running job's lease from a background thread until stopped"""
+
+    def __init__(self, job_id, claim_token):
+        self.job_id = job_id
+        self.claim_token = claim_token
+        super().__init__(self.renew_lease, settings.INGESTION_LEASE_SECONDS / 3, f"ingestion-heartbeat-{job_id}")
+
+    def renew_lease(self):
+        claimed_job(self.job_id, self.claim_token).filter(status=IngestionJob.STATUS_RUNNING).update(
+            lease_expires_at=lease_expiry()
+        )
+
+
+class JobProgress:
+    """Progress callback for the processors that persists counters on the job row"""
+
+    def __init__(self, job_id, claim_token):
+        self.job_id = job_id
+        self.claim_token = claim_token
+        self.counters = {}
+        self.last_saved = 0.0
+
+    def __call__(self, **counters):
+        self.counters.update(counters)
+        # Totals are always saved so the ETA has a denominator from the start
+        if time.monotonic() - self.last_saved >= PROGRESS_INTERVAL or any(k.endswith('_total') for k in counters):
+            self.flush()
+
+    def flush(self):
+        if self.counters:
+            claimed_job(self.job_id, self.claim_token).update(**self.counters)
+        self.last_saved = time.monotonic()
+
+
+def run_job(job_id):
+    """Claim and execute one job, recording the created row or the error"""
+    close_old_connections()
+    try:
+        claim_token = claim_job(job_id)
+        if not claim_token:
+            return
+        job = IngestionJob.objects.select_related('user').get(id=job_id)
+        progress = JobProgress(job_id, claim_token)
+        try:
+            # A worker whose lease expired and whose job was requeued may still
+            # get here; the job is recorded on the row it creates, so the next
+            # attempt reuses that row rather than adding a second one
+            with JobHeartbeat(job_id, claim_token):
+                if job.kind == IngestionJob.KIND_PDF:
+                    result = ingest_pdf(
+                        job.user,
+                        job.payload['file_path'],
+                        job.payload['file_name'],
+                        job.payload['content_hash'],
+                        progress=progress,
+                        job=job
+                    )
+                elif job.kind == IngestionJob.KIND_YOUTUBE:
+                    result = ingest_youtube(job.user, job.payload['video_url'], progress=progress, job=job)
+                else:
+                    raise Exception(f"Unknown ingestion job kind: {job.kind}")
+        except Exception as e:
+            print(f"Ingestion job {job_id} failed: {str(e)}")
+            print(traceback.format_exc())
+            progress.flush()
+            claimed_job(job_id, claim_token).update(
+                status=IngestionJob.STATUS_FAILED,
+                error=str(e),
+                finished_at=timezone.now(),
+                lease_expires_at=None
+            )
+            return
+
+        progress.flush()
+        claimed_job(job_id, claim_token).update(
+            status=IngestionJob.STATUS_COMPLETED,
+            result_id=result.id,
+            finished_at=timezone.now(),
+            lease_expires_at=None
+        )
+    finally:
+        with _pending_lock:
+            _pending.discard(job_id)
+        close_old_connections()
+
+
+def submit_job(job_id):
+    """Hand a job to this process's pool unless it is already waiting there; returns the future or None"""
+    with _pending_lock:
+        if job_id in _pending:
+            return None
+        _pending.add(job_id)
+    return get_executor().submit(run_job, job_id)
+
+
+def dispatch_queued_jobs():
+    """Requeue expired leases, then submit every queued job to the worker pool. Returns the futures."""
+    requeued = requeue_expired_jobs()
+    if requeued:
+        print(f"Requeued {requeued} ingestion job(s) with expired leases")
+    job_ids = list(
+        IngestionJob.objects.filter(status=IngestionJob.STATUS_QUEUED).values_list('id', flat=True)
+    )
+    futures = [submit_job(job_id) for job_id in job_ids]
+    return [future for future in futures if future is not None]
+
+
+def run_queued_jobs():
+    """Run every queued (or orphaned) job on the worker pool and wait for them. Returns how many were started."""
+    futures = dispatch_queued_jobs()
+    for future in futures:
+        future.result()
+    return len(futures)
+
+
+def _poll_queue():
+    while True:
+        try:
+            dispatch_queued_jobs()
+        except Exception as e:
+            print(f"Ingestion queue poll failed: {str(e)}")
+        finally:
+            close_old_connections()
+        time.sleep(settings.INGESTION_POLL_INTERVAL)
+
+
+def start_in_process_worker():
+    """Poll the job table from this web process, like process_ingestion_jobs does.
+
+    Called from the WSGI/ASGI entry points when INGESTION_START_POLLER is set,
+    so jobs queued before a restart or crash, and running jobs whose lease
+    expired, are picked up again without a separate worker.
+    """
+    global _poller
+    with _executor_lock:
+        if _poller is not None:
+            return
+        _poller = threading.Thread(target=_poll_queue, name="ingestion-poller", daemon=True)
+    _poller.start()
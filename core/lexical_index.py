@@ -0,0 +1,160 @@
+import json
+import math
+import os
+import re
+from collections import Counter
+from typing import List, Optional, Tuple
+
+import numpy as np
+
+from .columnar_docstore import save_array
+
+BM25_FILE = "bm25.json"
+BM25_TERMS_FILE = "bm25_terms.json"
+BM25_OFFSETS_FILE = "bm25_offsets.npy"
+BM25_DOCS_FILE = "bm25_docs.npy"
+BM25_TF_FILE = "bm25_tf.npy"
+BM25_LENGTHS_FILE = "bm25_lengths.npy"
+BM25_FILES = (BM25_FILE, BM25_TERMS_FILE, BM25_OFFSETS_FILE, BM25_DOCS_FILE, BM25_TF_FILE, BM25_LENGTHS_FILE)
+
+BM25_K1 = 1.5
+BM25_B = 0.75
+
+# Dotted section/equation numbers (3.2.1) are kept whole; otherwise runs of word
+# characters. Devanagari vowel signs and viramas are not \w, so the block is
+# listed explicitly (minus the danda punctuation) to keep Hindi words intact.
+TOKEN_RE = re.compile(r"\d+(?:\.\d+)+|[\w\u0900-\u0963\u0966-\u097F]+")
+
+# Function words that say nothing about whether a store covers a question.
+# They stay in the BM25 index (their low idf already keeps them from
+# dominating scores) and are only ignored when deciding on query expansion.
+STOPWORDS = frozenset("""
+a about above after again all also am an and any are as at be because been before being below between
+both but by can could did do does doing down during each few for from further had has have having he
+her here hers him his how i if in into is it its itself just me more most my no nor not now of off on
+once only or other our out over own same she should so some such than that the their them then there
+these they this those through to too under until up very was we were what when where which while who
+whom why will with would you your yours explain describe tell give define please
+है हैं था थे थी का की के को में से पर और या यह वह ये वे क्या कैसे क्यों कौन कब कहाँ भी तो ही एक
+""".split())
+
+# A term found in more than this fraction of a store's chunks is treated like a
+# stopword there, once the store has enough chunks for the fraction to mean much
+COMMON_TERM_MAX_DF = 0.5
+COMMON_TERM_MIN_CHUNKS = 20
+
+
+def tokenize(text: str) -> List[str]:
+    return TOKEN_RE.findall(text.lower())
+
+
+def content_terms(text: str) -> List[str]:
+    """Distinct tokens of text other than stopwords, in order"""
+    return [term for term in dict.fromkeys(tokenize(text)) if term not in STOPWORDS]
+
+
+def build_lexical_index(store_path, texts: List[str]):
+    """Write a BM25 inverted index over texts (in vector index order) next to a store.
+
+    Postings are kept as CSR arrays: for term i, documents
+    docs[offsets[i]:offsets[i + 1]] with term frequencies tf[...] at the same
+    positions. The summary file is written last and marks the index complete.
+    """
+    postings = {}
+    lengths = np.zeros(len(texts), dtype=np.int32)
+    for position, text in enumerate(texts):
+        counts = Counter(tokenize(text))
+        lengths[position] = sum(counts.values())
+        for term, count in counts.items():
+            postings.setdefault(term, []).append((position, count))
+
+    terms = sorted(postings)
+    offsets = np.zeros(len(terms) + 1, dtype=np.int64)
+    for i, term in enumerate(terms):
+        offsets[i + 1] = offsets[i] + len(postings[term])
+    docs = np.empty(offsets[-1], dtype=np.int32)
+    tf = np.empty(offsets[-1], dtype=np.float32)
+    for i, term in enumerate(terms):
+        entries = np.array(postings[term])
+        docs[offsets[i]:offsets[i + 1]] = entries[:, 0]
+        tf[offsets[i]:offsets[i + 1]] = entries[:, 1]
+
+    os.makedirs(store_path, exist_ok=True)
+    with open(os.path.join(store_path, BM25_TERMS_FILE + ".tmp"), 'w') as f:
+        json.dump(terms, f, ensure_ascii=False)
+    for name, array in ((BM25_OFFSETS_FILE, offsets), (BM25_DOCS_FILE, docs),
+                        (BM25_TF_FILE, tf), (BM25_LENGTHS_FILE, lengths)):
+        save_array(os.path.join(store_path, name + ".tmp"), array)
+    for name in BM25_FILES[1:]:
+        os.replace(os.path.join(store_path, name + ".tmp"), os.path.join(store_path, name))
+
+    summary = {
+        "count": len(texts),
+        "avg_length": float(lengths.mean()) if len(texts) else 0.0,
+        "k1": BM25_K1,
+        "b": BM25_B
+    }
+    with open(os.path.join(store_path, BM25_FILE + ".tmp"), 'w') as f:
+        json.dump(summary, f)
+    os.replace(os.path.join(store_path, BM25_FILE + ".tmp"), os.path.join(store_path, BM25_FILE))
+
+
+def has_lexical_index(store_path) -> bool:
+    return os.path.exists(os.path.join(store_path, BM25_FILE))
+
+
+class LexicalIndex:
+    """BM25 scoring over the postings written by build_lexical_index"""
+
+    def __init__(self, store_path):
+        with open(os.path.join(store_path, BM25_FILE)) as f:
+            summary = json.load(f)
+        with open(os.path.join(store_path, BM25_TERMS_FILE)) as f:
+            self.term_ids = {term: i for i, term in enumerate(json.load(f))}
+        self.count = summary["count"]
+        self.avg_length = summary["avg_length"] or 1.0
+        self.k1 = summary["k1"]
+        self.b = summary["b"]
+        self.offsets = np.load(os.path.join(store_path, BM25_OFFSETS_FILE), mmap_mode='r')
+        self.docs = np.load(os.path.join(store_path, BM25_DOCS_FILE), mmap_mode='r')
+        self.tf = np.load(os.path.join(store_path, BM25_TF_FILE), mmap_mode='r')
+        lengths = np.load(os.path.join(store_path, BM25_LENGTHS_FILE)).astype(np.float32)
+        # Document-length part of the BM25 denominator, fixed per store
+        self.length_norm = self.k1 * (1 - self.b + self.b * lengths / self.avg_length)
+
+    def known_terms(self, text: str) -> List[str]:
+        return [term for term in dict.fromkeys(tokenize(text)) if term in self.term_ids]
+
+    def known_content_terms(self, text: str) -> List[str]:
+        """Content terms of text that occur in this store without being common to most of its chunks"""
+        known = []
+        for term in content_terms(text):
+            term_id = self.term_ids.get(term)
+            if term_id is None:
+                continue
+            df = int(self.offsets[term_id + 1]) - int(self.offsets[term_id])
+            if self.count < COMMON_TERM_MIN_CHUNKS or df <= COMMON_TERM_MAX_DF * self.count:
+                known.append(term)
+        return known
+
+    def search(self, text: str, k: int) -> List[Tuple[int, float]]:
+        """Top-k (position, score) pairs; chunks sharing no term with text are never returned"""
+        scores = np.zeros(self.count, dtype=np.float32)
+        for term in self.known_terms(text):
+            term_id = self.term_ids[term]
+            start, end = int(self.offsets[term_id]), int(self.offsets[term_id + 1])
+            docs = np.asarray(self.docs[start:end])
+            tf = np.asarray(self.tf[start:end])
+            df = end - start
+            idf = math.log(1 + (self.count - df + 0.5) / (df + 0.5))
+            scores[docs] += idf * tf * (self.k1 + 1) / (tf + self.length_norm[docs])
+
+        matched = np.flatnonzero(scores)
+        if len(matched) > k:
+            matched = matched[np.argpartition(-scores[matched], k - 1)[:k]]
+        order = sorted(matched, key=lambda position: (-scores[position], position))
+        return [(int(position), float(scores[position])) for position in order]
+
+
+def load_lexical_index(store_path) -> Optional[LexicalIndex]:
+    return LexicalIndex(store_path) if has_lexical_index(store_path) else None
@@ -0,0 +1,314 @@
+import json
+import os
+import threading
+import time
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+
+import faiss
+import numpy as np
+from django.conf import settings
+from django.db import close_old_connections
+from langchain.schema import Document
+from langchain_community.docstore.in_memory import InMemoryDocstore
+from langchain_community.vectorstores import FAISS
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+from .columnar_docstore import index_documents
+from .embeddings import EmbeddingMismatchError
+from .models import UserPDF, UserYouTubeVideo
+from .pdf_processor import PDFProcessor, pdf_reference
+from .retrieval import candidate_vectors, cosine_relevance, embed_query, mmr_select
+from .store_cache import get_store_cache
+from .store_registry import delete_store, get_store_path, persist_vector_store
+from .vector_store import load_vector_store
+from .yt_processor import video_reference
+
+SOURCE_PDF = "pdf"
+SOURCE_YOUTUBE = "youtube"
+SOURCE_TYPES = (SOURCE_PDF, SOURCE_YOUTUBE)
+
+# Lists the (source_type, source_id) pairs merged into a library store
+LIBRARY_FILE = "library.json"
+# Seconds between attempts to take a library lock held by another process
+LOCK_POLL_INTERVAL = 0.2
+
+# Background library syncs: one thread, so a process never syncs two libraries at once
+_sync_executor = None
+_scheduled = set()
+_scheduled_lock = threading.Lock()
+
+
+def library_store_name(user):
+    return f"library_{user.firebase_uid}"
+
+
+def library_store_path(user):
+    return get_store_path(library_store_name(user))
+
+
+@contextmanager
+def library_lock(user, blocking=True):
+    """Exclusive lock on a user's library across threads, web workers and job workers.
+
+    An OS file lock next to the library directory, so it is released if the
+    holder dies. Yields False without waiting when blocking is False and
+    another holder has it.
+    """
+    lock_path = library_store_path(user) + ".lock"
+    os.makedirs(os.path.dirname(lock_path), exist_ok=True)
+    with open(lock_path, 'a+b') as f:
+        while True:
+            try:
+                if fcntl:
+                    fcntl.flock(f, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                else:
+                    f.seek(0)
+                    msvcrt.locking(f.fileno(), msvcrt.LK_NBLCK, 1)
+                break
+            except OSError:
+                if not blocking:
+                    yield False
+                    return
+                time.sleep(LOCK_POLL_INTERVAL)
+        try:
+            yield True
+        finally:
+            if fcntl:
+                fcntl.flock(f, fcntl.LOCK_UN)
+            else:
+                f.seek(0)
+                msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+
+
+def user_sources(user):
+    """(source_type, source_id) -> (vector_store, title) for everything the user has ingested"""
+    sources = {}
+    for pdf_id, vector_store, file_name in UserPDF.objects.filter(user=user).values_list(
+        'id', 'vector_store', 'file_name'
+    ):
+        sources[(SOURCE_PDF, pdf_id)] = (vector_store, file_name)
+    for video_id, vector_store, video_title in UserYouTubeVideo.objects.filter(user=user).values_list(
+        'id', 'vector_store', 'video_title'
+    ):
+        sources[(SOURCE_YOUTUBE, video_id)] = (vector_store, video_title)
+    return sources
+
+
+def library_sources(store_path):
+    try:
+        with open(os.path.join(store_path, LIBRARY_FILE)) as f:
+            return {tuple(source) for source in json.load(f)["sources"]}
+    except FileNotFoundError:
+        return set()
+
+
+def store_contents(vectorstore):
+    """(documents, vectors) of a store in index order, read back without calling the embedding API"""
+    return index_documents(vectorstore), vectorstore.index.reconstruct_n(0, vectorstore.index.ntotal)
+
+
+def library_index(library):
+    """The library's faiss index, ready for in-place add and remove_ids"""
+    index = library.index
+    if not isinstance(index, faiss.Index):
+        # A library written in the mmap format before libraries were always saved as faiss
+        index = faiss.IndexFlatL2(library.index.d)
+        index.add(library.index.reconstruct_n(0, library.index.ntotal))
+    return index
+
+
+def sync_library(user, blocking=True):
+    """Bring the user's library store in line with their PDFs and videos.
+
+    The library is one flat index over the chunks of every per-document store,
+    each tagged with source_type, source_id and source_title. Only the
+    difference is applied to the index: vectors of removed sources are
+    dropped with remove_ids and the saved vectors of new sources are added,
+    so neither the library's nor any other source's vectors are read back,
+    and nothing is re-embedded. The docstore and BM25 index, however, are
+    rewritten in full from the merged documents on every sync (the BM25
+    statistics span the whole library), which costs time linear in the
+    library's chunk count. The library is always saved in the faiss
+    format so it can be updated in place. Runs under library_lock; returns
+    True if the library was rewritten, False if it was up to date or, when
+    blocking is False, another process was syncing it.
+    """
+    with library_lock(user, blocking=blocking) as locked:
+        if not locked:
+            return False
+        store_path = library_store_path(user)
+        wanted = user_sources(user)
+        current = library_sources(store_path)
+        added = [source for source in wanted if source not in current]
+        removed = current - set(wanted)
+        if not added and not removed:
+            return False
+
+        embedding_model = PDFProcessor().embedding_model
+        documents, index = [], None
+        library = None
+        if current and os.path.exists(store_path):
+            try:
+                library = load_vector_store(store_path, embedding_model)
+            except EmbeddingMismatchError as e:
+                # Built with another embedding backend: start over from the sources
+                print(f"Library for {user.firebase_uid} is rebuilt: {str(e)}")
+                current = set()
+                added = list(wanted)
+                removed = set()
+        if library is not None:
+            documents = index_documents(library)
+            index = library_index(library)
+            drop = [
+                i for i, doc in enumerate(documents)
+                if (doc.metadata["source_type"], doc.metadata["source_id"]) in removed
+            ]
+            if drop:
+                # Flat indexes compact in place, keeping the order of the remaining vectors
+                index.remove_ids(np.array(drop, dtype=np.int64))
+                dropped = set(drop)
+                documents = [doc for i, doc in enumerate(documents) if i not in dropped]
+
+        changed = library is None or bool(removed)
+        merged = [source for source in current if source not in removed]
+        for source_type, source_id in added:
+            vector_store, title = wanted[(source_type, source_id)]
+            source_path = get_store_path(vector_store)
+            if not os.path.exists(source_path):
+                print(f"Library: vector store {vector_store} not found, skipping")
+                continue
+            try:
+                source_store = load_vector_store(source_path, embedding_model)
+            except EmbeddingMismatchError as e:
+                print(f"Library: skipping vector store {vector_store}: {str(e)}")
+                continue
+            source_docs, source_vectors = store_contents(source_store)
+            if index is None:
+                index = faiss.IndexFlatL2(source_vectors.shape[1])
+            index.add(np.ascontiguousarray(source_vectors, dtype=np.float32))
+            documents += [
+                Document(page_content=doc.page_content, metadata={
+                    **doc.metadata,
+                    "source_type": source_type,
+                    "source_id": source_id,
+                    "source_title": title
+                }) for doc in source_docs
+            ]
+            merged.append((source_type, source_id))
+            changed = True
+
+        if not changed:
+            # Every new source was skipped; leave the library as it is
+            return False
+        if not documents:
+            delete_store(library_store_name(user))
+            return True
+
+        library = FAISS(
+            embedding_model,
+            index,
+            InMemoryDocstore({str(i): doc for i, doc in enumerate(documents)}),
+            {i: str(i) for i in range(len(documents))}
+        )
+        persist_vector_store(library, library_store_name(user), store_format="faiss")
+        tmp_path = os.path.join(store_path, LIBRARY_FILE + ".tmp")
+        with open(tmp_path, 'w') as f:
+            json.dump({"sources": sorted(merged)}, f)
+        os.replace(tmp_path, os.path.join(store_path, LIBRARY_FILE))
+        print(f"Library for {user.firebase_uid}: +{len(added)} -{len(removed)} sources, {len(documents)} chunks")
+        return True
+
+
+def _run_sync(user):
+    with _scheduled_lock:
+        _scheduled.discard(user.pk)
+    close_old_connections()
+    try:
+        sync_library(user)
+    except Exception as e:
+        print(f"Library update failed for {user.firebase_uid}: {str(e)}")
+        print(traceback.format_exc())
+    finally:
+        close_old_connections()
+
+
+def update_library(user):
+    """Schedule a sync_library for ingestion and delete paths, off the request.
+
+    Changes made while a sync for the same user is still waiting are picked
+    up by that sync, since it diffs against the database when it runs. A
+    failure is logged, never raised, and retried by the next update or search.
+    """
+    global _sync_executor
+    with _scheduled_lock:
+        if user.pk in _scheduled:
+            return
+        _scheduled.add(user.pk)
+        if _sync_executor is None:
+            _sync_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="library")
+    _sync_executor.submit(_run_sync, user)
+
+
+def library_reference(doc):
+    """The per-document API's reference for a chunk plus the source it came from"""
+    if doc.metadata["source_type"] == SOURCE_PDF:
+        reference = pdf_reference(doc)
+    else:
+        reference = video_reference(doc)
+    reference.update({
+        "source_type": doc.metadata["source_type"],
+        "source_id": doc.metadata["source_id"],
+        "source_title": doc.metadata["source_title"]
+    })
+    return reference
+
+
+def search_library(user, query, k=5, fetch_k=25, source_type=None):
+    """MMR search over the user's whole library, optionally limited to one source type.
+
+    Candidates are filtered by source type before MMR; the nearest-neighbour
+    search widens until fetch_k matching chunks are found or the index is
+    exhausted, so a rare source type is not crowded out. The search runs over
+    the library as it is on disk; changes whose background sync hasn't run
+    yet are scheduled with update_library and show up in later searches.
+    """
+    update_library(user)
+    store_path = library_store_path(user)
+    if not os.path.exists(store_path):
+        return []
+    processor = PDFProcessor()
+    vectorstore = get_store_cache().get_or_load(
+        library_store_name(user),
+        store_path,
+        lambda: load_vector_store(store_path, processor.embedding_model)
+    )
+
+    query_vector = np.array([embed_query(vectorstore, query)], dtype=np.float32)
+    ntotal = vectorstore.index.ntotal
+    fetch = fetch_k
+    while True:
+        _, ids = vectorstore.index.search(query_vector, min(fetch, ntotal))
+        candidates = []
+        for i in ids[0]:
+            if i == -1:
+                continue
+            doc = vectorstore.docstore.search(vectorstore.index_to_docstore_id[i])
+            if source_type is None or doc.metadata["source_type"] == source_type:
+                candidates.append((int(i), doc))
+        if len(candidates) >= fetch_k or fetch >= ntotal:
+            break
+        fetch *= 4
+    candidates = candidates[:fetch_k]
+    if not candidates:
+        return []
+
+    vectors = candidate_vectors(vectorstore, [i for i, _ in candidates])
+    selected = mmr_select(cosine_relevance(query_vector[0], vectors), vectors, k, settings.RETRIEVAL_MMR_LAMBDA)
+    return [candidates[i][1] for i in selected]
@@ -0,0 +1,204 @@
+import json
+import os
+import random
+import threading
+import time
+from collections import defaultdict, deque
+from typing import Dict, Iterator, List, Optional
+
+import numpy as np
+import requests
+from django.conf import settings
+from requests.adapters import HTTPAdapter
+
+# Status codes worth another attempt: rate limiting and upstream/server failures
+RETRY_STATUS_CODES = {429, 500, 502, 503, 504}
+
+# Latencies kept per model for the percentiles in stats()
+LATENCY_WINDOW = 1000
+
+
+class LLMError(Exception):
+    """An LLM call that failed after its retries; status_code is None for connection errors and timeouts"""
+
+    def __init__(self, message: str, status_code: Optional[int] = None):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+class LLMMetrics:
+    """Call counts and recent latencies (whole call including retries, in ms) per model"""
+
+    def __init__(self):
+        self.calls = defaultdict(int)
+        self.errors = defaultdict(int)
+        self.retries = defaultdict(int)
+        self.latencies = defaultdict(lambda: deque(maxlen=LATENCY_WINDOW))
+        self._lock = threading.Lock()
+
+    def record(self, model: str, seconds: float, retries: int, failed: bool):
+        with self._lock:
+            self.calls[model] += 1
+            self.retries[model] += retries
+            if failed:
+                self.errors[model] += 1
+            self.latencies[model].append(seconds * 1000)
+
+    def stats(self) -> Dict:
+        with self._lock:
+            stats = {}
+            for model, calls in self.calls.items():
+                latencies = np.array(self.latencies[model])
+                stats[model] = {
+                    "calls": calls,
+                    "errors": self.errors[model],
+                    "retries": self.retries[model],
+                    "p50_ms": round(float(np.percentile(latencies, 50)), 1),
+                    "p95_ms": round(float(np.percentile(latencies, 95)), 1),
+                    "p99_ms": round(float(np.percentile(latencies, 99)), 1),
+                    "mean_ms": round(float(latencies.mean()), 1),
+                }
+            return stats
+
+
+class LLMClient:
+    """Chat-completions client for an OpenAI-compatible API (Groq by default).
+
+    One requests.Session per process keeps keep-alive connections to the API
+    host, so expansion and answer calls for a question reuse the same TLS
+    connection instead of handshaking twice. Every call has connect and read
+    timeouts. 429 and 5xx responses and dropped connections are retried with
+    jittered exponential backoff, honouring Retry-After; timeouts are not
+    retried, since the upstream is already slow.
+    """
+
+    def __init__(
+        self,
+        base_url: str,
+        api_key: Optional[str],
+        connect_timeout: float = 5.0,
+        read_timeout: float = 120.0,
+        max_retries: int = 3,
+        base_delay: float = 0.5,
+        max_delay: float = 20.0,
+        pool_size: int = 10,
+    ):
+        self.base_url = base_url.rstrip("/")
+        self.api_key = api_key
+        self.timeout = (connect_timeout, read_timeout)
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.metrics = LLMMetrics()
+        self.session = requests.Session()
+        # Retries are handled in chat() so they can be counted and jittered
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size, max_retries=0)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+
+    def backoff(self, attempt: int, response=None) -> float:
+        try:
+            # Capped: a question is waiting on this call
+            return min(self.max_delay, float(response.headers.get("Retry-After")))
+        except (AttributeError, TypeError, ValueError):
+            return min(self.max_delay, self.base_delay * 2 ** attempt) * random.uniform(0.5, 1.5)
+
+    def _post(self, model: str, payload: Dict, start: float, stream: bool = False):
+        """POST a completion request, retrying as described above; returns (200 response, retries)"""
+        headers = {
+            "Authorization": f"Bearer {self.api_key}",
+            "Content-Type": "application/json"
+        }
+        attempt = 0
+        while True:
+            try:
+                response = self.session.post(
+                    f"{self.base_url}/chat/completions",
+                    json=payload,
+                    headers=headers,
+                    timeout=self.timeout,
+                    stream=stream
+                )
+            except requests.Timeout as e:
+                self.metrics.record(model, time.perf_counter() - start, attempt, failed=True)
+                raise LLMError(f"LLM request timed out: {str(e)}")
+            except requests.ConnectionError as e:
+                if attempt >= self.max_retries:
+                    self.metrics.record(model, time.perf_counter() - start, attempt, failed=True)
+                    raise LLMError(f"LLM connection failed: {str(e)}")
+                delay = self.backoff(attempt)
+            else:
+                if response.status_code == 200:
+                    return response, attempt
+                if response.status_code not in RETRY_STATUS_CODES or attempt >= self.max_retries:
+                    self.metrics.record(model, time.perf_counter() - start, attempt, failed=True)
+                    raise LLMError(
+                        f"LLM error from {self.base_url}: {response.status_code} - {response.text}",
+                        status_code=response.status_code
+                    )
+                delay = self.backoff(attempt, response)
+                response.close()
+
+            print(f"LLM call to {model} failed, retrying in {delay:.1f}s (attempt {attempt + 1}/{self.max_retries})")
+            time.sleep(delay)
+            attempt += 1
+
+    def chat(self, messages: List[Dict], model: str, **params) -> str:
+        """Content of the first choice of a chat completion; raises LLMError once retries run out"""
+        start = time.perf_counter()
+        response, retries = self._post(model, {"model": model, "messages": messages, **params}, start)
+        self.metrics.record(model, time.perf_counter() - start, retries, failed=False)
+        return response.json()["choices"][0]["message"]["content"]
+
+    def chat_stream(self, messages: List[Dict], model: str, **params) -> Iterator[str]:
+        """Yield the content deltas of a streamed chat completion as the provider sends them.
+
+        Only the request itself is retried; once tokens have been yielded a
+        failure raises LLMError, since the caller has already passed them on.
+        The read timeout applies to each gap between chunks.
+        """
+        start = time.perf_counter()
+        response, retries = self._post(
+            model, {"model": model, "messages": messages, "stream": True, **params}, start, stream=True
+        )
+        failed = True
+        try:
+            for line in response.iter_lines():
+                # Server-sent events: "data: {json chunk}" lines, ending with "data: [DONE]"
+                if not line.startswith(b"data:"):
+                    continue
+                data = line[5:].strip()
+                if data == b"[DONE]":
+                    break
+                delta = json.loads(data)["choices"][0].get("delta", {}).get("content")
+                if delta:
+                    yield delta
+            failed = False
+        except requests.RequestException as e:
+            raise LLMError(f"LLM stream interrupted: {str(e)}")
+        finally:
+            response.close()
+            self.metrics.record(model, time.perf_counter() - start, retries, failed=failed)
+
+    def stats(self) -> Dict:
+        return self.metrics.stats()
+
+
+_llm_client: Optional[LLMClient] = None
+_llm_client_lock = threading.Lock()
+
+
+def get_llm_client() -> LLMClient:
+    """Process-wide client for settings.LLM_API_BASE"""
+    global _llm_client
+    with _llm_client_lock:
+        if _llm_client is None:
+            _llm_client = LLMClient(
+                settings.LLM_API_BASE,
+                os.getenv("GROQ_API_KEY"),
+                connect_timeout=settings.LLM_CONNECT_TIMEOUT,
+                read_timeout=settings.LLM_READ_TIMEOUT,
+                max_retries=settings.LLM_MAX_RETRIES,
+                pool_size=settings.LLM_POOL_SIZE
+            )
+        return _llm_client
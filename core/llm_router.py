@@ -0,0 +1,326 @@
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Dict, Iterator, List, Optional
+
+import google.generativeai as genai
+import numpy as np
+from django.conf import settings
+
+from .llm_client import LLMError, get_llm_client
+
+# Calls kept per provider for the latency percentiles and the hedge deadline
+HEALTH_WINDOW = 200
+
+# Successful calls needed before the hedge deadline follows the provider's own p95
+MIN_HEDGE_SAMPLES = 20
+
+
+class GroqProvider:
+    """Chat completions through the pooled LLM client (Groq's OpenAI-compatible API)"""
+
+    name = "groq"
+
+    def __init__(self, model: str):
+        self.model = model
+
+    def chat(self, messages: List[Dict]) -> str:
+        return get_llm_client().chat(messages, self.model)
+
+    def chat_stream(self, messages: List[Dict]) -> Iterator[str]:
+        return get_llm_client().chat_stream(messages, self.model)
+
+
+class GeminiProvider:
+    """The same chat messages sent to Gemini; the system message becomes its system instruction"""
+
+    name = "gemini"
+
+    def __init__(self, model: str):
+        self.model = model
+
+    def _generate(self, messages: List[Dict], stream: bool = False):
+        system = "\n".join(message["content"] for message in messages if message["role"] == "system")
+        contents = [
+            {"role": "model" if message["role"] == "assistant" else "user", "parts": [message["content"]]}
+            for message in messages if message["role"] != "system"
+        ]
+        model = genai.GenerativeModel(self.model, system_instruction=system or None)
+        try:
+            return model.generate_content(
+                contents,
+                stream=stream,
+                request_options={"timeout": settings.LLM_READ_TIMEOUT}
+            )
+        except Exception as e:
+            raise LLMError(f"Gemini LLM error: {str(e)}")
+
+    def chat(self, messages: List[Dict]) -> str:
+        response = self._generate(messages)
+        try:
+            return response.text
+        except ValueError as e:
+            # No text part, e.g. the candidate was blocked
+            raise LLMError(f"Gemini LLM error: {str(e)}")
+
+    def chat_stream(self, messages: List[Dict]) -> Iterator[str]:
+        response = self._generate(messages, stream=True)
+        try:
+            for chunk in response:
+                if chunk.text:
+                    yield chunk.text
+        except Exception as e:
+            raise LLMError(f"Gemini stream interrupted: {str(e)}")
+
+
+PROVIDERS = {
+    "groq": lambda: GroqProvider(settings.LLM_GROQ_MODEL),
+    "gemini": lambda: GeminiProvider(settings.LLM_GEMINI_MODEL),
+}
+
+
+def counts_against_provider(error: Exception) -> bool:
+    """Whether a failed call says the provider is unhealthy; a 4xx other than 429 is about the request"""
+    status_code = getattr(error, "status_code", None)
+    return status_code is None or status_code == 429 or status_code >= 500
+
+
+class ProviderHealth:
+    """Recent latencies and outcomes of one provider, with a circuit breaker.
+
+    The circuit opens after LLM_CIRCUIT_FAILURES consecutive failures and
+    the provider is skipped for LLM_CIRCUIT_COOLDOWN_SECONDS. After that it
+    is half-open: one call is let through, and its outcome closes the
+    circuit or opens it for another cooldown.
+    """
+
+    def __init__(self, failure_threshold: int, cooldown: float):
+        self.failure_threshold = failure_threshold
+        self.cooldown = cooldown
+        self.latencies = deque(maxlen=HEALTH_WINDOW)
+        self.outcomes = deque(maxlen=HEALTH_WINDOW)
+        self.consecutive_failures = 0
+        self.opened_at: Optional[float] = None
+        self.trial_running = False
+        self.calls = 0
+        self.failures = 0
+        self.circuit_opens = 0
+        self._lock = threading.Lock()
+
+    def state(self) -> str:
+        if self.opened_at is None:
+            return "closed"
+        if time.monotonic() - self.opened_at < self.cooldown:
+            return "open"
+        return "half_open"
+
+    def allow(self) -> bool:
+        """Whether a call may go to the provider now; claims the trial call when half-open"""
+        with self._lock:
+            state = self.state()
+            if state == "closed":
+                return True
+            if state == "half_open" and not self.trial_running:
+                self.trial_running = True
+                return True
+            return False
+
+    def record_success(self, seconds: float):
+        with self._lock:
+            self.calls += 1
+            self.latencies.append(seconds * 1000)
+            self.outcomes.append(True)
+            self.consecutive_failures = 0
+            self.opened_at = None
+            self.trial_running = False
+
+    def record_failure(self, error: Exception):
+        with self._lock:
+            self.calls += 1
+            self.trial_running = False
+            if not counts_against_provider(error):
+                return
+            self.failures += 1
+            self.outcomes.append(False)
+            self.consecutive_failures += 1
+            if self.opened_at is not None or self.consecutive_failures >= self.failure_threshold:
+                if self.opened_at is None or self.state() == "half_open":
+                    self.circuit_opens += 1
+                self.opened_at = time.monotonic()
+
+    def hedge_delay(self) -> float:
+        """Seconds to wait before hedging: the recent p95 latency, within the configured bounds"""
+        with self._lock:
+            if len(self.latencies) < MIN_HEDGE_SAMPLES:
+                delay_ms = settings.LLM_HEDGE_DEFAULT_MS
+            else:
+                delay_ms = float(np.percentile(np.array(self.latencies), 95))
+        return min(max(delay_ms, settings.LLM_HEDGE_MIN_MS), settings.LLM_HEDGE_MAX_MS) / 1000
+
+    def stats(self) -> Dict:
+        with self._lock:
+            latencies = np.array(self.latencies)
+            stats = {
+                "state": self.state(),
+                "calls": self.calls,
+                "failures": self.failures,
+                "consecutive_failures": self.consecutive_failures,
+                "circuit_opens": self.circuit_opens,
+                "error_rate": round(self.outcomes.count(False) / len(self.outcomes), 4) if self.outcomes else 0.0,
+            }
+            if len(latencies):
+                stats["p50_ms"] = round(float(np.percentile(latencies, 50)), 1)
+                stats["p95_ms"] = round(float(np.percentile(latencies, 95)), 1)
+            return stats
+
+
+class LLMRouter:
+    """Sends chat calls to the first healthy provider and fails over to the next.
+
+    Providers are tried in the order of settings.LLM_PROVIDERS, skipping any
+    whose circuit is open. chat(hedge=True) is for short latency-critical
+    calls such as query expansion: when the first provider has not answered
+    by its p95-derived deadline, the same call goes to the next provider as
+    well and whichever answer arrives first is used. The slower call is left
+    to finish in the background (an HTTP request cannot be withdrawn) and
+    still counts towards its provider's health.
+    """
+
+    def __init__(self, providers: List, failure_threshold: int = 5, cooldown: float = 30.0, hedge_workers: int = 8):
+        if not providers:
+            raise Exception("No LLM providers configured")
+        self.providers = providers
+        self.health = {provider.name: ProviderHealth(failure_threshold, cooldown) for provider in providers}
+        self.hedges = 0
+        self.hedge_wins = 0
+        self.failovers = 0
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=hedge_workers, thread_name_prefix="llm-hedge")
+
+    def available(self) -> Iterator:
+        """Providers in preference order whose circuit lets a call through, checked as they are reached.
+
+        Checking lazily matters: allow() claims a half-open provider's trial
+        call, which must not be claimed for a provider that is never called.
+        """
+        yielded = False
+        for provider in self.providers:
+            if self.health[provider.name].allow():
+                yielded = True
+                yield provider
+        if not yielded:
+            # With every circuit open, trying the preferred provider beats failing outright
+            yield self.providers[0]
+
+    def _call(self, provider, messages: List[Dict]) -> str:
+        health = self.health[provider.name]
+        start = time.perf_counter()
+        try:
+            content = provider.chat(messages)
+        except Exception as e:
+            health.record_failure(e)
+            raise
+        health.record_success(time.perf_counter() - start)
+        return content
+
+    def _count(self, counter: str):
+        with self._lock:
+            setattr(self, counter, getattr(self, counter) + 1)
+
+    def chat(self, messages: List[Dict], hedge: bool = False) -> str:
+        providers = self.available()
+        if hedge:
+            return self._hedged_chat(messages, providers)
+        error = None
+        for index, provider in enumerate(providers):
+            if index:
+                self._count("failovers")
+                print(f"LLM failover to {provider.name} after: {str(error)}")
+            try:
+                return self._call(provider, messages)
+            except Exception as e:
+                error = e
+        raise error
+
+    def _hedged_chat(self, messages: List[Dict], providers: Iterator) -> str:
+        primary = next(providers)
+        futures = {self._executor.submit(self._call, primary, messages): primary}
+        done, _ = wait(futures, timeout=self.health[primary.name].hedge_delay())
+        hedged = not done
+        if hedged or next(iter(done)).exception() is not None:
+            alternate = next(providers, None)
+            if alternate is not None:
+                if hedged:
+                    self._count("hedges")
+                    print(f"LLM call to {primary.name} past its deadline, hedging with {alternate.name}")
+                else:
+                    self._count("failovers")
+                futures[self._executor.submit(self._call, alternate, messages)] = alternate
+
+        error = None
+        pending = set(futures)
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                if future.exception() is None:
+                    if hedged and futures[future] is not primary:
+                        self._count("hedge_wins")
+                    return future.result()
+                error = future.exception()
+        raise error
+
+    def chat_stream(self, messages: List[Dict]) -> Iterator[str]:
+        """Stream from the first healthy provider; fails over only until the first delta has been yielded"""
+        error = None
+        for index, provider in enumerate(self.available()):
+            if index:
+                self._count("failovers")
+                print(f"LLM failover to {provider.name} after: {str(error)}")
+            health = self.health[provider.name]
+            start = time.perf_counter()
+            started = False
+            try:
+                for delta in provider.chat_stream(messages):
+                    started = True
+                    yield delta
+            except Exception as e:
+                health.record_failure(e)
+                if started:
+                    raise
+                error = e
+                continue
+            health.record_success(time.perf_counter() - start)
+            return
+        raise error
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {
+                "providers": {name: health.stats() for name, health in self.health.items()},
+                "hedges": self.hedges,
+                "hedge_wins": self.hedge_wins,
+                "failovers": self.failovers,
+            }
+
+
+_llm_router: Optional[LLMRouter] = None
+_llm_router_lock = threading.Lock()
+
+
+def get_llm_router() -> LLMRouter:
+    """Process-wide router over settings.LLM_PROVIDERS"""
+    global _llm_router
+    with _llm_router_lock:
+        if _llm_router is None:
+            names = [name.strip() for name in settings.LLM_PROVIDERS.split(",") if name.strip()]
+            unknown = [name for name in names if name not in PROVIDERS]
+            if unknown:
+                raise Exception(f"Unknown LLM providers: {', '.join(unknown)}")
+            _llm_router = LLMRouter(
+                [PROVIDERS[name]() for name in names],
+                failure_threshold=settings.LLM_CIRCUIT_FAILURES,
+                cooldown=settings.LLM_CIRCUIT_COOLDOWN_SECONDS,
+                hedge_workers=settings.LLM_HEDGE_WORKERS
+            )
+        return _llm_router
@@ -0,0 +1,457 @@
+import json
+import random
+import threading
+import time
+from collections import defaultdict
+from contextlib import ExitStack, contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Optional
+from unittest import mock
+
+import numpy as np
+
+# Faked external services and their default latency in ms, roughly what each takes in production
+DEFAULT_LATENCY_MS = {
+    "groq": 800,
+    "gemini": 600,
+    "embeddings": 150,
+    "tavily": 400,
+    "youtube_search": 300,
+    "yt_dlp": 250,
+    "transcripts": 200,
+    "firebase": 5,
+}
+
+# Words the synthetic books, transcripts and questions are made of
+VOCABULARY = (
+    "cell membrane nucleus mitochondria protein enzyme energy glucose photosynthesis chlorophyll "
+    "respiration oxygen carbon dioxide water osmosis diffusion tissue organ system blood heart "
+    "lungs kidney neuron signal hormone gene chromosome mutation evolution species habitat "
+    "ecosystem population predator prey nutrient soil root stem leaf flower seed pollen "
+    "bacteria virus immunity vaccine antibody temperature pressure force motion velocity "
+    "acceleration mass gravity friction electricity current voltage magnet atom molecule "
+    "reaction acid base salt solution"
+).split()
+
+SENTENCE_TEMPLATES = (
+    "The {0} plays an important role in how the {1} interacts with the {2}.",
+    "Scientists measure the {0} to understand changes in {1} and {2}.",
+    "Without enough {0}, the {1} cannot support the {2} for long.",
+    "A change in {0} affects both the {1} and the surrounding {2}.",
+    "Students often confuse the {0} with the {1}, but only the {0} controls the {2}.",
+    "In the experiment the {0} increased while the {1} stayed close to the {2}.",
+)
+
+QUESTION_TEMPLATES = (
+    "What is the role of the {0} in the {1}?",
+    "How does {0} affect {1}?",
+    "Explain the relation between {0} and {1}.",
+    "Why is {0} important for the {1}?",
+)
+
+
+class FakeServiceError(Exception):
+    """A failure injected into a faked external service"""
+
+
+class Faults:
+    """Latency and error injection shared by every fake.
+
+    Each call to a faked service sleeps for the service's latency, varied by
+    +/- jitter (a fraction), and fails with the service's error rate.
+    """
+
+    def __init__(self, latency_ms: Dict[str, float], error_rate: Dict[str, float], jitter: float = 0.5,
+                 seed: Optional[int] = None):
+        self.latency_ms = latency_ms
+        self.error_rate = error_rate
+        self.jitter = jitter
+        self.calls = defaultdict(int)
+        self.injected_errors = defaultdict(int)
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def should_fail(self, service: str) -> bool:
+        """Wait out the service's latency; True if this call is one of the injected failures"""
+        with self._lock:
+            self.calls[service] += 1
+            delay_ms = self.latency_ms.get(service, 0) * self._rng.uniform(1 - self.jitter, 1 + self.jitter)
+            failed = self._rng.random() < self.error_rate.get(service, 0)
+            if failed:
+                self.injected_errors[service] += 1
+        time.sleep(max(delay_ms, 0) / 1000)
+        return failed
+
+    def apply(self, service: str):
+        if self.should_fail(service):
+            raise FakeServiceError(f"Injected {service} failure")
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {
+                service: {"calls": self.calls[service], "injected_errors": self.injected_errors[service]}
+                for service in sorted(self.calls)
+            }
+
+
+def synthetic_sentences(seed: str, count: int) -> List[str]:
+    rng = random.Random(seed)
+    return [
+        rng.choice(SENTENCE_TEMPLATES).format(*rng.sample(VOCABULARY, 3))
+        for _ in range(count)
+    ]
+
+
+def synthetic_questions(seed: str, count: int) -> List[str]:
+    """Questions about the words of synthetic_sentences(seed, ...); drawn from a small pool, as real classes repeat"""
+    rng = random.Random(f"questions-{seed}")
+    return [
+        rng.choice(QUESTION_TEMPLATES).format(*rng.sample(VOCABULARY, 2))
+        for _ in range(count)
+    ]
+
+
+def synthetic_pdf(seed: str, pages: int = 4, lines_per_page: int = 50) -> bytes:
+    """A text PDF of synthetic_sentences(seed), one sentence per line, readable by PyPDFLoader"""
+    sentences = synthetic_sentences(seed, pages * lines_per_page)
+    objects = {
+        1: "<< /Type /Catalog /Pages 2 0 R >>",
+        2: "<< /Type /Pages /Kids [{}] /Count {} >>".format(
+            " ".join(f"{4 + 2 * page} 0 R" for page in range(pages)), pages
+        ),
+        3: "<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>",
+    }
+    for page in range(pages):
+        lines = sentences[page * lines_per_page:(page + 1) * lines_per_page]
+        # Sentences are plain words and punctuation, so nothing needs escaping inside ( )
+        stream = "BT /F1 10 Tf 12 TL 40 770 Td " + " ".join(f"({line}) Tj T*" for line in lines) + " ET"
+        objects[4 + 2 * page] = (
+            "<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] "
+            f"/Resources << /Font << /F1 3 0 R >> >> /Contents {5 + 2 * page} 0 R >>"
+        )
+        objects[5 + 2 * page] = f"<< /Length {len(stream)} >>\nstream\n{stream}\nendstream"
+
+    pdf = b"%PDF-1.4\n"
+    offsets = []
+    for number in sorted(objects):
+        offsets.append(len(pdf))
+        pdf += f"{number} 0 obj\n{objects[number]}\nendobj\n".encode("latin-1")
+    xref = len(pdf)
+    pdf += f"xref\n0 {len(objects) + 1}\n0000000000 65535 f \n".encode("latin-1")
+    pdf += "".join(f"{offset:010d} 00000 n \n" for offset in offsets).encode("latin-1")
+    pdf += f"trailer\n<< /Size {len(objects) + 1} /Root 1 0 R >>\nstartxref\n{xref}\n%%EOF\n".encode("latin-1")
+    return pdf
+
+
+def synthetic_transcript(video_id: str, entries: int = 150) -> List[Dict]:
+    """youtube-transcript-api style entries, about six seconds each"""
+    return [
+        {"text": sentence, "start": index * 6.0, "duration": 6.0}
+        for index, sentence in enumerate(synthetic_sentences(video_id, entries))
+    ]
+
+
+def synthetic_video_id(number: int) -> str:
+    # Eleven characters, like a real video id
+    return f"loadtest{number:03d}"
+
+
+def fake_completion(prompt: str) -> str:
+    """An LLM reply in the shape each prompt asks for"""
+    words = [word for word in VOCABULARY if word in prompt][:6] or VOCABULARY[:3]
+    if "Expanded" in prompt or "विस्तारित" in prompt:
+        return f"A detailed question about {', '.join(words)} and how they relate."
+    if "chapter names" in prompt:
+        return "\n".join(
+            f"{number}. {word.title()} Basics: Structure, Function, Examples"
+            for number, word in enumerate(VOCABULARY[:10], start=1)
+        )
+    if "multiple choice questions" in prompt:
+        return "\n".join(
+            f"{number}. What controls the {word}?\na) The {word}*\nb) Water\nc) Soil\nd) Light\n"
+            f"Timestamp: [00:00:{number * 6:02d},000]\nSeconds: {number * 6}\n"
+            f"Watch at: https://youtu.be/VIDEO_ID?t={number * 6}s\n"
+            f"Explaination: The {word} is described in the video.\n"
+            for number, word in enumerate(words[:5], start=1)
+        )
+    return (
+        f"<think>The question is about {words[0]}.</think>"
+        f"<thinking>The context mentions {', '.join(words)}.</thinking>"
+        f"<answer>The {words[0]} is linked to {', '.join(words[1:]) or 'the rest of the system'} "
+        "as the context describes.</answer>"
+    )
+
+
+class FakeLLMServer:
+    """OpenAI-compatible /chat/completions on localhost, standing in for Groq.
+
+    Injected failures are failure_status responses (503 by default), which
+    LLMClient retries like a real outage. Streamed requests get the whole
+    reply as one delta.
+    """
+
+    def __init__(self, faults: Faults, failure_status: int = 503):
+        self.faults = faults
+        self.failure_status = failure_status
+        self.server = None
+
+    def start(self) -> str:
+        """Start serving; returns the base URL to use as LLM_API_BASE"""
+        faults = self.faults
+        failure_status = self.failure_status
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, format, *args):
+                pass
+
+            def do_POST(self):
+                payload = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+                if faults.should_fail("groq"):
+                    body = json.dumps({"error": {"message": "Injected groq failure"}}).encode()
+                    self.send_response(failure_status)
+                    self.send_header("Content-Type", "application/json")
+                    self.send_header("Content-Length", str(len(body)))
+                    self.end_headers()
+                    self.wfile.write(body)
+                    return
+                content = fake_completion(payload["messages"][-1]["content"])
+                if payload.get("stream"):
+                    chunk = json.dumps({"choices": [{"delta": {"content": content}}]})
+                    body = f"data: {chunk}\n\ndata: [DONE]\n\n".encode()
+                    content_type = "text/event-stream"
+                else:
+                    body = json.dumps({"choices": [{"message": {"content": content}}]}).encode()
+                    content_type = "application/json"
+                self.send_response(200)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.server.daemon_threads = True
+        # Clients that time out or cancel a hedged call hang up mid-reply; that's expected here
+        self.server.handle_error = lambda request, client_address: None
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        return f"http://127.0.0.1:{self.server.server_port}"
+
+    def stop(self):
+        if self.server is not None:
+            self.server.shutdown()
+            self.server.server_close()
+
+
+class FakeResponse:
+    """google.generativeai response: .text, and iterable as chunks when streamed"""
+
+    def __init__(self, text: str):
+        self.text = text
+
+    def __iter__(self):
+        return iter([FakeResponse(self.text)])
+
+
+def fake_generative_model(faults: Faults):
+    class FakeGenerativeModel:
+        def __init__(self, model_name: str = "", **kwargs):
+            self.model_name = model_name
+
+        def generate_content(self, contents, stream: bool = False, **kwargs):
+            faults.apply("gemini")
+            if isinstance(contents, str):
+                prompt = contents
+            else:
+                prompt = "\n".join(
+                    part for content in contents
+                    for part in (content.get("parts", []) if isinstance(content, dict) else [str(content)])
+                )
+            return FakeResponse(fake_completion(prompt))
+
+    return FakeGenerativeModel
+
+
+def fake_google_embeddings(faults: Faults):
+    from .embeddings import HashingEmbeddingBackend
+
+    class FakeGoogleEmbeddings:
+        """GoogleGenerativeAIEmbeddings with hashed vectors of the Gemini embedding size"""
+
+        def __init__(self, model: str = "", **kwargs):
+            self.model = model
+            self.hashing = HashingEmbeddingBackend(768)
+
+        def embed_documents(self, texts: List[str], **kwargs) -> List[List[float]]:
+            faults.apply("embeddings")
+            return self.hashing.embed_documents(texts)
+
+        def embed_query(self, text: str, **kwargs) -> List[float]:
+            faults.apply("embeddings")
+            return self.hashing.embed_query(text)
+
+    return FakeGoogleEmbeddings
+
+
+def fake_tavily(faults: Faults):
+    class FakeTavilyClient:
+        def search(self, query: str, max_results: int = 5, **kwargs) -> Dict:
+            faults.apply("tavily")
+            return {"results": [
+                {"title": f"{query} - guide {number}", "url": f"https://example.org/guide/{number}"}
+                for number in range(max_results)
+            ]}
+
+    return FakeTavilyClient()
+
+
+def fake_youtube_search(faults: Faults):
+    class FakeYoutubeSearch:
+        def __init__(self, query: str, max_results: int = 10):
+            faults.apply("youtube_search")
+            self.results = [
+                {
+                    "title": f"{query} part {number}",
+                    "url_suffix": f"/watch?v={synthetic_video_id(number)}",
+                    "channel": "Load Test Academy",
+                    "duration": f"{5 + number}:30",
+                }
+                for number in range(max_results)
+            ]
+
+        def to_dict(self) -> List[Dict]:
+            return self.results
+
+    return FakeYoutubeSearch
+
+
+def fake_youtube_dl(faults: Faults):
+    class FakeYoutubeDL:
+        def __init__(self, options=None):
+            self.options = options
+
+        def __enter__(self):
+            return self
+
+        def __exit__(self, *exc_info):
+            return False
+
+        def extract_info(self, url: str, download: bool = False) -> Dict:
+            faults.apply("yt_dlp")
+            return {
+                "title": f"Lecture {url.rsplit('=', 1)[-1]}",
+                "description": "Synthetic lecture",
+                "thumbnail": "https://example.org/thumbnail.jpg",
+                "duration": 900,
+                "view_count": 1000,
+                "upload_date": "20240101",
+            }
+
+    return FakeYoutubeDL
+
+
+def fake_get_transcript(faults: Faults):
+    def get_transcript(video_id: str, languages=("en",)):
+        faults.apply("transcripts")
+        if "en" not in languages:
+            raise FakeServiceError(f"No {', '.join(languages)} transcript for {video_id}")
+        return synthetic_transcript(video_id)
+
+    return get_transcript
+
+
+def fake_list_transcripts(faults: Faults):
+    def list_transcripts(video_id: str):
+        faults.apply("transcripts")
+        raise FakeServiceError(f"No generated transcripts for {video_id}")
+
+    return list_transcripts
+
+
+def fake_verify_id_token(faults: Faults):
+    def verify_id_token(token: str, *args, **kwargs) -> Dict:
+        faults.apply("firebase")
+        return {"uid": token, "email": f"{token}@loadtest.local"}
+
+    return verify_id_token
+
+
+@contextmanager
+def fake_external_services(faults: Faults):
+    """Patch every external client the app calls with the fakes above, for the duration of the block.
+
+    Groq is not patched: point LLM_API_BASE at a FakeLLMServer. The
+    process-wide clients and caches are reset, so they are created again
+    under the settings in force (and dropped again on exit).
+    """
+    import google.generativeai as genai
+    from youtube_transcript_api import YouTubeTranscriptApi
+
+    from . import embedding_cache, embeddings, firebase_auth, llm_client, llm_router, query_cache, utils, yt_processor
+
+    gemini = fake_generative_model(faults)
+    patches = [
+        (genai, "GenerativeModel", gemini),
+        (utils, "model", gemini("gemini-2.5-flash")),
+        (utils, "tavily", fake_tavily(faults)),
+        (utils, "YoutubeSearch", fake_youtube_search(faults)),
+        (yt_processor, "YoutubeDL", fake_youtube_dl(faults)),
+        (YouTubeTranscriptApi, "get_transcript", fake_get_transcript(faults)),
+        (YouTubeTranscriptApi, "list_transcripts", fake_list_transcripts(faults)),
+        (firebase_auth.auth, "verify_id_token", fake_verify_id_token(faults)),
+        (llm_client, "_llm_client", None),
+        (llm_router, "_llm_router", None),
+        (embeddings, "_backends", {}),
+        (embedding_cache, "_embedding_cache", None),
+        (query_cache, "_query_cache", None),
+    ]
+    try:
+        import langchain_google_genai
+        patches.append((langchain_google_genai, "GoogleGenerativeAIEmbeddings", fake_google_embeddings(faults)))
+    except ImportError:
+        # Only needed with EMBEDDING_BACKEND=google, which cannot work without it anyway
+        pass
+
+    with ExitStack() as stack:
+        for target, attribute, value in patches:
+            # create=True: newer youtube-transcript-api releases dropped the static methods the app calls
+            stack.enter_context(mock.patch.object(target, attribute, value, create=True))
+        yield
+
+
+class LatencyRecorder:
+    """Latency of every request per endpoint, for the p50/p95/p99 and throughput report"""
+
+    def __init__(self):
+        self.latencies = defaultdict(list)
+        self.errors = defaultdict(int)
+        self._lock = threading.Lock()
+
+    def record(self, endpoint: str, seconds: float, ok: bool):
+        with self._lock:
+            self.latencies[endpoint].append(seconds * 1000)
+            if not ok:
+                self.errors[endpoint] += 1
+
+    def report(self, elapsed: float) -> List[Dict]:
+        """One row per endpoint plus a "total" row; rps is over the whole run's wall time"""
+        with self._lock:
+            series = dict(self.latencies)
+            series["total"] = [value for values in self.latencies.values() for value in values]
+            errors = dict(self.errors)
+            errors["total"] = sum(self.errors.values())
+        rows = []
+        for endpoint, values in series.items():
+            if not values:
+                continue
+            values = np.array(values)
+            rows.append({
+                "endpoint": endpoint,
+                "requests": len(values),
+                "errors": errors.get(endpoint, 0),
+                "p50_ms": round(float(np.percentile(values, 50)), 1),
+                "p95_ms": round(float(np.percentile(values, 95)), 1),
+                "p99_ms": round(float(np.percentile(values, 99)), 1),
+                "rps": round(len(values) / elapsed, 2) if elapsed else 0.0,
+            })
+        return rows
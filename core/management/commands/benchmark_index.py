@@ -0,0 +1,79 @@
+import os
+import random
+import time
+
+import faiss
+import numpy as np
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from core.embedding_cache import get_embedding_cache
+from core.embedding_scheduler import get_embedding_scheduler
+from core.pdf_processor import PDFProcessor
+from core.quantized_index import INDEX_TYPES, build_index
+
+
+def percentile(values, pct):
+    return float(np.percentile(values, pct)) if values else 0.0
+
+
+class Command(BaseCommand):
+    help = "Compare recall@k, size and search latency of the compressed index types against the flat index"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--pdf', default=os.path.join(settings.BASE_DIR, 'book2.pdf'))
+        parser.add_argument('--k', type=int, default=5)
+        parser.add_argument('--queries', type=int, default=100, help="Chunks sampled to build queries from")
+        parser.add_argument('--types', default=",".join(INDEX_TYPES))
+        parser.add_argument('--seed', type=int, default=0)
+
+    def handle(self, *args, **options):
+        if not os.path.exists(options['pdf']):
+            raise CommandError(f"PDF not found: {options['pdf']}")
+        index_types = [name.strip() for name in options['types'].split(",") if name.strip()]
+        unknown = set(index_types) - set(INDEX_TYPES)
+        if unknown:
+            raise CommandError(f"Unknown index types: {', '.join(sorted(unknown))}")
+        k = options['k']
+
+        processor = PDFProcessor()
+        chunks = processor.process_pdf(options['pdf'])
+        embed = lambda texts: np.array(get_embedding_cache().embed_documents(
+            texts,
+            get_embedding_scheduler(processor.embedding_model),
+            processor.embedding_model_name
+        ), dtype=np.float32)
+        vectors = embed([chunk.page_content for chunk in chunks])
+
+        # Queries are the opening words of sampled chunks, so the nearest chunk
+        # is known but not an exact duplicate of the query
+        rng = random.Random(options['seed'])
+        sample = rng.sample(chunks, min(options['queries'], len(chunks)))
+        queries = embed([" ".join(chunk.page_content.split()[:20]) for chunk in sample])
+
+        flat = build_index(vectors, "flat")
+        _, truth = flat.search(queries, k)
+
+        self.stdout.write(f"{len(vectors)} vectors, dim {vectors.shape[1]}, {len(queries)} queries, k={k}")
+        self.stdout.write(
+            f"{'index':<8}{'recall@k':>10}{'bytes':>12}{'ratio':>8}{'build_s':>10}{'p50_ms':>9}{'p95_ms':>9}"
+        )
+        flat_bytes = len(faiss.serialize_index(flat))
+        for index_type in index_types:
+            start = time.perf_counter()
+            index = build_index(vectors, index_type)
+            build_seconds = time.perf_counter() - start
+
+            latencies = []
+            found = np.empty((len(queries), k), dtype=np.int64)
+            for i, query in enumerate(queries):
+                start = time.perf_counter()
+                found[i] = index.search(query[None, :], k)[1][0]
+                latencies.append((time.perf_counter() - start) * 1000)
+
+            recall = np.mean([len(set(found[i]) & set(truth[i])) / k for i in range(len(queries))])
+            size = len(faiss.serialize_index(index))
+            self.stdout.write(
+                f"{index_type:<8}{recall:>10.3f}{size:>12}{flat_bytes / size:>8.1f}{build_seconds:>10.3f}"
+                f"{percentile(latencies, 50):>9.3f}{percentile(latencies, 95):>9.3f}"
+            )
@@ -0,0 +1,102 @@
+import os
+import random
+import time
+
+import numpy as np
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from langchain_community.vectorstores import FAISS
+
+from core.embedding_cache import get_embedding_cache
+from core.embedding_scheduler import get_embedding_scheduler
+from core.pdf_processor import PDFProcessor
+from core.retrieval import mmr_search
+
+
+def percentile(values, pct):
+    return float(np.percentile(values, pct)) if values else 0.0
+
+
+def timed(search, queries, repeat):
+    """Per-call latencies in ms and the results of the last round"""
+    latencies, results = [], []
+    for round_num in range(repeat):
+        results = []
+        for query in queries:
+            start = time.perf_counter()
+            results.append(search(query))
+            latencies.append((time.perf_counter() - start) * 1000)
+    return latencies, results
+
+
+class Command(BaseCommand):
+    help = "Compare latency of LangChain's MMR search with the NumPy mmr_search, and check they pick the same chunks"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--pdf', default=os.path.join(settings.BASE_DIR, 'book2.pdf'))
+        parser.add_argument('--k', type=int, default=5)
+        parser.add_argument('--fetch-k', default="25,100,200", help="Comma-separated fetch_k values")
+        parser.add_argument('--lambda', dest='lambda_mult', type=float, default=0.5)
+        parser.add_argument('--queries', type=int, default=100, help="Chunks sampled to build queries from")
+        parser.add_argument('--repeat', type=int, default=3)
+        parser.add_argument('--seed', type=int, default=0)
+
+    def handle(self, *args, **options):
+        if not os.path.exists(options['pdf']):
+            raise CommandError(f"PDF not found: {options['pdf']}")
+        try:
+            fetch_ks = [int(value) for value in options['fetch_k'].split(",") if value.strip()]
+        except ValueError:
+            raise CommandError("--fetch-k must be comma-separated integers")
+        k, lambda_mult = options['k'], options['lambda_mult']
+
+        processor = PDFProcessor()
+        chunks = processor.process_pdf(options['pdf'])
+        texts = [chunk.page_content for chunk in chunks]
+        embed = lambda batch: get_embedding_cache().embed_documents(
+            batch,
+            get_embedding_scheduler(processor.embedding_model),
+            processor.embedding_model_name
+        )
+        vectorstore = FAISS.from_embeddings(
+            list(zip(texts, embed(texts))),
+            processor.embedding_model,
+            metadatas=[chunk.metadata for chunk in chunks]
+        )
+
+        # Queries are the opening words of sampled chunks, embedded once up front
+        rng = random.Random(options['seed'])
+        sample = rng.sample(chunks, min(options['queries'], len(chunks)))
+        queries = [np.array(vector, dtype=np.float32) for vector in embed(
+            [" ".join(chunk.page_content.split()[:20]) for chunk in sample]
+        )]
+
+        self.stdout.write(f"{vectorstore.index.ntotal} vectors, {len(queries)} queries x {options['repeat']}, "
+                          f"k={k}, lambda={lambda_mult}")
+        self.stdout.write(
+            f"{'fetch_k':>8}{'lc_p50_ms':>11}{'lc_p95_ms':>11}{'np_p50_ms':>11}{'np_p95_ms':>11}"
+            f"{'speedup':>9}{'same':>7}"
+        )
+        for fetch_k in fetch_ks:
+            langchain_ms, langchain_docs = timed(
+                lambda query: vectorstore.max_marginal_relevance_search_by_vector(
+                    query.tolist(), k=k, fetch_k=fetch_k, lambda_mult=lambda_mult
+                ),
+                queries,
+                options['repeat']
+            )
+            numpy_ms, numpy_docs = timed(
+                lambda query: mmr_search(vectorstore, query, k=k, fetch_k=fetch_k, lambda_mult=lambda_mult),
+                queries,
+                options['repeat']
+            )
+            # Share of queries where both paths return the same chunks in the same order
+            same = np.mean([
+                [doc.metadata['chunk_id'] for doc in a] == [doc.metadata['chunk_id'] for doc in b]
+                for a, b in zip(langchain_docs, numpy_docs)
+            ])
+            self.stdout.write(
+                f"{fetch_k:>8}{percentile(langchain_ms, 50):>11.3f}{percentile(langchain_ms, 95):>11.3f}"
+                f"{percentile(numpy_ms, 50):>11.3f}{percentile(numpy_ms, 95):>11.3f}"
+                f"{percentile(langchain_ms, 50) / max(percentile(numpy_ms, 50), 1e-9):>9.1f}{same:>7.2f}"
+            )
@@ -0,0 +1,47 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from core.models import VectorStoreRecord
+from core.pdf_processor import PDFProcessor
+from core.store_cache import get_store_cache
+from core.store_registry import get_store_path, record_store
+from core.vector_store import convert_vector_store
+
+
+class Command(BaseCommand):
+    help = "Rewrite registered vector stores in the given format with the columnar docstore and BM25 index"
+
+    def add_arguments(self, parser):
+        parser.add_argument('store_names', nargs='*', help="Stores to convert (default: all registered stores)")
+        parser.add_argument(
+            '--format',
+            choices=['faiss', 'mmap'],
+            default=settings.VECTORSTORE_FORMAT,
+            help="Target format (default: VECTORSTORE_FORMAT)"
+        )
+
+    def handle(self, *args, **options):
+        store_names = options['store_names'] or list(
+            VectorStoreRecord.objects.order_by('name').values_list('name', flat=True)
+        )
+        # Conversion only reads stored vectors, it never calls the embedding API
+        embedding_model = PDFProcessor().embedding_model
+
+        failed = 0
+        for store_name in store_names:
+            store_path = get_store_path(store_name)
+            try:
+                count = convert_vector_store(store_path, embedding_model, options['format'])
+            except Exception as e:
+                failed += 1
+                self.stderr.write(f"{store_name}: failed - {str(e)}")
+                continue
+            get_store_cache().invalidate(store_name)
+            if count is None:
+                self.stdout.write(f"{store_name}: already converted")
+            else:
+                record_store(store_name, count)
+                self.stdout.write(f"{store_name}: converted {count} vectors")
+
+        if failed:
+            raise CommandError(f"{failed} store(s) could not be converted")
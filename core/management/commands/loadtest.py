@@ -0,0 +1,265 @@
+import os
+import random
+import shutil
+import tempfile
+import threading
+import time
+from contextlib import ExitStack, redirect_stdout
+from pathlib import Path
+
+import requests
+from django.core.management.base import BaseCommand, CommandError
+from django.core.servers.basehttp import ThreadedWSGIServer, WSGIRequestHandler
+from django.core.wsgi import get_wsgi_application
+from django.db import connection
+from django.test.utils import override_settings
+
+from core.load_testing import (
+    DEFAULT_LATENCY_MS, FakeLLMServer, Faults, LatencyRecorder, fake_external_services,
+    synthetic_pdf, synthetic_questions, synthetic_video_id
+)
+
+SCENARIOS = ("ask", "ask_video", "ask_batch", "upload", "youtube", "chapter", "mcq")
+
+# Mostly students asking about material already uploaded, some teachers uploading and planning
+DEFAULT_MIX = "ask=50,ask_video=15,ask_batch=3,upload=5,youtube=5,chapter=15,mcq=7"
+
+
+def parse_pairs(value, option, cast, allowed):
+    """"name=value,..." into a dict, rejecting unknown names"""
+    pairs = {}
+    for item in value.split(","):
+        if not item.strip():
+            continue
+        name, _, number = item.partition("=")
+        name = name.strip()
+        if name not in allowed:
+            raise CommandError(f"{option}: unknown name {name!r} (expected one of {', '.join(allowed)})")
+        try:
+            pairs[name] = cast(number)
+        except ValueError:
+            raise CommandError(f"{option}: {item!r} is not name=number")
+    return pairs
+
+
+class QuietRequestHandler(WSGIRequestHandler):
+    def log_message(self, format, *args):
+        pass
+
+
+class Corpus:
+    """The synthetic books and videos the virtual users upload and ask about"""
+
+    def __init__(self, documents, seed):
+        self.pdfs = [synthetic_pdf(f"{seed}-book-{number}") for number in range(documents)]
+        self.pdf_questions = [synthetic_questions(f"{seed}-book-{number}", 30) for number in range(documents)]
+        self.video_urls = [
+            f"https://www.youtube.com/watch?v={synthetic_video_id(number)}" for number in range(documents)
+        ]
+        self.video_questions = [synthetic_questions(synthetic_video_id(number), 30) for number in range(documents)]
+
+
+class VirtualUser:
+    """One signed-in user with their own token and connection, running scenarios one after another"""
+
+    def __init__(self, number, base_url, corpus, recorder, seed):
+        self.base_url = base_url
+        self.corpus = corpus
+        self.recorder = recorder
+        self.rng = random.Random(f"{seed}-user-{number}")
+        self.session = requests.Session()
+        self.session.headers["Authorization"] = f"Bearer loadtest-user-{number}"
+        self.pdfs = []
+        self.videos = []
+
+    def post(self, path, **kwargs):
+        """POST to the app, recording the latency under the path; the JSON body, or None if it failed"""
+        start = time.perf_counter()
+        try:
+            response = self.session.post(f"{self.base_url}{path}", timeout=300, **kwargs)
+            ok = response.status_code < 400
+        except requests.RequestException:
+            response, ok = None, False
+        self.recorder.record(f"POST {path}", time.perf_counter() - start, ok)
+        if not ok:
+            return None
+        try:
+            return response.json()
+        except ValueError:
+            return None
+
+    def upload(self):
+        number = self.rng.randrange(len(self.corpus.pdfs))
+        result = self.post(
+            "/api/process-pdf/",
+            files={"pdf": (f"book{number}.pdf", self.corpus.pdfs[number], "application/pdf")}
+        )
+        if result:
+            self.pdfs.append((result["data"]["id"], number))
+
+    def youtube(self):
+        number = self.rng.randrange(len(self.corpus.video_urls))
+        result = self.post("/api/process-youtube/", json={"video_url": self.corpus.video_urls[number]})
+        if result:
+            self.videos.append((result["data"]["id"], number))
+
+    def ask(self):
+        if not self.pdfs:
+            return self.upload()
+        pdf_id, number = self.rng.choice(self.pdfs)
+        self.post("/api/answer-question/", json={
+            "pdf_id": pdf_id,
+            "question": self.rng.choice(self.corpus.pdf_questions[number])
+        })
+
+    def ask_video(self):
+        if not self.videos:
+            return self.youtube()
+        video_id, number = self.rng.choice(self.videos)
+        self.post("/api/ask-youtube-question/", json={
+            "video_id": video_id,
+            "question": self.rng.choice(self.corpus.video_questions[number])
+        })
+
+    def ask_batch(self):
+        if not self.pdfs:
+            return self.upload()
+        pdf_id, number = self.rng.choice(self.pdfs)
+        self.post("/api/answer-questions/", json={
+            "pdf_id": pdf_id,
+            "questions": self.rng.sample(self.corpus.pdf_questions[number], 10)
+        })
+
+    def chapter(self):
+        """Generate a chapter list, then fetch videos and websites for one chapter, as the frontend does"""
+        topic = self.rng.choice(["Biology", "Physics", "Chemistry", "Ecology"])
+        grade = self.rng.choice(["8th", "10th", "12th"])
+        result = self.post("/api/chapters/", json={"topic": topic, "grade": grade})
+        if not result or not result["data"]["chapters"]:
+            return
+        chapter = self.rng.choice(result["data"]["chapters"])
+        self.post("/api/videos/", json={"topic": topic, "grade": grade, "chapter": chapter})
+        self.post("/api/websites/", json={"topic": topic, "grade": grade, "chapter": chapter})
+
+    def mcq(self):
+        self.post("/api/generate-multi-mcqs/", json={
+            "video_urls": [self.rng.choice(self.corpus.video_urls) for _ in range(4)]
+        })
+
+
+class Command(BaseCommand):
+    help = ("Load-test the app offline: run it on a throwaway database with every external service "
+            "faked, drive a mix of traffic and report latency percentiles and throughput per endpoint")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=8, help="Concurrent virtual users")
+        parser.add_argument('--duration', type=float, default=30.0, help="Seconds of measured traffic")
+        parser.add_argument('--mix', default=DEFAULT_MIX,
+                            help=f"Scenario weights, name=weight,... ({', '.join(SCENARIOS)})")
+        parser.add_argument('--latency', default="",
+                            help="Fake service latencies in ms, name=ms,... (defaults: " +
+                                 ", ".join(f"{name}={ms}" for name, ms in DEFAULT_LATENCY_MS.items()) + ")")
+        parser.add_argument('--errors', default="", help="Fake service error rates, name=rate,... (0..1)")
+        parser.add_argument('--jitter', type=float, default=0.5, help="Latency variation, as a fraction")
+        parser.add_argument('--documents', type=int, default=5, help="Distinct synthetic books and videos")
+        parser.add_argument('--think-ms', type=float, default=0.0, help="Pause between a user's scenarios")
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--verbose', action='store_true', help="Show the app's own output")
+
+    def handle(self, *args, **options):
+        mix = parse_pairs(options['mix'], "--mix", float, SCENARIOS)
+        if not mix or sum(mix.values()) <= 0:
+            raise CommandError("--mix needs at least one scenario with a positive weight")
+        latency = {**DEFAULT_LATENCY_MS, **parse_pairs(options['latency'], "--latency", float, DEFAULT_LATENCY_MS)}
+        errors = parse_pairs(options['errors'], "--errors", float, DEFAULT_LATENCY_MS)
+        if options['users'] < 1 or options['documents'] < 1:
+            raise CommandError("--users and --documents must be at least 1")
+
+        faults = Faults(latency, errors, jitter=options['jitter'], seed=options['seed'])
+        corpus = Corpus(options['documents'], options['seed'])
+        workdir = tempfile.mkdtemp(prefix="loadtest-")
+        llm_server = FakeLLMServer(faults)
+        app_server = None
+        if connection.vendor == "sqlite":
+            # A file, not the shared in-memory test database, so every request thread sees the same data
+            connection.settings_dict["TEST"]["NAME"] = os.path.join(workdir, "loadtest.sqlite3")
+        old_database_name = connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+        try:
+            os.makedirs(os.path.join(workdir, "vectorstores"))
+            with ExitStack() as stack:
+                stack.enter_context(override_settings(
+                    DEBUG=False,
+                    ALLOWED_HOSTS=["127.0.0.1"],
+                    BASE_DIR=Path(workdir),
+                    MEDIA_ROOT=os.path.join(workdir, "uploads"),
+                    VECTORSTORES_DIR=os.path.join(workdir, "vectorstores"),
+                    EMBEDDING_CACHE_PATH=os.path.join(workdir, "embedding_cache.sqlite3"),
+                    QUERY_CACHE_PATH="",
+                    LLM_API_BASE=llm_server.start(),
+                ))
+                stack.enter_context(fake_external_services(faults))
+                if not options['verbose']:
+                    # The app prints debug output for every request
+                    stack.enter_context(redirect_stdout(stack.enter_context(open(os.devnull, "w"))))
+                app_server = ThreadedWSGIServer(("127.0.0.1", 0), QuietRequestHandler)
+                app_server.set_app(get_wsgi_application())
+                threading.Thread(target=app_server.serve_forever, daemon=True).start()
+                rows, elapsed = self.run_load(f"http://127.0.0.1:{app_server.server_port}", corpus, mix, options)
+        finally:
+            if app_server is not None:
+                app_server.shutdown()
+                app_server.server_close()
+            llm_server.stop()
+            connection.creation.destroy_test_db(old_database_name, verbosity=0)
+            shutil.rmtree(workdir, ignore_errors=True)
+
+        self.report(rows, elapsed, faults, options)
+
+    def run_load(self, base_url, corpus, mix, options):
+        # Warm-up, not measured: every user starts with one book and one video of their own
+        warmup = LatencyRecorder()
+        users = [
+            VirtualUser(number, base_url, corpus, warmup, options['seed'])
+            for number in range(options['users'])
+        ]
+        self.run_users(users, lambda user: (user.upload(), user.youtube()))
+        if not any(user.pdfs for user in users):
+            raise CommandError("Warm-up uploads all failed; rerun with --verbose to see the app's errors")
+
+        recorder = LatencyRecorder()
+        scenarios, weights = zip(*mix.items())
+        deadline = time.monotonic() + options['duration']
+
+        def drive(user):
+            user.recorder = recorder
+            while time.monotonic() < deadline:
+                getattr(user, user.rng.choices(scenarios, weights)[0])()
+                if options['think_ms']:
+                    time.sleep(options['think_ms'] / 1000)
+
+        start = time.monotonic()
+        self.run_users(users, drive)
+        elapsed = time.monotonic() - start
+        return recorder.report(elapsed), elapsed
+
+    @staticmethod
+    def run_users(users, target):
+        threads = [threading.Thread(target=target, args=(user,)) for user in users]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+    def report(self, rows, elapsed, faults, options):
+        self.stdout.write(f"{options['users']} users, {elapsed:.1f}s, mix {options['mix']}")
+        self.stdout.write(
+            f"{'endpoint':<36}{'requests':>9}{'errors':>8}{'p50_ms':>10}{'p95_ms':>10}{'p99_ms':>10}{'rps':>8}"
+        )
+        for row in rows:
+            self.stdout.write(
+                f"{row['endpoint']:<36}{row['requests']:>9}{row['errors']:>8}{row['p50_ms']:>10.1f}"
+                f"{row['p95_ms']:>10.1f}{row['p99_ms']:>10.1f}{row['rps']:>8.2f}"
+            )
+        self.stdout.write("Fake services:")
+        for service, counts in faults.stats().items():
+            self.stdout.write(f"  {service:<16}{counts['calls']:>7} calls{counts['injected_errors']:>6} injected errors")
@@ -0,0 +1,49 @@
+import os
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from core.store_registry import is_shard_dir, migrate_legacy_store, store_relative_path
+
+
+class Command(BaseCommand):
+    help = "Move stores from the flat vectorstores/<name> layout into hash-sharded directories and register them"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--legacy-dir',
+            action='append',
+            default=[],
+            help="Extra flat directory to migrate from, e.g. a working-directory-relative vectorstores/ "
+                 "(VECTORSTORES_DIR is always included)"
+        )
+        parser.add_argument('--dry-run', action='store_true')
+
+    def handle(self, *args, **options):
+        legacy_dirs = [settings.VECTORSTORES_DIR] + [os.path.abspath(path) for path in options['legacy_dir']]
+        moved = failed = 0
+        for legacy_dir in legacy_dirs:
+            if not os.path.isdir(legacy_dir):
+                self.stderr.write(f"{legacy_dir}: not a directory, skipping")
+                continue
+            for store_name in sorted(os.listdir(legacy_dir)):
+                if not os.path.isdir(os.path.join(legacy_dir, store_name)):
+                    continue
+                if os.path.samefile(legacy_dir, settings.VECTORSTORES_DIR) and is_shard_dir(store_name):
+                    continue
+                if options['dry_run']:
+                    self.stdout.write(f"{store_name}: would move to {store_relative_path(store_name)}")
+                    continue
+                try:
+                    if migrate_legacy_store(store_name, legacy_dir):
+                        moved += 1
+                        self.stdout.write(f"{store_name}: moved to {store_relative_path(store_name)}")
+                    else:
+                        self.stdout.write(f"{store_name}: already migrated")
+                except Exception as e:
+                    failed += 1
+                    self.stderr.write(f"{store_name}: failed - {str(e)}")
+
+        self.stdout.write(f"Moved {moved} store(s)")
+        if failed:
+            raise CommandError(f"{failed} store(s) could not be moved")
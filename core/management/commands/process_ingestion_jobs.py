@@ -0,0 +1,25 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from core.jobs import run_queued_jobs
+
+
+class Command(BaseCommand):
+    help = (
+        "Run queued PDF/YouTube ingestion jobs from the database queue, including jobs "
+        "left behind by a stopped process or whose lease expired. Run it next to the web server."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true', help="Drain the queue once and exit")
+        parser.add_argument('--interval', type=float, default=2.0, help="Seconds between queue polls")
+
+    def handle(self, *args, **options):
+        while True:
+            started = run_queued_jobs()
+            if started:
+                self.stdout.write(f"Processed {started} ingestion job(s)")
+            if options['once']:
+                break
+            time.sleep(options['interval'])
@@ -0,0 +1,43 @@
+# Generated by Django 5.2.4 on 2026-10-18 17:30
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0007_vectorstorerecord'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='pdfconversation',
+            name='context_hash',
+            field=models.CharField(blank=True, db_index=True, default='', max_length=64),
+        ),
+        migrations.AddField(
+            model_name='pdfconversation',
+            name='embedding_model',
+            field=models.CharField(blank=True, default='', max_length=255),
+        ),
+        migrations.AddField(
+            model_name='pdfconversation',
+            name='question_embedding',
+            field=models.BinaryField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='youtubeconversation',
+            name='context_hash',
+            field=models.CharField(blank=True, db_index=True, default='', max_length=64),
+        ),
+        migrations.AddField(
+            model_name='youtubeconversation',
+            name='embedding_model',
+            field=models.CharField(blank=True, default='', max_length=255),
+        ),
+        migrations.AddField(
+            model_name='youtubeconversation',
+            name='question_embedding',
+            field=models.BinaryField(blank=True, null=True),
+        ),
+    ]
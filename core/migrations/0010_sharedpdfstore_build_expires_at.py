@@ -0,0 +1,18 @@
+# Generated by Django 5.2.4 on 2026-10-18 18:23
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0009_ingestionjob_lease_expires_at'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='sharedpdfstore',
+            name='build_expires_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+    ]
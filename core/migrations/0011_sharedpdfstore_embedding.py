@@ -0,0 +1,27 @@
+# Generated by Django 5.2.4 on 2026-10-18 18:25
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0010_sharedpdfstore_build_expires_at'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='sharedpdfstore',
+            name='embedding',
+            field=models.CharField(blank=True, default='', max_length=255),
+        ),
+        migrations.AlterField(
+            model_name='sharedpdfstore',
+            name='content_hash',
+            field=models.CharField(db_index=True, max_length=64),
+        ),
+        migrations.AddConstraint(
+            model_name='sharedpdfstore',
+            constraint=models.UniqueConstraint(fields=('content_hash', 'embedding'), name='unique_shared_store_per_embedding'),
+        ),
+    ]
@@ -0,0 +1,186 @@
+import json
+import mmap
+import os
+from typing import List
+
+import numpy as np
+from langchain.schema import Document
+from langchain_community.docstore.base import Docstore
+from langchain_community.vectorstores import FAISS
+from langchain_community.vectorstores.utils import DistanceStrategy
+
+from .columnar_docstore import (
+    ColumnarDocstore, ReadOnlyDocstoreError, index_documents, save_array, write_columnar_docstore
+)
+
+FORMAT_FILE = "format.json"
+VECTORS_FILE = "vectors.npy"
+NORMS_FILE = "norms.npy"
+# Version 1 kept documents as JSON lines; version 2 uses the columnar docstore
+DOCS_FILE = "docs.jsonl"
+OFFSETS_FILE = "docs_offsets.npy"
+FORMAT_VERSION = 2
+
+# Rows scored per step of a brute-force search, bounding the temporary distance matrix
+SEARCH_BLOCK_ROWS = 65536
+
+
+class MmapIndex:
+    """Exact L2 index over a float32 matrix that lives in a memory-mapped .npy file.
+
+    Implements the subset of the faiss.IndexFlatL2 interface that LangChain's
+    FAISS wrapper uses (ntotal, d, search, reconstruct), so it can be dropped in
+    as vectorstore.index. The matrix is never copied into the process heap:
+    every worker maps the same file and shares its page-cache pages.
+    """
+
+    def __init__(self, vectors: np.ndarray, norms: np.ndarray):
+        self.vectors = vectors
+        self.norms = norms
+        self.ntotal, self.d = vectors.shape
+
+    def search(self, queries, k: int):
+        queries = np.asarray(queries, dtype=np.float32).reshape(-1, self.d)
+        query_norms = (queries ** 2).sum(axis=1)[:, None]
+        best_distances = np.full((len(queries), 0), np.inf, dtype=np.float32)
+        best_ids = np.full((len(queries), 0), -1, dtype=np.int64)
+
+        for start in range(0, self.ntotal, SEARCH_BLOCK_ROWS):
+            block = self.vectors[start:start + SEARCH_BLOCK_ROWS]
+            distances = self.norms[start:start + len(block)][None, :] - 2 * queries @ block.T + query_norms
+            np.maximum(distances, 0, out=distances)
+            ids = np.broadcast_to(np.arange(start, start + len(block), dtype=np.int64), distances.shape)
+
+            distances = np.concatenate([best_distances, distances], axis=1)
+            ids = np.concatenate([best_ids, ids], axis=1)
+            if distances.shape[1] > k:
+                keep = np.argpartition(distances, k - 1, axis=1)[:, :k]
+                distances = np.take_along_axis(distances, keep, axis=1)
+                ids = np.take_along_axis(ids, keep, axis=1)
+            best_distances, best_ids = distances, ids
+
+        order = np.lexsort((best_ids, best_distances), axis=1)
+        best_distances = np.take_along_axis(best_distances, order, axis=1)
+        best_ids = np.take_along_axis(best_ids, order, axis=1)
+
+        # Pad like faiss does when k exceeds the number of vectors
+        if best_distances.shape[1] < k:
+            missing = k - best_distances.shape[1]
+            best_distances = np.pad(best_distances, ((0, 0), (0, missing)), constant_values=np.inf)
+            best_ids = np.pad(best_ids, ((0, 0), (0, missing)), constant_values=-1)
+        return best_distances.astype(np.float32), best_ids
+
+    def reconstruct(self, i: int) -> np.ndarray:
+        return np.array(self.vectors[i], dtype=np.float32)
+
+    def reconstruct_n(self, i0: int, n: int) -> np.ndarray:
+        return np.array(self.vectors[i0:i0 + n], dtype=np.float32)
+
+    def reconstruct_batch(self, ids) -> np.ndarray:
+        return np.array(self.vectors[np.asarray(ids, dtype=np.int64)], dtype=np.float32)
+
+
+class MmapDocstore(Docstore):
+    """Read-only docstore over a memory-mapped JSON-lines file (version 1 stores), addressed by index position"""
+
+    def __init__(self, docs_path, offsets: np.ndarray):
+        self.offsets = offsets
+        with open(docs_path, 'rb') as f:
+            self._buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+    def search(self, search) -> Document:
+        position = int(search)
+        record = json.loads(self._buffer[int(self.offsets[position]):int(self.offsets[position + 1])])
+        return Document(id=record["id"], page_content=record["text"], metadata=record["metadata"])
+
+    def delete(self, ids: List) -> None:
+        raise ReadOnlyDocstoreError("Memory-mapped stores are read-only; rebuild the store instead")
+
+
+class PositionIds:
+    """index_to_docstore_id for position-addressed docstores, without building an n-entry dict"""
+
+    def __init__(self, count: int):
+        self.count = count
+
+    def __getitem__(self, i):
+        i = int(i)
+        if not 0 <= i < self.count:
+            raise KeyError(i)
+        return i
+
+    def get(self, i, default=None):
+        try:
+            return self[i]
+        except KeyError:
+            return default
+
+    def __len__(self):
+        return self.count
+
+    def __contains__(self, i):
+        return self.get(i) is not None
+
+    def keys(self):
+        return range(self.count)
+
+    def values(self):
+        return range(self.count)
+
+    def items(self):
+        return ((i, i) for i in range(self.count))
+
+
+def is_mmap_store(store_path) -> bool:
+    return os.path.exists(os.path.join(store_path, FORMAT_FILE))
+
+
+def mmap_store_version(store_path) -> int:
+    with open(os.path.join(store_path, FORMAT_FILE)) as f:
+        return json.load(f).get("version")
+
+
+def save_mmap_store(vectorstore: FAISS, store_path, documents: List[Document] = None):
+    """Write a LangChain FAISS store in the memory-mappable layout.
+
+    Files are written under temporary names and renamed into place, with the
+    format marker last, so readers never see a half-written store.
+    """
+    if vectorstore.distance_strategy != DistanceStrategy.EUCLIDEAN_DISTANCE or vectorstore._normalize_L2:
+        raise ValueError("Only plain L2 vector stores can be written in the mmap format")
+
+    os.makedirs(store_path, exist_ok=True)
+    count = vectorstore.index.ntotal
+    vectors = np.ascontiguousarray(vectorstore.index.reconstruct_n(0, count), dtype=np.float32)
+    norms = (vectors ** 2).sum(axis=1).astype(np.float32)
+
+    write_columnar_docstore(store_path, documents or index_documents(vectorstore))
+    for name, array in ((VECTORS_FILE, vectors), (NORMS_FILE, norms)):
+        save_array(os.path.join(store_path, name + ".tmp"), array)
+    for name in (VECTORS_FILE, NORMS_FILE):
+        os.replace(os.path.join(store_path, name + ".tmp"), os.path.join(store_path, name))
+
+    with open(os.path.join(store_path, FORMAT_FILE), 'w') as f:
+        json.dump({"format": "mmap", "version": FORMAT_VERSION, "count": count, "dim": vectors.shape[1]}, f)
+
+    # Documents of a version 1 store rewritten in place
+    for name in (DOCS_FILE, OFFSETS_FILE):
+        path = os.path.join(store_path, name)
+        if os.path.exists(path):
+            os.remove(path)
+
+
+def load_mmap_store(store_path, embedding_model) -> FAISS:
+    """Open a memory-mapped store as a regular LangChain FAISS object (constant time, no unpickling)"""
+    version = mmap_store_version(store_path)
+    if version == 1:
+        offsets = np.load(os.path.join(store_path, OFFSETS_FILE), mmap_mode='r')
+        docstore = MmapDocstore(os.path.join(store_path, DOCS_FILE), offsets)
+    elif version == FORMAT_VERSION:
+        docstore = ColumnarDocstore(store_path)
+    else:
+        raise ValueError(f"Unsupported mmap store version {version} at {store_path}")
+
+    vectors = np.load(os.path.join(store_path, VECTORS_FILE), mmap_mode='r')
+    norms = np.load(os.path.join(store_path, NORMS_FILE), mmap_mode='r')
+    return FAISS(embedding_model, MmapIndex(vectors, norms), docstore, PositionIds(len(vectors)))
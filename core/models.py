@@ -1,4 +1,6 @@
-from django.db import models
+import uuid
+from django.db import models, transaction
+from django.db.models import F
 from django.contrib.auth.models import AbstractBaseUser, BaseUserManager, PermissionsMixin
 from django.utils import timezone
 
@@ -81,10 +83,59 @@ class ChapterWebResource(models.Model):
     source = models.CharField(max_length=255)
     created_at = models.DateTimeField(auto_now_add=True)
 
+class SharedPDFStore(models.Model):
+    """Vector store built once per distinct PDF file and embedding model, shared by every upload of it"""
+    content_hash = models.CharField(max_length=64, db_index=True)  # SHA-256 of the file bytes
+    # backend:model the store was embedded with; blank on rows from before it was recorded
+    embedding = models.CharField(max_length=255, blank=True, default='')
+    vector_store = models.CharField(max_length=255)
+    ref_count = models.PositiveIntegerField(default=0)
+    # Set while an upload builds (or rebuilds) the store and renewed as it goes;
+    # other uploads of the file wait for it to clear instead of building too
+    build_expires_at = models.DateTimeField(null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['content_hash', 'embedding'], name='unique_shared_store_per_embedding')
+        ]
+
+    def __str__(self):
+        return f"Shared store {self.vector_store} ({self.ref_count} refs)"
+
+    def is_building(self) -> bool:
+        return self.build_expires_at is not None and self.build_expires_at > timezone.now()
+
+    def add_reference(self) -> bool:
+        """Count one more upload of this store. False when the row is gone, i.e. its last reference was released."""
+        return SharedPDFStore.objects.filter(pk=self.pk).update(ref_count=F('ref_count') + 1) == 1
+
+    def release(self, on_last_reference=None):
+        """Drop one reference. Returns True when it was the last one and the row is gone.
+
+        on_last_reference runs before the row deletion commits, while the row is
+        still locked, so an upload of the same file can't pick the store up
+        while its files are being removed. A store that is being rebuilt is
+        kept (with no references) for the upload rebuilding it.
+        """
+        with transaction.atomic():
+            store = SharedPDFStore.objects.select_for_update().get(pk=self.pk)
+            if store.ref_count > 1 or store.is_building():
+                store.ref_count = max(store.ref_count - 1, 0)
+                store.save(update_fields=['ref_count'])
+                return False
+            if on_last_reference:
+                on_last_reference()
+            store.delete()
+            return True
+
 class UserPDF(models.Model):
     user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='pdfs')
     file_name = models.CharField(max_length=255)
     vector_store = models.CharField(max_length=255)
+    shared_store = models.ForeignKey(SharedPDFStore, on_delete=models.SET_NULL, null=True, blank=True, related_name='pdfs')
+    # The ingestion job that created the row, so a retried job reuses it
+    job = models.OneToOneField('IngestionJob', on_delete=models.SET_NULL, null=True, blank=True, related_name='+')
     upload_time = models.DateTimeField(auto_now_add=True)
     
     def __str__(self):
@@ -94,6 +145,10 @@ class PDFConversation(models.Model):
     pdf = models.ForeignKey(UserPDF, on_delete=models.CASCADE, related_name='conversations')
     question = models.TextField()
     answer = models.TextField()
+    # Semantic answer cache: hash of the retrieved context and the question's embedding
+    context_hash = models.CharField(max_length=64, blank=True, default='', db_index=True)
+    embedding_model = models.CharField(max_length=255, blank=True, default='')
+    question_embedding = models.BinaryField(null=True, blank=True)  # float32, unit length
     created_at = models.DateTimeField(auto_now_add=True)
     
     class Meta:
@@ -110,6 +165,8 @@ class UserYouTubeVideo(models.Model):
     video_title = models.CharField(max_length=255)
     thumbnail_url = models.URLField()
     vector_store = models.CharField(max_length=255)  # Store path to vector store
+    # The ingestion job that created the row, so a retried job reuses it
+    job = models.OneToOneField('IngestionJob', on_delete=models.SET_NULL, null=True, blank=True, related_name='+')
     upload_time = models.DateTimeField(auto_now_add=True)
     
     def __str__(self):
@@ -119,10 +176,100 @@ class YouTubeConversation(models.Model):
     video = models.ForeignKey(UserYouTubeVideo, on_delete=models.CASCADE, related_name='conversations')
     question = models.TextField()
     answer = models.TextField()
+    # Semantic answer cache: hash of the retrieved context and the question's embedding
+    context_hash = models.CharField(max_length=64, blank=True, default='', db_index=True)
+    embedding_model = models.CharField(max_length=255, blank=True, default='')
+    question_embedding = models.BinaryField(null=True, blank=True)  # float32, unit length
     created_at = models.DateTimeField(auto_now_add=True)
     
     class Meta:
         ordering = ['-created_at']
     
     def __str__(self):
-        return f"Conversation about {self.video.video_title}"
\ No newline at end of file
+        return f"Conversation about {self.video.video_title}"
+
+class IngestionJob(models.Model):
+    """Background PDF/YouTube ingestion queued in the database and run by leased worker threads"""
+    KIND_PDF = 'pdf'
+    KIND_YOUTUBE = 'youtube'
+    KIND_CHOICES = [(KIND_PDF, 'PDF'), (KIND_YOUTUBE, 'YouTube video')]
+
+    STATUS_QUEUED = 'queued'
+    STATUS_RUNNING = 'running'
+    STATUS_COMPLETED = 'completed'
+    STATUS_FAILED = 'failed'
+    STATUS_CHOICES = [
+        (STATUS_QUEUED, 'Queued'),
+        (STATUS_RUNNING, 'Running'),
+        (STATUS_COMPLETED, 'Completed'),
+        (STATUS_FAILED, 'Failed'),
+    ]
+
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='ingestion_jobs')
+    kind = models.CharField(max_length=20, choices=KIND_CHOICES)
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default=STATUS_QUEUED, db_index=True)
+    payload = models.JSONField(default=dict)  # Arguments for the ingest function
+    pages_total = models.PositiveIntegerField(default=0)
+    pages_parsed = models.PositiveIntegerField(default=0)
+    chunks_total = models.PositiveIntegerField(default=0)
+    chunks_embedded = models.PositiveIntegerField(default=0)
+    result_id = models.BigIntegerField(null=True, blank=True)  # UserPDF / UserYouTubeVideo id
+    error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+    # Renewed by the running worker's heartbeat; a running job past it is requeued
+    lease_expires_at = models.DateTimeField(null=True, blank=True)
+    # Written by each claim; the worker's updates only apply while it still holds its claim
+    claim_token = models.CharField(max_length=32, blank=True, default='')
+
+    class Meta:
+        ordering = ['created_at']
+
+    def __str__(self):
+        return f"{self.get_kind_display()} ingestion {self.id} ({self.status})"
+
+    def progress_fraction(self):
+        if self.status == self.STATUS_COMPLETED:
+            return 1.0
+        if self.pages_total:
+            return self.pages_parsed / self.pages_total
+        if self.chunks_total:
+            return self.chunks_embedded / self.chunks_total
+        return 0.0
+
+    def eta_seconds(self):
+        """Remaining time extrapolated from progress so far, or None before there is any"""
+        if self.status != self.STATUS_RUNNING or not self.started_at:
+            return None
+        fraction = self.progress_fraction()
+        if fraction <= 0:
+            return None
+        elapsed = (timezone.now() - self.started_at).total_seconds()
+        return round(elapsed * (1 - fraction) / fraction, 1)
+
+class VectorStoreRecord(models.Model):
+    """Where a named vector store lives under VECTORSTORES_DIR, with its size as last written"""
+    KIND_PDF = 'pdf'
+    KIND_YOUTUBE = 'youtube'
+    KIND_LIBRARY = 'library'
+    KIND_OTHER = 'other'
+    KIND_CHOICES = [
+        (KIND_PDF, 'PDF'),
+        (KIND_YOUTUBE, 'YouTube video'),
+        (KIND_LIBRARY, 'User library'),
+        (KIND_OTHER, 'Other'),
+    ]
+
+    name = models.CharField(max_length=255, unique=True)  # The vector_store value on UserPDF etc.
+    relative_path = models.CharField(max_length=255)  # Sharded directory relative to VECTORSTORES_DIR
+    kind = models.CharField(max_length=20, choices=KIND_CHOICES, default=KIND_OTHER, db_index=True)
+    chunk_count = models.PositiveIntegerField(default=0)
+    size_bytes = models.BigIntegerField(default=0)
+    file_count = models.PositiveIntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"Vector store {self.name} at {self.relative_path}"
@@ -0,0 +1,82 @@
+import hashlib
+import re
+from typing import Dict, List, Tuple
+
+from pypdf import PdfReader
+
+from .chunking import OffsetTextSplitter
+
+# Page pool workers are spawned, not forked, so they import this module from
+# scratch: it must stay free of Django and LangChain to keep start-up cheap.
+# Chunks therefore travel as (text, metadata) pairs and become Documents in
+# the parent.
+PageChunk = Tuple[str, Dict]
+
+# The reader a pool worker opened for its PDF, reused for every range it is given
+_worker_reader = None
+_worker_pdf_path = None
+
+
+def clean_page_text(text: str) -> str:
+    lines = text.splitlines()
+    cleaned_lines = [line for line in lines if not re.match(r'^[_\W\s]{5,}$', line.strip())]
+    return "\n".join(cleaned_lines).strip()
+
+
+def generate_text_hash(text: str) -> str:
+    return hashlib.md5(text.encode('utf-8')).hexdigest()[:8]
+
+
+def extract_page_text(page) -> str:
+    """A page's text extracted the way PyPDFLoader does it"""
+    return page.extract_text(extraction_mode="plain").strip()
+
+
+def page_chunks(pdf_path, page_num, raw_text, text_splitter) -> List[PageChunk]:
+    """Clean one page and split it into (text, metadata) chunks carrying page metadata.
+
+    text_splitter must be an OffsetTextSplitter: positions come from the split
+    itself, so a passage repeated on the page still gets its own offsets.
+    """
+    page_text = clean_page_text(raw_text)
+    page_hash = generate_text_hash(page_text)
+
+    chunks = []
+    for chunk_num, (chunk_text, start_pos, end_pos) in enumerate(
+        text_splitter.split_text_with_offsets(page_text), start=1
+    ):
+        chunks.append((chunk_text, {
+            "source": pdf_path,
+            "page": page_num,
+            "chunk_id": f"p{page_num}c{chunk_num}",
+            "position": {
+                "start": start_pos,
+                "end": end_pos,
+                "length": len(chunk_text)
+            },
+            "preview": chunk_text[:50] + ("..." if len(chunk_text) > 50 else ""),
+            "text_hash": generate_text_hash(chunk_text),
+            "page_hash": page_hash
+        }))
+    return chunks
+
+
+def init_page_worker(pdf_path):
+    """Pool initializer: open the PDF once per worker instead of once per page range"""
+    global _worker_reader, _worker_pdf_path
+    _worker_reader = PdfReader(pdf_path)
+    _worker_pdf_path = pdf_path
+
+
+def process_page_range(pdf_path, start, stop) -> List[Tuple[int, List[PageChunk]]]:
+    """Worker entry point: parse, clean and chunk pages [start, stop) of a PDF.
+
+    Returns (page_num, chunks) per page in page order. Runs in a separate
+    process, so it uses the reader init_page_worker opened there (or its own).
+    """
+    reader = _worker_reader if _worker_pdf_path == pdf_path else PdfReader(pdf_path)
+    text_splitter = OffsetTextSplitter()
+    return [
+        (index + 1, page_chunks(pdf_path, index + 1, extract_page_text(reader.pages[index]), text_splitter))
+        for index in range(start, stop)
+    ]
@@ -1,105 +1,231 @@
 import os
 import time
-import requests
 import google.generativeai as genai
-from langchain_google_genai import GoogleGenerativeAIEmbeddings
 from langchain_community.document_loaders import PyPDFLoader
 from langchain_community.vectorstores import FAISS
-from langchain.text_splitter import RecursiveCharacterTextSplitter
 from langchain.schema import Document
-import re
-import hashlib
 import json
+import multiprocessing
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from pypdf import PdfReader
 from django.conf import settings
+from .embedding_cache import get_embedding_cache
+from .embeddings import get_embedding_backend
+from .embedding_scheduler import get_embedding_scheduler
+from .llm_router import get_llm_router
+from .context import assemble_context, context_hash
+from .chunking import OffsetTextSplitter
+from .pdf_pages import (
+    clean_page_text, extract_page_text, generate_text_hash, init_page_worker, page_chunks, process_page_range
+)
+from .store_cache import get_store_cache
+from .quantized_index import compress_vector_store
+from .retrieval import retrieve_documents
+from .store_registry import get_store_path, persist_vector_store
+from .streaming import SectionSplitter, split_sections
+from .timings import get_stage_timings, timed
+from .vector_store import load_vector_store
+
+
+def chunk_page(pdf_path, page_num, raw_text, text_splitter):
+    """Clean one page and split it into chunk Documents carrying page metadata (see page_chunks)"""
+    return to_documents(page_chunks(pdf_path, page_num, raw_text, text_splitter))
+
+
+def to_documents(chunks):
+    return [Document(page_content=text, metadata=metadata) for text, metadata in chunks]
+
+
+def pdf_reference(doc):
+    """Reference to a PDF chunk as returned alongside answers"""
+    return {
+        "page": doc.metadata["page"],
+        "chunk_id": doc.metadata["chunk_id"],
+        "position": doc.metadata["position"],
+        "text": doc.page_content,
+        "preview": doc.metadata["preview"],
+        "page_hash": doc.metadata["page_hash"],
+        "text_hash": doc.metadata["text_hash"]
+    }
+
 
 class PDFProcessor:
     def __init__(self):
         self.groq_api_key = os.getenv("GROQ_API_KEY")
-        self.groq_model = "deepseek-r1-distill-llama-70b"
         genai.configure(api_key=os.getenv("GOOGLE_API_KEY"))
-        self.embedding_model = GoogleGenerativeAIEmbeddings(model="models/embedding-001")
+        self.embedding_model = get_embedding_backend()
+        self.embedding_model_name = self.embedding_model.name
 
     def clean_text(self, text: str) -> str:
-        lines = text.splitlines()
-        cleaned_lines = [line for line in lines if not re.match(r'^[_\W\s]{5,}$', line.strip())]
-        return "\n".join(cleaned_lines).strip()
+        return clean_page_text(text)
 
     def generate_text_hash(self, text: str) -> str:
-        return hashlib.md5(text.encode('utf-8')).hexdigest()[:8]
-
-    def process_pdf(self, pdf_path):
-        print("Loading and chunking PDF with page tracking...")
-        loader = PyPDFLoader(pdf_path)
-        raw_pages = loader.load()
-
-        text_splitter = RecursiveCharacterTextSplitter(chunk_size=800, chunk_overlap=200)
-
-        chunks = []
-        for page_num, page_doc in enumerate(raw_pages, start=1):
-            page_text = self.clean_text(page_doc.page_content)
-            page_chunks = text_splitter.split_text(page_text)
-            
-            for chunk_num, chunk_text in enumerate(page_chunks, start=1):
-                start_pos = page_text.find(chunk_text)
-                end_pos = start_pos + len(chunk_text)
-                
-                chunks.append(Document(
-                    page_content=chunk_text,
-                    metadata={
-                        "source": pdf_path,
-                        "page": page_num,
-                        "chunk_id": f"p{page_num}c{chunk_num}",
-                        "position": {
-                            "start": start_pos,
-                            "end": end_pos,
-                            "length": len(chunk_text)
-                        },
-                        "preview": chunk_text[:50] + ("..." if len(chunk_text) > 50 else ""),
-                        "text_hash": self.generate_text_hash(chunk_text),
-                        "page_hash": self.generate_text_hash(page_text)
-                    }
-                ))
-
-        print(f"Created {len(chunks)} text chunks from {len(raw_pages)} pages")
+        return generate_text_hash(text)
+
+    def use_page_pool(self, page_count, workers=None):
+        """Whether a document this long is parsed across PDF_INGEST_WORKERS processes"""
+        if workers is None:
+            workers = settings.PDF_INGEST_WORKERS
+        return workers > 1 and page_count >= settings.PDF_PARALLEL_MIN_PAGES
+
+    def process_pdf(self, pdf_path, workers=None):
+        if workers is None:
+            workers = settings.PDF_INGEST_WORKERS
+        page_count = len(PdfReader(pdf_path).pages)
+
+        if self.use_page_pool(page_count, workers):
+            print(f"Loading and chunking PDF with page tracking across {workers} processes...")
+            chunks = [
+                chunk
+                for _, page_docs in self.iter_page_chunks_parallel(pdf_path, page_count, workers)
+                for chunk in page_docs
+            ]
+        else:
+            print("Loading and chunking PDF with page tracking...")
+            loader = PyPDFLoader(pdf_path)
+            raw_pages = loader.load()
+
+            text_splitter = OffsetTextSplitter()
+
+            chunks = []
+            for page_num, page_doc in enumerate(raw_pages, start=1):
+                chunks.extend(chunk_page(pdf_path, page_num, page_doc.page_content, text_splitter))
+
+        print(f"Created {len(chunks)} text chunks from {page_count} pages")
         return chunks
 
+    def iter_page_chunks_parallel(self, pdf_path, page_count, workers):
+        """Yield (page_num, chunk Documents) in page order, parsed across a process pool.
+
+        Pages are handed out as contiguous ranges (several per worker so a few
+        image-heavy pages don't leave the others idle); each worker opens the
+        PDF once. At most two ranges per worker are in flight, so a slow
+        consumer (the streaming embedder) keeps memory bounded. Workers are
+        spawned rather than forked: the web process runs background threads,
+        and a forked child could inherit a lock one of them held.
+        """
+        batch_size = max(1, -(-page_count // (workers * 4)))
+        ranges = deque((start, min(start + batch_size, page_count)) for start in range(0, page_count, batch_size))
+        with ProcessPoolExecutor(
+            max_workers=workers,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=init_page_worker,
+            initargs=(pdf_path,)
+        ) as executor:
+            pending = deque()
+            while ranges or pending:
+                while ranges and len(pending) < workers * 2:
+                    start, stop = ranges.popleft()
+                    pending.append(executor.submit(process_page_range, pdf_path, start, stop))
+                for page_num, chunks in pending.popleft().result():
+                    yield page_num, to_documents(chunks)
+
+    def iter_pages(self, pdf_path):
+        """Yield (page_num, raw_text) one page at a time without loading the whole PDF"""
+        reader = PdfReader(pdf_path)
+        for index, page in enumerate(reader.pages):
+            yield index + 1, extract_page_text(page)
+
+    def iter_page_chunks(self, pdf_path, page_count):
+        """Yield (page_num, chunk Documents) page by page, through the page pool for long documents"""
+        if self.use_page_pool(page_count):
+            yield from self.iter_page_chunks_parallel(pdf_path, page_count, settings.PDF_INGEST_WORKERS)
+            return
+        text_splitter = OffsetTextSplitter()
+        for page_num, raw_text in self.iter_pages(pdf_path):
+            yield page_num, chunk_page(pdf_path, page_num, raw_text, text_splitter)
+
+    def create_vector_store_streaming(self, pdf_path, store_name, batch_size=None, progress=None):
+        """Chunk, embed and index a PDF as its pages are read.
+
+        Only one batch of chunks and their embeddings is held at a time, so peak
+        memory depends on batch_size instead of the size of the document. Long
+        documents are parsed by the page pool while earlier pages embed. The
+        saved store is the same format create_vector_store writes. progress, if
+        given, is called with keyword counters (pages_total, pages_parsed,
+        chunks_embedded) as work advances.
+        """
+        if batch_size is None:
+            batch_size = settings.PDF_STREAMING_BATCH_SIZE
+        print("Streaming PDF into embeddings and vector store...")
+        page_count = len(PdfReader(pdf_path).pages)
+        if progress:
+            progress(pages_total=page_count)
+
+        vectorstore = None
+        batch = []
+        chunks_embedded = 0
+        for page_num, page_docs in self.iter_page_chunks(pdf_path, page_count):
+            batch.extend(page_docs)
+            while len(batch) >= batch_size:
+                vectorstore = self.add_chunks_to_store(vectorstore, batch[:batch_size])
+                chunks_embedded += batch_size
+                batch = batch[batch_size:]
+            if progress:
+                progress(pages_parsed=page_num, chunks_embedded=chunks_embedded)
+        if batch:
+            vectorstore = self.add_chunks_to_store(vectorstore, batch)
+            chunks_embedded += len(batch)
+            if progress:
+                progress(chunks_embedded=chunks_embedded)
+
+        if vectorstore is None:
+            raise Exception("No text could be extracted from the PDF")
+        print(f"Vector store created with {vectorstore.index.ntotal} embeddings")
+        vectorstore = compress_vector_store(vectorstore)
+
+        store_path = persist_vector_store(vectorstore, store_name)
+        print(f"Vector store saved at {store_path}")
+        return vectorstore
+
+    def add_chunks_to_store(self, vectorstore, chunks):
+        """Embed one batch of chunks and append it to vectorstore, creating it on the first batch"""
+        texts = [chunk.page_content for chunk in chunks]
+        metadatas = [chunk.metadata for chunk in chunks]
+        embeddings = get_embedding_cache().embed_documents(
+            texts,
+            get_embedding_scheduler(self.embedding_model),
+            self.embedding_model_name
+        )
+        text_embeddings = list(zip(texts, embeddings))
+
+        if vectorstore is None:
+            return FAISS.from_embeddings(text_embeddings, self.embedding_model, metadatas=metadatas)
+        vectorstore.add_embeddings(text_embeddings, metadatas=metadatas)
+        return vectorstore
+
+    def get_store_path(self, store_name):
+        return get_store_path(store_name)
+
     def create_vector_store(self, chunks, store_name):
         print("Creating embeddings and vector store...")
-        vectorstore = FAISS.from_documents(chunks, self.embedding_model)
+        vectorstore = self.add_chunks_to_store(None, chunks)
         print(f"Vector store created with {vectorstore.index.ntotal} embeddings")
+        vectorstore = compress_vector_store(vectorstore)
         
-        # Save to user-specific directory
-        store_path = os.path.join(settings.BASE_DIR, "vectorstores", store_name)
-        vectorstore.save_local(store_path)
+        # Save to the store's registry directory
+        store_path = persist_vector_store(vectorstore, store_name)
         print(f"Vector store saved at {store_path}")
         return vectorstore
 
     def load_vector_store(self, store_name):
-        store_path = os.path.join(settings.BASE_DIR, "vectorstores", store_name)
-        return FAISS.load_local(
+        store_path = self.get_store_path(store_name)
+        return get_store_cache().get_or_load(
+            store_name,
             store_path,
-            self.embedding_model,
-            allow_dangerous_deserialization=True
+            lambda: load_vector_store(store_path, self.embedding_model)
         )
 
-    def call_groq_llm(self, prompt):
-        headers = {
-            "Authorization": f"Bearer {self.groq_api_key}",
-            "Content-Type": "application/json"
-        }
-        payload = {
-            "model": self.groq_model,
-            "messages": [
-                {"role": "system", "content": "You are a helpful AI assistant. Your work is to answer the Question given in prompt by strictly taking help of provided Context. Your solution should be accurate and in detail"},
-                {"role": "user", "content": prompt}
-            ]
-        }
+    def llm_messages(self, prompt):
+        return [
+            {"role": "system", "content": "You are a helpful AI assistant. Your work is to answer the Question given in prompt by strictly taking help of provided Context. Your solution should be accurate and in detail"},
+            {"role": "user", "content": prompt}
+        ]
 
-        response = requests.post("https://api.groq.com/openai/v1/chat/completions", json=payload, headers=headers)
-        if response.status_code != 200:
-            raise Exception(f"Groq LLM error: {response.status_code} - {response.text}")
-        
-        return response.json()["choices"][0]["message"]["content"]
+    def call_groq_llm(self, prompt, hedge=False):
+        # Groq first, failing over to Gemini (settings.LLM_PROVIDERS)
+        return get_llm_router().chat(self.llm_messages(prompt), hedge=hedge)
 
     def expand_query_with_llm(self, query):
         prompt = f"""You are an expert assistant. The user query below is too short for accurate search.
@@ -108,31 +234,11 @@ So please you answer that query in 10 lines
 Query: {query}
 
 Expanded version:"""
-        return self.call_groq_llm(prompt)
+        # Retrieval waits on the expansion, so a slow provider is hedged
+        return self.call_groq_llm(prompt, hedge=True)
 
-    def answer_question(self, vectorstore, question):
-        # Step 1: Expand the query
-        expanded_query = self.expand_query_with_llm(question)
-        
-        # Step 2: Semantic search on expanded query
-        similar_docs = vectorstore.max_marginal_relevance_search(
-            query=expanded_query, 
-            k=5, 
-            fetch_k=25
-        )
-
-        if not similar_docs:
-            return {
-                "answer": "No relevant context found.",
-                "references": [],
-                "thinking_process": ""
-            }
-
-        # Prepare context for LLM
-        full_context = "\n\n".join([doc.page_content for doc in similar_docs])
-
-        # Generate answer with thinking process
-        prompt = f"""Analyze the question and provide:
+    def answer_prompt(self, question, full_context):
+        return f"""Analyze the question and provide:
 1. Your thinking process (marked with <thinking> tags)
 2. A detailed answer based strictly on the context
 3. Key points from each relevant chunk
@@ -146,12 +252,48 @@ Context:
 Format your response as:
 <thinking>Your analytical process here</thinking>
 <answer>Your structured answer here</answer>"""
+
+    def answer_question(self, vectorstore, question, k=None, fetch_k=None, lambda_mult=None,
+                        lookup_answer=None):
+        # Step 1: Retrieve context, expanding the query with the LLM when needed
+        timings = {}
+        similar_docs, expanded_query = retrieve_documents(
+            vectorstore,
+            question,
+            self.expand_query_with_llm,
+            k=k,
+            fetch_k=fetch_k,
+            lambda_mult=lambda_mult,
+            timings=timings
+        )
+        return self.answer_from_documents(question, similar_docs, expanded_query, lookup_answer, timings)
+
+    def answer_from_documents(self, question, similar_docs, expanded_query, lookup_answer=None, timings=None):
+        """The LLM half of answer_question, for chunks already retrieved (also used by answer_batch)"""
+        timings = {} if timings is None else timings
+        if not similar_docs:
+            return {
+                "answer": "No relevant context found.",
+                "references": [],
+                "thinking_process": ""
+            }
+
+        # Prepare context for LLM: overlapping chunks merged, within the token budget
+        full_context = assemble_context(similar_docs)
+        # Reuse an earlier answer generated from this exact context for a similar question
+        if lookup_answer is not None:
+            cached = lookup_answer(context_hash(full_context), expanded_query)
+            if cached is not None:
+                return cached
+
+        # Generate answer with thinking process
+        prompt = self.answer_prompt(question, full_context)
         
-        llm_response = self.call_groq_llm(prompt)
+        with timed(timings, "answer_ms"):
+            llm_response = self.call_groq_llm(prompt)
         
         # Extract thinking and answer parts
-        thinking_process = llm_response.split("<thinking>")[1].split("</thinking>")[0].strip()
-        answer = llm_response.split("<answer>")[1].split("</answer>")[0].strip()
+        thinking_process, answer = split_sections(llm_response)
 
         # Prepare structured response
         response = {
@@ -159,18 +301,68 @@ Format your response as:
             "expanded_query": expanded_query,
             "thinking_process": thinking_process,
             "answer": answer,
-            "references": [
-                {
-                    "page": doc.metadata["page"],
-                    "chunk_id": doc.metadata["chunk_id"],
-                    "position": doc.metadata["position"],
-                    "text": doc.page_content,
-                    "preview": doc.metadata["preview"],
-                    "page_hash": doc.metadata["page_hash"],
-                    "text_hash": doc.metadata["text_hash"]
-                } for doc in similar_docs
-            ],
-            "context_hash": self.generate_text_hash(full_context)
+            "references": [pdf_reference(doc) for doc in similar_docs],
+            "context_hash": context_hash(full_context),
+            "timings": timings
         }
+        get_stage_timings().record(timings)
+
+        return response
+
+    def stream_answer(self, vectorstore, question, k=None, fetch_k=None, lambda_mult=None,
+                      lookup_answer=None):
+        """answer_question as a stream of (event, data) pairs for the SSE endpoint.
+
+        "references" comes first, as soon as retrieval is done; then "thinking"
+        and "answer" text as the LLM produces it; then "done" with the same
+        response dict answer_question returns.
+        """
+        timings = {}
+        similar_docs, expanded_query = retrieve_documents(
+            vectorstore,
+            question,
+            self.expand_query_with_llm,
+            k=k,
+            fetch_k=fetch_k,
+            lambda_mult=lambda_mult,
+            timings=timings
+        )
+        references = [pdf_reference(doc) for doc in similar_docs]
+        yield "references", {"question": question, "expanded_query": expanded_query, "references": references}
 
-        return response
\ No newline at end of file
+        if not similar_docs:
+            yield "done", {"answer": "No relevant context found.", "references": [], "thinking_process": ""}
+            return
+
+        full_context = assemble_context(similar_docs)
+        if lookup_answer is not None:
+            cached = lookup_answer(context_hash(full_context), expanded_query)
+            if cached is not None:
+                if cached.get("thinking_process"):
+                    yield "thinking", cached["thinking_process"]
+                yield "answer", cached["answer"]
+                yield "done", cached
+                return
+        splitter = SectionSplitter()
+        with timed(timings, "answer_ms"):
+            for delta in get_llm_router().chat_stream(
+                self.llm_messages(self.answer_prompt(question, full_context))
+            ):
+                yield from splitter.feed(delta)
+            yield from splitter.close()
+
+        thinking_process, answer = splitter.result()
+        if not splitter.text("answer"):
+            # No answer section was streamed: the whole response is the answer
+            yield "answer", answer
+        get_stage_timings().record(timings)
+
+        yield "done", {
+            "question": question,
+            "expanded_query": expanded_query,
+            "thinking_process": thinking_process,
+            "answer": answer,
+            "references": references,
+            "context_hash": context_hash(full_context),
+            "timings": timings
+        }
\ No newline at end of file
@@ -0,0 +1,80 @@
+import math
+
+import faiss
+import numpy as np
+from django.conf import settings
+from langchain_community.vectorstores import FAISS
+
+INDEX_TYPES = ("flat", "fp16", "sq8", "ivfpq")
+
+# faiss warns below this many training points per centroid
+MIN_POINTS_PER_CENTROID = 39
+
+
+def choose_index_type(count: int, index_type: str = None) -> str:
+    """Index type for a store of count vectors.
+
+    settings.VECTORSTORE_INDEX_TYPE is either one of INDEX_TYPES or "auto",
+    which keeps small stores flat (exact) and compresses stores of at least
+    VECTORSTORE_QUANTIZE_MIN_CHUNKS vectors with VECTORSTORE_QUANTIZED_INDEX_TYPE.
+    """
+    index_type = index_type or settings.VECTORSTORE_INDEX_TYPE
+    if index_type == "auto":
+        if count < settings.VECTORSTORE_QUANTIZE_MIN_CHUNKS:
+            return "flat"
+        index_type = settings.VECTORSTORE_QUANTIZED_INDEX_TYPE
+    if index_type not in INDEX_TYPES:
+        raise ValueError(f"Unknown vector index type: {index_type}")
+    return index_type
+
+
+def ivfpq_params(count: int, dim: int):
+    """(nlist, m, nbits) sized so training has enough points and codes are ~1 byte per 8 dimensions"""
+    nlist = max(1, min(int(4 * math.sqrt(count)), count // MIN_POINTS_PER_CENTROID))
+    m = max(divisor for divisor in range(1, max(1, dim // 8) + 1) if dim % divisor == 0)
+    # 8-bit codebooks need 256 centroids per subquantizer; use fewer bits for small stores
+    nbits = max(1, min(8, int(math.log2(max(2, count // MIN_POINTS_PER_CENTROID)))))
+    return nlist, m, nbits
+
+
+def build_index(vectors: np.ndarray, index_type: str) -> faiss.Index:
+    """Train (if needed) and fill a faiss index of index_type with vectors, keeping their order"""
+    vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+    count, dim = vectors.shape
+    if index_type == "flat":
+        index = faiss.IndexFlatL2(dim)
+    elif index_type == "fp16":
+        index = faiss.IndexScalarQuantizer(dim, faiss.ScalarQuantizer.QT_fp16, faiss.METRIC_L2)
+    elif index_type == "sq8":
+        index = faiss.IndexScalarQuantizer(dim, faiss.ScalarQuantizer.QT_8bit, faiss.METRIC_L2)
+    elif index_type == "ivfpq":
+        nlist, m, nbits = ivfpq_params(count, dim)
+        index = faiss.index_factory(dim, f"IVF{nlist},PQ{m}x{nbits}", faiss.METRIC_L2)
+    else:
+        raise ValueError(f"Unknown vector index type: {index_type}")
+
+    if not index.is_trained:
+        index.train(vectors)
+    index.add(vectors)
+    if index_type == "ivfpq":
+        # MMR re-ranks candidates with index.reconstruct(), which IVF indexes
+        # only support with a direct map
+        faiss.extract_index_ivf(index).make_direct_map()
+        faiss.extract_index_ivf(index).nprobe = min(nlist, settings.VECTORSTORE_IVF_NPROBE)
+    return index
+
+
+def compress_vector_store(vectorstore: FAISS, index_type: str = None) -> FAISS:
+    """Swap a freshly built flat store's index for the configured compressed one.
+
+    Positions are preserved, so index_to_docstore_id and the docstore are
+    reused as they are. The mmap format serves a raw float32 matrix, so stores
+    saved in it always stay flat.
+    """
+    index_type = choose_index_type(vectorstore.index.ntotal, index_type)
+    if index_type == "flat" or settings.VECTORSTORE_FORMAT == "mmap":
+        return vectorstore
+    print(f"Training {index_type} index for {vectorstore.index.ntotal} vectors...")
+    vectors = vectorstore.index.reconstruct_n(0, vectorstore.index.ntotal)
+    vectorstore.index = build_index(vectors, index_type)
+    return vectorstore
@@ -0,0 +1,205 @@
+import hashlib
+import sqlite3
+import threading
+import time
+import unicodedata
+from array import array
+from collections import OrderedDict
+from typing import Dict, List, Optional
+
+from django.conf import settings
+
+# Entry kinds, counted separately in stats()
+EXPANSION = "expansion"
+EMBEDDING = "embedding"
+
+# Expired rows are removed from the SQLite file every this many writes
+PRUNE_EVERY = 200
+
+
+def normalize_question(text: str) -> str:
+    """Case, width and whitespace folded, trailing punctuation dropped: "What is DNA? " == "what is dna" """
+    text = " ".join(unicodedata.normalize("NFKC", text).casefold().split())
+    return text.rstrip("?!.।॥ ") or text
+
+
+def query_key(kind: str, *parts: str) -> str:
+    return hashlib.sha256("\x00".join((kind,) + parts).encode('utf-8')).hexdigest()
+
+
+class QueryCache:
+    """TTL + LRU cache for query expansions and query embeddings.
+
+    Entries live in an in-process OrderedDict bounded by max_entries. With a
+    path, they are also written to a SQLite file shared by every worker
+    process, which is consulted on an in-process miss. Expansions are stored
+    as text and embeddings as float32 blobs, the precision FAISS searches at.
+    """
+
+    def __init__(self, max_entries: int, ttl_seconds: int, path: Optional[str] = None):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.path = str(path) if path else None
+        self.hits = {EXPANSION: 0, EMBEDDING: 0}
+        self.misses = {EXPANSION: 0, EMBEDDING: 0}
+        self.shared_hits = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.writes = 0
+        # key -> (value, expires_at)
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+        if self.path:
+            with self._connect() as conn:
+                conn.execute("PRAGMA journal_mode=WAL")
+                conn.execute(
+                    "CREATE TABLE IF NOT EXISTS query_cache ("
+                    " key TEXT PRIMARY KEY,"
+                    " value BLOB NOT NULL,"
+                    " expires_at REAL NOT NULL)"
+                )
+
+    def _connect(self):
+        return sqlite3.connect(self.path, timeout=30)
+
+    def get(self, kind: str, key: str):
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                if entry[1] > now:
+                    self._entries.move_to_end(key)
+                    self.hits[kind] += 1
+                    return entry[0]
+                del self._entries[key]
+                self.expirations += 1
+
+        if self.path:
+            with self._connect() as conn:
+                row = conn.execute(
+                    "SELECT value, expires_at FROM query_cache WHERE key = ? AND expires_at > ?", (key, now)
+                ).fetchone()
+            if row is not None:
+                value = row[0] if isinstance(row[0], str) else array('f', row[0]).tolist()
+                with self._lock:
+                    self._store(key, value, row[1])
+                    self.hits[kind] += 1
+                    self.shared_hits += 1
+                return value
+
+        with self._lock:
+            self.misses[kind] += 1
+        return None
+
+    def put(self, kind: str, key: str, value):
+        if not isinstance(value, str):
+            # Round-trip through float32 so in-process and shared hits return the same vector
+            value = array('f', value).tolist()
+        expires_at = time.time() + self.ttl_seconds
+        with self._lock:
+            self._store(key, value, expires_at)
+            self.writes += 1
+            prune = self.writes % PRUNE_EVERY == 0
+
+        if self.path:
+            blob = value if isinstance(value, str) else array('f', value).tobytes()
+            with self._connect() as conn:
+                conn.execute(
+                    "INSERT OR REPLACE INTO query_cache (key, value, expires_at) VALUES (?, ?, ?)",
+                    (key, blob, expires_at)
+                )
+                if prune:
+                    self._prune(conn)
+
+    def _store(self, key: str, value, expires_at: float):
+        self._entries[key] = (value, expires_at)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def _prune(self, conn):
+        """Drop expired rows, then the soonest-expiring ones beyond max_entries"""
+        conn.execute("DELETE FROM query_cache WHERE expires_at <= ?", (time.time(),))
+        conn.execute(
+            "DELETE FROM query_cache WHERE key IN ("
+            " SELECT key FROM query_cache ORDER BY expires_at"
+            " LIMIT MAX(0, (SELECT COUNT(*) FROM query_cache) - ?))",
+            (self.max_entries,)
+        )
+
+    def get_or_compute(self, kind: str, key: str, compute):
+        value = self.get(kind, key)
+        if value is None:
+            value = compute()
+            self.put(kind, key, value)
+        return value
+
+    def expand_query(self, store_id: str, language: str, question: str, expand) -> str:
+        """expand(question) cached per store, language and normalized question"""
+        key = query_key(EXPANSION, store_id, language, normalize_question(question))
+        return self.get_or_compute(EXPANSION, key, lambda: expand(question))
+
+    def embed_query(self, embedding_model, text: str):
+        """Query vector cached per embedding model and normalized text"""
+        key = query_key(EMBEDDING, getattr(embedding_model, "name", type(embedding_model).__name__),
+                        normalize_question(text))
+        return self.get_or_compute(EMBEDDING, key, lambda: embedding_model.embed_query(text))
+
+    def embed_queries(self, embedding_model, texts: List[str]) -> List[List[float]]:
+        """embed_query for several texts; the uncached ones are embedded in one batch"""
+        name = getattr(embedding_model, "name", type(embedding_model).__name__)
+        keys = [query_key(EMBEDDING, name, normalize_question(text)) for text in texts]
+        vectors = [self.get(EMBEDDING, key) for key in keys]
+        missing = {}
+        for index, vector in enumerate(vectors):
+            if vector is None:
+                missing.setdefault(keys[index], []).append(index)
+        if missing:
+            batch = [texts[indices[0]] for indices in missing.values()]
+            if hasattr(embedding_model, "embed_queries"):
+                computed = embedding_model.embed_queries(batch)
+            else:
+                computed = [embedding_model.embed_query(text) for text in batch]
+            for (key, indices), vector in zip(missing.items(), computed):
+                self.put(EMBEDDING, key, vector)
+                for index in indices:
+                    vectors[index] = vector
+        return vectors
+
+    def stats(self) -> Dict:
+        with self._lock:
+            stats = {}
+            for kind in (EXPANSION, EMBEDDING):
+                lookups = self.hits[kind] + self.misses[kind]
+                stats[kind] = {
+                    "hits": self.hits[kind],
+                    "misses": self.misses[kind],
+                    "hit_rate": round(self.hits[kind] / lookups, 4) if lookups else 0.0,
+                }
+            stats.update({
+                "shared_hits": self.shared_hits,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "ttl_seconds": self.ttl_seconds,
+                "shared": self.path is not None,
+            })
+            return stats
+
+
+_query_cache: Optional[QueryCache] = None
+_query_cache_lock = threading.Lock()
+
+
+def get_query_cache() -> QueryCache:
+    global _query_cache
+    with _query_cache_lock:
+        if _query_cache is None:
+            _query_cache = QueryCache(
+                settings.QUERY_CACHE_MAX_ENTRIES,
+                settings.QUERY_CACHE_TTL_SECONDS,
+                settings.QUERY_CACHE_PATH or None
+            )
+        return _query_cache
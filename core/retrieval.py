@@ -0,0 +1,307 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+from django.conf import settings
+from langchain.schema import Document
+from langchain_community.vectorstores import FAISS
+
+from .query_cache import get_query_cache
+from .timings import timed
+
+
+def fusion_scores(rankings: List[List[int]], rrf_k: int) -> Dict[int, float]:
+    """Reciprocal rank fusion score of every ranked position: the sum of 1 / (rrf_k + rank)"""
+    scores: Dict[int, float] = {}
+    for ranking in rankings:
+        for rank, position in enumerate(ranking, start=1):
+            scores[position] = scores.get(position, 0.0) + 1.0 / (rrf_k + rank)
+    return scores
+
+
+def reciprocal_rank_fusion(rankings: List[List[int]], rrf_k: int) -> List[int]:
+    """Merge ranked lists of positions, best fused score first"""
+    scores = fusion_scores(rankings, rrf_k)
+    return sorted(scores, key=lambda position: (-scores[position], position))
+
+
+def unit_rows(vectors: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    return vectors / np.where(norms == 0, 1, norms)
+
+
+def mmr_select(relevance: np.ndarray, candidate_vectors: np.ndarray, k: int, lambda_mult: float) -> List[int]:
+    """Maximal marginal relevance over candidates, as indices in selection order.
+
+    Each step picks the candidate maximising
+    lambda_mult * relevance - (1 - lambda_mult) * (highest cosine similarity to
+    anything already picked). The redundancy term is kept as a running maximum
+    updated with one matrix-vector product per pick, so a step is O(n * d) in
+    NumPy rather than a Python loop over the selected set. With relevance the
+    cosine similarity to the query this selects what LangChain's
+    maximal_marginal_relevance does.
+    """
+    k = min(k, len(relevance))
+    if k <= 0:
+        return []
+    unit = unit_rows(np.asarray(candidate_vectors, dtype=np.float32))
+    relevance = np.asarray(relevance, dtype=np.float32)
+
+    selected = [int(np.argmax(relevance))]
+    redundancy = unit @ unit[selected[0]]
+    while len(selected) < k:
+        scores = lambda_mult * relevance - (1 - lambda_mult) * redundancy
+        scores[selected] = -np.inf
+        best = int(np.argmax(scores))
+        selected.append(best)
+        np.maximum(redundancy, unit @ unit[best], out=redundancy)
+    return selected
+
+
+def cosine_relevance(query_vector: np.ndarray, candidate_vectors: np.ndarray) -> np.ndarray:
+    return unit_rows(np.asarray(candidate_vectors, dtype=np.float32)) @ unit_rows(
+        np.asarray(query_vector, dtype=np.float32)
+    )
+
+
+def candidate_vectors(vectorstore: FAISS, positions) -> np.ndarray:
+    return vectorstore.index.reconstruct_batch(np.asarray(positions, dtype=np.int64))
+
+
+def documents_at(vectorstore: FAISS, positions) -> List[Document]:
+    return [vectorstore.docstore.search(vectorstore.index_to_docstore_id[int(position)]) for position in positions]
+
+
+def mmr_rerank(vectorstore: FAISS, query_vector: np.ndarray, positions: np.ndarray, k: int,
+               lambda_mult: float) -> List[Document]:
+    """Nearest-neighbour positions re-ranked to k by mmr_select on their stored vectors"""
+    positions = positions[positions != -1]
+    if not len(positions):
+        return []
+    vectors = candidate_vectors(vectorstore, positions)
+    selected = mmr_select(cosine_relevance(query_vector, vectors), vectors, k, lambda_mult)
+    return documents_at(vectorstore, positions[selected])
+
+
+def mmr_search(vectorstore: FAISS, query_vector, k: int = 5, fetch_k: int = 25,
+               lambda_mult: float = 0.5) -> List[Document]:
+    """The fetch_k nearest chunks re-ranked to k by mmr_select on their stored vectors"""
+    query_vector = np.asarray(query_vector, dtype=np.float32)
+    _, ids = vectorstore.index.search(query_vector[None, :], min(fetch_k, vectorstore.index.ntotal))
+    return mmr_rerank(vectorstore, query_vector, ids[0], k, lambda_mult)
+
+
+def embed_query(vectorstore: FAISS, query: str) -> List[float]:
+    """The query's vector, from the query cache when the same text was searched recently"""
+    return get_query_cache().embed_query(vectorstore.embedding_function, query)
+
+
+def embed_queries(vectorstore: FAISS, queries: List[str]) -> np.ndarray:
+    """Vectors for several queries as one (n, d) array; cache misses are embedded in a single batch"""
+    return np.array(get_query_cache().embed_queries(vectorstore.embedding_function, queries), dtype=np.float32)
+
+
+def expand_query_cached(vectorstore: FAISS, question: str, expand_query: Callable[[str], str],
+                        language: str = "") -> str:
+    """expand_query(question), reused for the same normalized question on the same store and language"""
+    store_id = getattr(vectorstore, "store_id", None)
+    if store_id is None:
+        return expand_query(question)
+    return get_query_cache().expand_query(store_id, language, question, expand_query)
+
+
+def rank_candidates(vectorstore: FAISS, query: str, fetch_k: int,
+                    hybrid: bool) -> Tuple[List[List[int]], np.ndarray]:
+    """Best-first positions for query (the vector ranking, plus the BM25 ranking when hybrid) and the query vector"""
+    query_vector = np.array(embed_query(vectorstore, query), dtype=np.float32)
+    _, ids = vectorstore.index.search(query_vector[None, :], min(fetch_k, vectorstore.index.ntotal))
+    rankings = [[int(i) for i in ids[0] if i != -1]]
+    if hybrid:
+        rankings.append([position for position, _ in vectorstore.lexical_index.search(query, fetch_k)])
+    return rankings, query_vector
+
+
+def select_fused(vectorstore: FAISS, rankings: List[List[int]], k: int, fetch_k: int,
+                 lambda_mult: float) -> List[Document]:
+    """Top-k chunks by reciprocal rank fusion of rankings.
+
+    With lambda_mult below 1 the fetch_k best fused chunks are re-ranked by
+    MMR, using the fused score (scaled to 0..1) as relevance.
+    """
+    scores = fusion_scores(rankings, settings.RETRIEVAL_RRF_K)
+    fused = sorted(scores, key=lambda position: (-scores[position], position))[:fetch_k]
+    if lambda_mult >= 1 or len(fused) <= 1:
+        return documents_at(vectorstore, fused[:k])
+    relevance = np.array([scores[position] for position in fused], dtype=np.float32)
+    selected = mmr_select(relevance / relevance[0], candidate_vectors(vectorstore, fused), k, lambda_mult)
+    return documents_at(vectorstore, [fused[i] for i in selected])
+
+
+def hybrid_search(vectorstore: FAISS, query: str, k: int = 5, fetch_k: int = 25,
+                  lambda_mult: float = 1.0) -> List[Document]:
+    """Top-k chunks by reciprocal rank fusion of the fetch_k nearest vectors and fetch_k best BM25 matches"""
+    rankings, _ = rank_candidates(vectorstore, query, fetch_k, hybrid=True)
+    return select_fused(vectorstore, rankings, k, fetch_k, lambda_mult)
+
+
+def top_similarity(vectorstore: FAISS, rankings: List[List[int]], query_vector: np.ndarray) -> float:
+    """Cosine similarity between the query and its nearest chunk: how well the raw question already matches"""
+    if not rankings[0]:
+        return 0.0
+    nearest = candidate_vectors(vectorstore, rankings[0][:1])
+    return float(cosine_relevance(query_vector, nearest)[0])
+
+
+_expansion_pool: Optional[ThreadPoolExecutor] = None
+_expansion_pool_lock = threading.Lock()
+
+
+def expansion_pool() -> ThreadPoolExecutor:
+    global _expansion_pool
+    with _expansion_pool_lock:
+        if _expansion_pool is None:
+            _expansion_pool = ThreadPoolExecutor(
+                max_workers=settings.RETRIEVAL_EXPANSION_WORKERS,
+                thread_name_prefix="query-expansion"
+            )
+        return _expansion_pool
+
+
+def speculative_retrieve(vectorstore: FAISS, question: str, expand_query: Callable[[str], str], k: int,
+                         fetch_k: int, lambda_mult: float, hybrid: bool, language: str = "",
+                         timings: Optional[Dict] = None) -> Tuple[List[Document], str]:
+    """Search with the raw question while the LLM expansion runs in the background.
+
+    If the raw question's nearest chunk is at least
+    RETRIEVAL_CONFIDENCE_THRESHOLD cosine-similar, the raw results are used
+    and the expansion is not waited for (it still finishes into the query
+    cache). Otherwise the expanded query's rankings are fused with the raw
+    ones. A failed expansion falls back to the raw results.
+    """
+    def run_expansion():
+        start = time.perf_counter()
+        query = expand_query_cached(vectorstore, question, expand_query, language)
+        return query, round((time.perf_counter() - start) * 1000, 1)
+
+    future = expansion_pool().submit(run_expansion)
+    with timed(timings, "search_ms"):
+        rankings, query_vector = rank_candidates(vectorstore, question, fetch_k, hybrid)
+    confidence = top_similarity(vectorstore, rankings, query_vector)
+    if timings is not None:
+        timings["confidence"] = round(confidence, 4)
+
+    query = question
+    if confidence >= settings.RETRIEVAL_CONFIDENCE_THRESHOLD:
+        outcome = "skipped"
+    else:
+        try:
+            with timed(timings, "expansion_wait_ms"):
+                query, expansion_ms = future.result()
+            with timed(timings, "search_ms"):
+                rankings += rank_candidates(vectorstore, query, fetch_k, hybrid)[0]
+            outcome = "merged"
+            if timings is not None:
+                timings["expansion_ms"] = expansion_ms
+        except Exception as e:
+            print(f"Query expansion failed, using the raw question: {str(e)}")
+            outcome = "failed"
+    if timings is not None:
+        timings["expansion"] = outcome
+    return select_fused(vectorstore, rankings, k, fetch_k, lambda_mult), query
+
+
+def retrieve_documents(vectorstore: FAISS, question: str, expand_query: Callable[[str], str],
+                       k: Optional[int] = None, fetch_k: Optional[int] = None, lambda_mult: Optional[float] = None,
+                       language: str = "", timings: Optional[Dict] = None) -> Tuple[List[Document], str]:
+    """Chunks for answering question, and the query actually searched.
+
+    With RETRIEVAL_MODE "hybrid" and a store that has a BM25 index, lexical and
+    vector rankings are fused, and QUERY_EXPANSION decides whether the LLM
+    expansion runs first: "always", "never", or "auto" (only when none of the
+    question's content terms - stopwords and terms common to most chunks
+    aside - occur in the store, where lexical matching cannot help).
+    Otherwise this is MMR search over the expanded query. QUERY_EXPANSION
+    "speculative" takes the expansion off the critical path in either mode
+    (see speculative_retrieve).
+    Expansions and query vectors go through the query cache, so a question
+    repeated by another student skips both the LLM and the embedding call.
+
+    k and fetch_k default to RETRIEVAL_K / RETRIEVAL_FETCH_K. lambda_mult is
+    the MMR trade-off (1 = relevance only, 0 = diversity only) in both modes;
+    it defaults to RETRIEVAL_MMR_LAMBDA, and 1 keeps the plain fusion order in
+    hybrid search.
+
+    Stage times in ms (expansion_ms, search_ms, ...) are added to timings if
+    a dict is given.
+    """
+    k = k or settings.RETRIEVAL_K
+    fetch_k = max(fetch_k or settings.RETRIEVAL_FETCH_K, k)
+    lexical_index = getattr(vectorstore, "lexical_index", None)
+    hybrid = settings.RETRIEVAL_MODE == "hybrid" and lexical_index is not None
+    if lambda_mult is None:
+        lambda_mult = settings.RETRIEVAL_MMR_LAMBDA
+
+    if settings.QUERY_EXPANSION == "speculative":
+        return speculative_retrieve(
+            vectorstore, question, expand_query, k, fetch_k, lambda_mult, hybrid,
+            language=language, timings=timings
+        )
+
+    if not hybrid:
+        query = question
+        if settings.QUERY_EXPANSION != "never":
+            with timed(timings, "expansion_ms"):
+                query = expand_query_cached(vectorstore, question, expand_query, language)
+        with timed(timings, "search_ms"):
+            docs = mmr_search(vectorstore, embed_query(vectorstore, query), k=k, fetch_k=fetch_k,
+                              lambda_mult=lambda_mult)
+        return docs, query
+
+    query = question
+    if settings.QUERY_EXPANSION == "always" or (
+        settings.QUERY_EXPANSION == "auto" and not lexical_index.known_content_terms(question)
+    ):
+        with timed(timings, "expansion_ms"):
+            query = expand_query_cached(vectorstore, question, expand_query, language)
+    with timed(timings, "search_ms"):
+        docs = hybrid_search(vectorstore, query, k=k, fetch_k=fetch_k, lambda_mult=lambda_mult)
+    return docs, query
+
+
+def retrieve_batch(vectorstore: FAISS, questions: List[str], k: Optional[int] = None,
+                   fetch_k: Optional[int] = None, lambda_mult: Optional[float] = None,
+                   timings: Optional[Dict] = None) -> List[List[Document]]:
+    """Chunks for each of several questions on one store, in question order.
+
+    All questions are embedded in one batch and searched with one FAISS call
+    over the (n, d) query matrix; fusion with BM25 (hybrid mode) and MMR
+    then run per question on those candidates, with the same defaults as
+    retrieve_documents. Questions are searched as asked: expanding each one
+    would add an LLM call per question, which is what batching avoids.
+    """
+    k = k or settings.RETRIEVAL_K
+    fetch_k = max(fetch_k or settings.RETRIEVAL_FETCH_K, k)
+    lexical_index = getattr(vectorstore, "lexical_index", None)
+    hybrid = settings.RETRIEVAL_MODE == "hybrid" and lexical_index is not None
+    if lambda_mult is None:
+        lambda_mult = settings.RETRIEVAL_MMR_LAMBDA
+    if not questions:
+        return []
+
+    with timed(timings, "embed_ms"):
+        query_vectors = embed_queries(vectorstore, questions)
+    with timed(timings, "search_ms"):
+        _, ids = vectorstore.index.search(query_vectors, min(fetch_k, vectorstore.index.ntotal))
+        results = []
+        for question, query_vector, row in zip(questions, query_vectors, ids):
+            if not hybrid:
+                results.append(mmr_rerank(vectorstore, query_vector, row, k, lambda_mult))
+                continue
+            rankings = [
+                [int(i) for i in row if i != -1],
+                [position for position, _ in lexical_index.search(question, fetch_k)]
+            ]
+            results.append(select_fused(vectorstore, rankings, k, fetch_k, lambda_mult))
+    return results
@@ -0,0 +1,108 @@
+import os
+import threading
+from collections import OrderedDict
+from typing import Callable, Dict, Optional, Tuple
+
+from django.conf import settings
+
+
+def store_signature(store_path) -> Optional[Tuple]:
+    """(name, size, mtime) of every file in a store directory, or None if it is gone.
+
+    Stores are rewritten in place on re-ingestion and removed on delete, possibly
+    by another worker process, so a cached store is only served while its files
+    still look the same. This costs a directory stat, not a read.
+    """
+    try:
+        with os.scandir(store_path) as entries:
+            return tuple(sorted(
+                (entry.name, entry.stat().st_size, entry.stat().st_mtime_ns)
+                for entry in entries if entry.is_file()
+            ))
+    except FileNotFoundError:
+        return None
+
+
+class VectorStoreCache:
+    """Process-wide LRU cache of loaded vector stores bounded by a byte budget.
+
+    Sizes are taken from the store's files on disk, which tracks the in-memory
+    index and docstore closely enough for budgeting. A store larger than the
+    whole budget is returned without being cached.
+    """
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self.current_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+        # store_name -> (vectorstore, size_bytes, signature)
+        self._entries: "OrderedDict[str, Tuple[object, int, Tuple]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get_or_load(self, store_name: str, store_path, loader: Callable[[], object]):
+        signature = store_signature(store_path)
+        with self._lock:
+            entry = self._entries.get(store_name)
+            if entry is not None and signature is not None and entry[2] == signature:
+                self._entries.move_to_end(store_name)
+                self.hits += 1
+                return entry[0]
+            if entry is not None:
+                self._drop(store_name)
+                self.invalidations += 1
+            self.misses += 1
+
+        vectorstore = loader()
+        if signature is None:
+            return vectorstore
+        size = sum(file_size for _, file_size, _ in signature)
+
+        with self._lock:
+            if size > self.max_bytes:
+                return vectorstore
+            if store_name in self._entries:
+                self._drop(store_name)
+            self._entries[store_name] = (vectorstore, size, signature)
+            self.current_bytes += size
+            while self.current_bytes > self.max_bytes:
+                evicted_name = next(iter(self._entries))
+                self._drop(evicted_name)
+                self.evictions += 1
+        return vectorstore
+
+    def invalidate(self, store_name: str):
+        with self._lock:
+            if store_name in self._entries:
+                self._drop(store_name)
+                self.invalidations += 1
+
+    def _drop(self, store_name: str):
+        _, size, _ = self._entries.pop(store_name)
+        self.current_bytes -= size
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "invalidations": self.invalidations,
+                "entries": len(self._entries),
+                "bytes": self.current_bytes,
+                "max_bytes": self.max_bytes,
+            }
+
+
+_store_cache: Optional[VectorStoreCache] = None
+_store_cache_lock = threading.Lock()
+
+
+def get_store_cache() -> VectorStoreCache:
+    global _store_cache
+    with _store_cache_lock:
+        if _store_cache is None:
+            _store_cache = VectorStoreCache(settings.VECTORSTORE_CACHE_MAX_BYTES)
+        return _store_cache
@@ -0,0 +1,141 @@
+import hashlib
+import os
+import shutil
+from typing import Dict
+
+from django.conf import settings
+from django.db import IntegrityError, OperationalError
+from django.db.models import Count, Sum
+from django.utils import timezone
+
+from .store_cache import get_store_cache, store_signature
+from .vector_store import save_vector_store
+
+# VectorStoreRecord.kind for each store name prefix
+KIND_PREFIXES = (
+    ("book_", "pdf"),
+    ("yt_", "youtube"),
+    ("library_", "library"),
+)
+
+
+def vector_store_records():
+    # The processors import this module at import time, before Django's app
+    # registry may be ready; models are only imported once the database is
+    # actually used.
+    from .models import VectorStoreRecord
+    return VectorStoreRecord.objects
+
+
+def store_kind(store_name: str) -> str:
+    for prefix, kind in KIND_PREFIXES:
+        if store_name.startswith(prefix):
+            return kind
+    return "other"
+
+
+def store_relative_path(store_name: str) -> str:
+    """ab/cd/<sha256 of the name>: fixed-length, filesystem-safe and at most 256 entries per level"""
+    digest = hashlib.sha256(store_name.encode('utf-8')).hexdigest()
+    return os.path.join(digest[:2], digest[2:4], digest)
+
+
+def legacy_store_path(store_name: str, legacy_dir: str = None) -> str:
+    """Where stores used to live: directly in VECTORSTORES_DIR, named after the store"""
+    return os.path.join(legacy_dir or settings.VECTORSTORES_DIR, store_name)
+
+
+def is_shard_dir(name: str) -> bool:
+    return len(name) == 2 and all(c in "0123456789abcdef" for c in name)
+
+
+def get_store_path(store_name: str) -> str:
+    """Absolute directory of a store, moving it there first if it is still in the legacy flat layout"""
+    store_path = os.path.join(settings.VECTORSTORES_DIR, store_relative_path(store_name))
+    if not os.path.exists(store_path) and os.path.isdir(legacy_store_path(store_name)):
+        migrate_legacy_store(store_name)
+    return store_path
+
+
+def migrate_legacy_store(store_name: str, legacy_dir: str = None) -> bool:
+    """Move a flat-layout store into its sharded directory. False if another worker moved it first.
+
+    legacy_dir defaults to VECTORSTORES_DIR; YouTube stores used to be written
+    to a "vectorstores" directory relative to the working directory instead.
+    """
+    store_path = os.path.join(settings.VECTORSTORES_DIR, store_relative_path(store_name))
+    os.makedirs(os.path.dirname(store_path), exist_ok=True)
+    try:
+        # A rename within VECTORSTORES_DIR is atomic: readers see the old or the new path, never half a store
+        os.rename(legacy_store_path(store_name, legacy_dir), store_path)
+    except OSError as e:
+        if os.path.exists(store_path):
+            # Another worker moved it first
+            return False
+        raise e
+    get_store_cache().invalidate(store_name)
+    record_store(store_name)
+    print(f"Moved vector store {store_name} to {store_relative_path(store_name)}")
+    return True
+
+
+def record_store(store_name: str, chunk_count: int = None):
+    """Create or refresh the registry row for a store from what is on disk"""
+    signature = store_signature(
+        os.path.join(settings.VECTORSTORES_DIR, store_relative_path(store_name))
+    ) or ()
+    defaults = {
+        'relative_path': store_relative_path(store_name),
+        'kind': store_kind(store_name),
+        'size_bytes': sum(size for _, size, _ in signature),
+        'file_count': len(signature),
+    }
+    if chunk_count is not None:
+        defaults['chunk_count'] = chunk_count
+    # Bookkeeping only: the store is already on disk, so a failed write is
+    # logged rather than failing the upload, and no row lock is taken
+    try:
+        if not vector_store_records().filter(name=store_name).update(updated_at=timezone.now(), **defaults):
+            try:
+                vector_store_records().create(name=store_name, **defaults)
+            except IntegrityError:
+                # Another worker created the row first
+                vector_store_records().filter(name=store_name).update(updated_at=timezone.now(), **defaults)
+    except (IntegrityError, OperationalError) as e:
+        print(f"Could not record vector store {store_name} in the registry: {str(e)}")
+
+
+def persist_vector_store(vectorstore, store_name: str, store_format: str = None) -> str:
+    """Save a store under its registry path, record it and drop any cached copy. Returns the path."""
+    store_path = get_store_path(store_name)
+    save_vector_store(vectorstore, store_path, store_format)
+    record_store(store_name, vectorstore.index.ntotal)
+    get_store_cache().invalidate(store_name)
+    return store_path
+
+
+def delete_store(store_name: str):
+    """Remove a store's files and registry row"""
+    get_store_cache().invalidate(store_name)
+    store_path = get_store_path(store_name)
+    if os.path.exists(store_path):
+        shutil.rmtree(store_path)
+    vector_store_records().filter(name=store_name).delete()
+
+
+def registry_stats() -> Dict:
+    totals = vector_store_records().aggregate(
+        stores=Count('id'),
+        size_bytes=Sum('size_bytes'),
+        chunks=Sum('chunk_count')
+    )
+    by_kind = {
+        row['kind']: {'stores': row['stores'], 'size_bytes': row['size_bytes'] or 0}
+        for row in vector_store_records().values('kind').annotate(stores=Count('id'), size_bytes=Sum('size_bytes'))
+    }
+    return {
+        'stores': totals['stores'],
+        'size_bytes': totals['size_bytes'] or 0,
+        'chunks': totals['chunks'] or 0,
+        'by_kind': by_kind,
+    }
@@ -0,0 +1,95 @@
+import json
+from typing import Dict, List, Tuple
+
+# Answer prompts ask for <thinking>...</thinking><answer>...</answer>. deepseek-r1
+# also opens with its own <think> reasoning, which is not part of either section
+# and is dropped, as split_sections ignores it
+SECTION_TAGS = {
+    "<think>": None,
+    "</think>": None,
+    "<thinking>": "thinking",
+    "</thinking>": None,
+    "<answer>": "answer",
+    "</answer>": None,
+}
+
+NO_THINKING = "The model did not provide a separate thinking process."
+
+
+def split_sections(response: str) -> Tuple[str, str]:
+    """(thinking, answer) parsed from a complete LLM response.
+
+    Takes the first <thinking> and <answer> sections. A response missing
+    either tag (a failover/hedged provider may not use them) is returned
+    whole as the answer.
+    """
+    try:
+        thinking = response.split("<thinking>")[1].split("</thinking>")[0].strip()
+        answer = response.split("<answer>")[1].split("</answer>")[0].strip()
+    except IndexError:
+        return NO_THINKING, response.strip()
+    return thinking, answer
+
+
+class SectionSplitter:
+    """Split streamed LLM output into thinking and answer text as it arrives.
+
+    feed() takes whatever delta the provider sent and returns
+    (section, text) pieces ready to forward. A tag may be cut across deltas,
+    so a trailing "<" that could still become one is held back until the next
+    delta. Text outside the two sections is dropped, as split_sections does;
+    result() applies split_sections to the whole response once it is in, so
+    the final thinking and answer are exactly what the blocking path returns.
+    """
+
+    def __init__(self):
+        self.section = None
+        self.pending = ""
+        self.parts: Dict[str, List[str]] = {"thinking": [], "answer": []}
+        self.raw: List[str] = []
+
+    def _emit(self, text: str, events: List[Tuple[str, str]]):
+        if self.section and text:
+            self.parts[self.section].append(text)
+            events.append((self.section, text))
+
+    def feed(self, text: str) -> List[Tuple[str, str]]:
+        events = []
+        self.raw.append(text)
+        self.pending += text
+        while self.pending:
+            start = self.pending.find("<")
+            if start == -1:
+                self._emit(self.pending, events)
+                self.pending = ""
+                break
+            self._emit(self.pending[:start], events)
+            self.pending = self.pending[start:]
+            tag = next((tag for tag in SECTION_TAGS if self.pending.startswith(tag)), None)
+            if tag is not None:
+                self.section = SECTION_TAGS[tag]
+                self.pending = self.pending[len(tag):]
+            elif any(tag.startswith(self.pending) for tag in SECTION_TAGS):
+                break
+            else:
+                self._emit("<", events)
+                self.pending = self.pending[1:]
+        return events
+
+    def close(self) -> List[Tuple[str, str]]:
+        events = []
+        self._emit(self.pending, events)
+        self.pending = ""
+        return events
+
+    def text(self, section: str) -> str:
+        return "".join(self.parts[section]).strip()
+
+    def result(self) -> Tuple[str, str]:
+        """(thinking, answer) of the complete response, parsed as the blocking path does"""
+        return split_sections("".join(self.raw))
+
+
+def sse_event(event: str, data) -> str:
+    """One Server-Sent Events message"""
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
@@ -0,0 +1,95 @@
+import random
+
+from django.test import SimpleTestCase
+from langchain.text_splitter import RecursiveCharacterTextSplitter
+
+from core.chunking import CHUNK_OVERLAP, CHUNK_SIZE, CleanedText, OffsetTextSplitter
+from core.pdf_pages import clean_page_text
+
+PARAGRAPH = (
+    "Enzymes are biological catalysts. They lower the activation energy of a reaction "
+    "without being consumed, so one enzyme molecule can act on many substrate molecules.\n"
+    "Temperature and pH change the shape of the active site."
+)
+
+
+def sample_texts():
+    rng = random.Random(5)
+    words = ["cell", "membrane", "osmosis", "ATP", "mitochondria", "—", "e.g.", "photosynthesis", "x" * 40]
+    texts = {
+        "empty": "",
+        "whitespace": "  \n\n \t ",
+        "short": "One short line.",
+        "paragraphs": "\n\n".join([PARAGRAPH] * 12),
+        "repeated_passage": (PARAGRAPH + "\n") * 20,
+        "no_spaces": "a" * 2500,
+        "long_word_in_text": "start " + "b" * 1700 + " end of the page",
+        "unicode": "पाचन तंत्र में एंजाइम भोजन को तोड़ते हैं। " * 60,
+    }
+    for n in range(5):
+        pieces = []
+        for _ in range(rng.randint(50, 600)):
+            pieces.append(rng.choice(words))
+            pieces.append(rng.choice([" ", " ", " ", "\n", "\n\n", "  "]))
+        texts[f"random_{n}"] = "".join(pieces)
+    return texts
+
+
+class OffsetTextSplitterTests(SimpleTestCase):
+    def assert_matches_langchain(self, chunk_size, chunk_overlap):
+        reference = RecursiveCharacterTextSplitter(chunk_size=chunk_size, chunk_overlap=chunk_overlap)
+        splitter = OffsetTextSplitter(chunk_size=chunk_size, chunk_overlap=chunk_overlap)
+        for name, text in sample_texts().items():
+            with self.subTest(text=name, chunk_size=chunk_size):
+                chunks = splitter.split_text_with_offsets(text)
+                self.assertEqual([chunk for chunk, _, _ in chunks], reference.split_text(text))
+                for chunk, start, end in chunks:
+                    self.assertEqual(text[start:end], chunk)
+
+    def test_matches_langchain_with_defaults(self):
+        self.assert_matches_langchain(CHUNK_SIZE, CHUNK_OVERLAP)
+
+    def test_matches_langchain_with_small_chunks(self):
+        self.assert_matches_langchain(50, 10)
+        self.assert_matches_langchain(120, 0)
+
+    def test_repeated_passage_gets_its_own_offsets(self):
+        passage = PARAGRAPH.replace("\n", " ")
+        text = (passage + "\n\n") * 3
+        chunks = OffsetTextSplitter(chunk_size=len(passage) + 1, chunk_overlap=0).split_text_with_offsets(text)
+        self.assertEqual([chunk for chunk, _, _ in chunks], [passage] * 3)
+        self.assertEqual(len({start for _, start, _ in chunks}), 3)
+
+    def test_overlap_larger_than_chunk_is_rejected(self):
+        with self.assertRaises(ValueError):
+            OffsetTextSplitter(chunk_size=100, chunk_overlap=200)
+
+
+class CleanedTextTests(SimpleTestCase):
+    SOURCE = (
+        "\n   \nChapter 1\n__________\nEnzymes lower activation energy.\r\n"
+        "----- ----- -----\n  Indented line\n\n***\nLast line   \n"
+    )
+
+    def test_text_matches_clean_page_text(self):
+        for source in (self.SOURCE, "", "-----", "plain text", *sample_texts().values()):
+            with self.subTest(source=source[:20]):
+                self.assertEqual(CleanedText(source).text, clean_page_text(source))
+
+    def test_source_offset_maps_every_character_back(self):
+        for source in (self.SOURCE, PARAGRAPH, *sample_texts().values()):
+            cleaned = CleanedText(source)
+            with self.subTest(source=source[:20]):
+                for offset, char in enumerate(cleaned.text):
+                    if char != "\n":
+                        self.assertEqual(source[cleaned.source_offset(offset)], char)
+
+    def test_chunk_offsets_map_to_the_source(self):
+        source = self.SOURCE * 30
+        cleaned = CleanedText(source)
+        splitter = OffsetTextSplitter(chunk_size=60, chunk_overlap=10)
+        for chunk, start, _ in splitter.split_text_with_offsets(cleaned.text):
+            # Up to the first line break the chunk is a verbatim slice of the source
+            first_line = chunk.split("\n")[0]
+            source_start = cleaned.source_offset(start)
+            self.assertEqual(source[source_start:source_start + len(first_line)], first_line)
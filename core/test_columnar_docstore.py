@@ -0,0 +1,92 @@
+import os
+import shutil
+import tempfile
+
+from django.test import SimpleTestCase
+from langchain.schema import Document
+
+from core.columnar_docstore import (
+    ColumnarDocstore, ReadOnlyDocstoreError, docstore_files, make_preview, write_columnar_docstore
+)
+
+
+def chunk(text, page, **extra):
+    metadata = {
+        "source": "uploads/biology.pdf",
+        "page": page,
+        "chunk_id": f"p{page}c1",
+        "position": {"start": page * 10, "end": page * 10 + len(text), "length": len(text)},
+        "preview": make_preview(text),
+        "text_hash": f"{page:08x}",
+    }
+    metadata.update(extra)
+    return Document(page_content=text, metadata=metadata)
+
+
+def sample_documents():
+    return [
+        chunk("Enzymes lower the activation energy of reactions. " * 3, 1, score=0.5, reviewed=True),
+        chunk("पाचन तंत्र में एंजाइम", 2, score=2, reviewed=False, tags=["hindi", "digestion"]),
+        chunk("", 3, score=None, reviewed=None, tags=None, timestamp={"start": 1.5, "end": None}),
+        chunk("Osmosis moves water across a membrane.", 4, extra={}, timestamp={"start": 0, "end": 12}),
+        Document(page_content="A chunk with different metadata", metadata={
+            "source_type": "youtube", "source_id": 7, "preview": "not the text's preview", "nothing": None
+        }),
+    ]
+
+
+class ColumnarDocstoreTests(SimpleTestCase):
+    def setUp(self):
+        self.store_path = tempfile.mkdtemp(prefix="columnar-test-")
+        self.addCleanup(shutil.rmtree, self.store_path)
+
+    def round_trip(self, documents):
+        write_columnar_docstore(self.store_path, documents)
+        docstore = ColumnarDocstore(self.store_path)
+        self.assertEqual(len(docstore), len(documents))
+        return [docstore.search(str(position)) for position in range(len(docstore))]
+
+    def test_round_trip_keeps_text_and_metadata(self):
+        documents = sample_documents()
+        for original, loaded in zip(documents, self.round_trip(documents)):
+            self.assertEqual(loaded.page_content, original.page_content)
+            self.assertEqual(loaded.metadata, original.metadata)
+
+    def test_value_types_survive(self):
+        loaded = self.round_trip(sample_documents())
+        self.assertIs(loaded[0].metadata["reviewed"], True)
+        self.assertIsInstance(loaded[0].metadata["score"], float)
+        self.assertIsInstance(loaded[1].metadata["score"], int)
+        self.assertIsInstance(loaded[3].metadata["timestamp"]["start"], int)
+        self.assertIsInstance(loaded[2].metadata["timestamp"]["start"], float)
+
+    def test_none_values_read_back_as_none(self):
+        loaded = self.round_trip(sample_documents())
+        self.assertIsNone(loaded[2].metadata["score"])
+        self.assertIsNone(loaded[2].metadata["reviewed"])
+        self.assertIsNone(loaded[2].metadata["tags"])
+        self.assertIsNone(loaded[2].metadata["timestamp"]["end"])
+        self.assertIsNone(loaded[4].metadata["nothing"])
+
+    def test_missing_keys_stay_missing(self):
+        loaded = self.round_trip(sample_documents())
+        self.assertNotIn("score", loaded[3].metadata)
+        self.assertNotIn("page", loaded[4].metadata)
+        self.assertNotIn("source_type", loaded[0].metadata)
+
+    def test_rewrite_replaces_previous_files(self):
+        self.round_trip(sample_documents())
+        documents = [chunk("Only chunk", 1)]
+        self.assertEqual([doc.metadata for doc in self.round_trip(documents)], [documents[0].metadata])
+        for name in os.listdir(self.store_path):
+            self.assertIn(name, docstore_files(self.store_path))
+
+    def test_empty_store(self):
+        self.assertEqual(self.round_trip([]), [])
+
+    def test_out_of_range_and_delete(self):
+        write_columnar_docstore(self.store_path, sample_documents())
+        docstore = ColumnarDocstore(self.store_path)
+        self.assertIsInstance(docstore.search("99"), str)
+        with self.assertRaises(ReadOnlyDocstoreError):
+            docstore.delete(["0"])
@@ -0,0 +1,112 @@
+import random
+
+from django.test import SimpleTestCase
+from langchain.schema import Document
+
+from core.chunking import OffsetTextSplitter
+from core.context import (
+    CHARS_PER_TOKEN, MIN_PASSAGE_TOKENS, assemble_context, context_hash, estimate_tokens, fit_to_budget,
+    merge_passages
+)
+from core.pdf_pages import page_chunks
+
+SENTENCES = [
+    "Enzymes are proteins that speed up chemical reactions in living cells.",
+    "Each enzyme has an active site that binds a specific substrate.",
+    "Temperature and pH change the shape of the active site.",
+    "Denatured enzymes lose their activity permanently.",
+    "Inhibitors compete with the substrate for the active site.",
+]
+
+
+def page_text(seed, sentences=60):
+    # Numbered, so no chunk's text repeats elsewhere on the page (that would count as a duplicate)
+    rng = random.Random(seed)
+    return " ".join(f"({n}) {rng.choice(SENTENCES)}" for n in range(sentences))
+
+
+def page_docs(page_num, text, chunk_size=300, chunk_overlap=80):
+    splitter = OffsetTextSplitter(chunk_size=chunk_size, chunk_overlap=chunk_overlap)
+    return [
+        Document(page_content=chunk_text, metadata=metadata)
+        for chunk_text, metadata in page_chunks("book.pdf", page_num, text, splitter)
+    ]
+
+
+class MergePassagesTests(SimpleTestCase):
+    def test_overlapping_chunks_of_a_page_merge_back_into_the_page(self):
+        text = page_text(1)
+        docs = page_docs(1, text)
+        self.assertGreater(len(docs), 3)
+        random.Random(2).shuffle(docs)
+        passages = merge_passages(docs)
+        self.assertEqual(len(passages), 1)
+        self.assertEqual(passages[0].text, text)
+
+    def test_gap_between_chunks_keeps_them_apart(self):
+        docs = page_docs(1, page_text(3))
+        passages = merge_passages([docs[0], docs[2]])
+        self.assertEqual([passage.text for passage in passages], [docs[0].page_content, docs[2].page_content])
+
+    def test_duplicates_are_dropped(self):
+        docs = page_docs(1, page_text(4))
+        passages = merge_passages([docs[1], docs[1], docs[1]])
+        self.assertEqual([passage.text for passage in passages], [docs[1].page_content])
+
+    def test_pages_are_not_merged_and_retrieval_order_is_kept(self):
+        page_one = page_docs(1, page_text(5))
+        page_two = page_docs(2, page_text(6))
+        passages = merge_passages([page_two[1], page_one[0], page_two[0], page_one[1]])
+        self.assertEqual(len(passages), 2)
+        # The merged page-two passage takes the place of its best-ranked chunk
+        self.assertTrue(passages[0].text.startswith(page_two[0].page_content))
+        self.assertTrue(passages[1].text.startswith(page_one[0].page_content))
+
+    def test_adjacent_transcript_chunks_merge(self):
+        metadata = {"video_id": "abc", "video_hash": "h"}
+        first = Document(page_content="Cells divide by mitosis.", metadata={
+            **metadata, "timestamp": {"start": 0.0, "end": 10.0}
+        })
+        second = Document(page_content="Meiosis makes gametes.", metadata={
+            **metadata, "timestamp": {"start": 10.5, "end": 20.0}
+        })
+        passages = merge_passages([second, first])
+        self.assertEqual([passage.text for passage in passages], ["Cells divide by mitosis. Meiosis makes gametes."])
+
+    def test_chunks_without_source_metadata_are_kept_separately(self):
+        docs = [Document(page_content="alpha beta"), Document(page_content="gamma"), Document(page_content="alpha")]
+        self.assertEqual([passage.text for passage in merge_passages(docs)], ["alpha beta", "gamma"])
+
+
+class TokenBudgetTests(SimpleTestCase):
+    def test_texts_within_budget_are_kept_whole(self):
+        texts = ["a" * 40, "b" * 40]
+        self.assertEqual(fit_to_budget(texts, 20), texts)
+
+    def test_last_text_is_cut_at_a_word_boundary(self):
+        words = " ".join(["word"] * 200)
+        kept = fit_to_budget(["x" * 40, words], 10 + MIN_PASSAGE_TOKENS)
+        self.assertEqual(kept[0], "x" * 40)
+        self.assertLessEqual(len(kept[1]), MIN_PASSAGE_TOKENS * CHARS_PER_TOKEN)
+        self.assertTrue(words.startswith(kept[1]))
+        self.assertFalse(kept[1].endswith(" "))
+        self.assertTrue(kept[1].endswith("word"))
+
+    def test_short_remainder_is_dropped(self):
+        self.assertEqual(fit_to_budget(["x" * 40, "y" * 400], 10 + MIN_PASSAGE_TOKENS - 1), ["x" * 40])
+
+    def test_assembled_context_respects_budget(self):
+        docs = page_docs(1, page_text(7)) + page_docs(2, page_text(8))
+        for budget in (60, 200, 400, 10000):
+            with self.subTest(budget=budget):
+                context = assemble_context(docs, token_budget=budget)
+                self.assertLessEqual(
+                    sum(estimate_tokens(passage) for passage in context.split("\n\n")), budget
+                )
+
+    def test_context_hash_is_full_sha256_of_the_context(self):
+        docs = page_docs(1, page_text(9))
+        context = assemble_context(docs, token_budget=500)
+        self.assertEqual(len(context_hash(context)), 64)
+        self.assertEqual(context_hash(context), context_hash(assemble_context(list(reversed(docs)), token_budget=500)))
+        self.assertNotEqual(context_hash(context), context_hash(context + " "))
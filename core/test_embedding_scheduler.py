@@ -0,0 +1,100 @@
+import threading
+import time
+
+from django.test import SimpleTestCase
+
+from core.embedding_scheduler import EmbeddingScheduler, RateLimiter, is_rate_limited
+
+
+class RateLimitError(Exception):
+    def __init__(self, message="Too Many Requests"):
+        super().__init__(message)
+        self.status_code = 429
+
+
+class FakeEmbeddingServer:
+    """Stands in for the embedding API: fails the first `rate_limited` calls with a 429
+    and records how many batches were in flight at once"""
+
+    def __init__(self, rate_limited: int = 0, latency: float = 0.02):
+        self.rate_limited = rate_limited
+        self.latency = latency
+        self.calls = 0
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self._lock = threading.Lock()
+
+    def embed_batch(self, texts):
+        with self._lock:
+            self.calls += 1
+            if self.calls <= self.rate_limited:
+                raise RateLimitError()
+            self.in_flight += 1
+            self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        try:
+            time.sleep(self.latency)
+            return [[float(len(text))] for text in texts]
+        finally:
+            with self._lock:
+                self.in_flight -= 1
+
+
+def make_scheduler(server, **kwargs):
+    options = dict(batch_size=2, max_concurrency=3, base_delay=0.01, max_delay=0.05)
+    options.update(kwargs)
+    return EmbeddingScheduler(server.embed_batch, rate_limiter=RateLimiter(requests_per_minute=1000), **options)
+
+
+class IsRateLimitedTests(SimpleTestCase):
+    def test_status_code(self):
+        self.assertTrue(is_rate_limited(RateLimitError()))
+
+    def test_resource_exhausted_in_cause_chain(self):
+        class ResourceExhausted(Exception):
+            pass
+
+        try:
+            try:
+                raise ResourceExhausted("quota")
+            except ResourceExhausted as e:
+                raise ValueError("Error embedding content") from e
+        except ValueError as wrapped:
+            self.assertTrue(is_rate_limited(wrapped))
+
+    def test_429_in_message_is_not_rate_limiting(self):
+        self.assertFalse(is_rate_limited(ValueError("chunk 4291 is 429 bytes too long")))
+
+
+class EmbeddingSchedulerTests(SimpleTestCase):
+    def test_retries_rate_limited_batches(self):
+        server = FakeEmbeddingServer(rate_limited=2)
+        vectors = make_scheduler(server, max_concurrency=1).embed_documents(["a", "bb", "ccc"])
+        self.assertEqual(vectors, [[1.0], [2.0], [3.0]])
+        self.assertEqual(server.calls, 4)
+
+    def test_gives_up_after_max_retries(self):
+        server = FakeEmbeddingServer(rate_limited=10)
+        with self.assertRaises(RateLimitError):
+            make_scheduler(server, max_concurrency=1, max_retries=2).embed_documents(["a"])
+        self.assertEqual(server.calls, 3)
+
+    def test_other_errors_are_not_retried(self):
+        calls = []
+
+        def embed_batch(texts):
+            calls.append(texts)
+            raise ValueError("request 429 failed")
+
+        scheduler = EmbeddingScheduler(embed_batch, rate_limiter=RateLimiter(requests_per_minute=1000))
+        with self.assertRaises(ValueError):
+            scheduler.embed_documents(["a"])
+        self.assertEqual(len(calls), 1)
+
+    def test_concurrency_is_capped(self):
+        server = FakeEmbeddingServer()
+        texts = [str(i) for i in range(20)]
+        vectors = make_scheduler(server, max_concurrency=3).embed_documents(texts)
+        self.assertEqual(len(vectors), len(texts))
+        self.assertEqual(server.calls, 10)
+        self.assertLessEqual(server.max_in_flight, 3)
+        self.assertGreater(server.max_in_flight, 1)
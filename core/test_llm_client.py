@@ -0,0 +1,72 @@
+from django.test import SimpleTestCase
+
+from core.llm_client import LLMClient, LLMError
+from core.load_testing import Faults, FakeLLMServer
+
+MESSAGES = [{"role": "user", "content": "How does the enzyme affect the cell?"}]
+
+
+class FailFirst(Faults):
+    """Fails the first `failures` calls to the fake Groq server, then answers normally"""
+
+    def __init__(self, failures: int, latency_ms: float = 0):
+        super().__init__({"groq": latency_ms}, {}, jitter=0)
+        self.failures = failures
+
+    def should_fail(self, service: str) -> bool:
+        super().should_fail(service)
+        return self.calls[service] <= self.failures
+
+
+class LLMClientTests(SimpleTestCase):
+    def start_server(self, faults, failure_status=503):
+        server = FakeLLMServer(faults, failure_status=failure_status)
+        base_url = server.start()
+        self.addCleanup(server.stop)
+        return base_url
+
+    def make_client(self, base_url, **kwargs):
+        options = dict(max_retries=3, base_delay=0.01, max_delay=0.05)
+        options.update(kwargs)
+        return LLMClient(base_url, "test-key", **options)
+
+    def test_retries_429_then_succeeds(self):
+        faults = FailFirst(2)
+        client = self.make_client(self.start_server(faults, failure_status=429))
+        answer = client.chat(MESSAGES, model="test-model")
+        self.assertIn("<answer>", answer)
+        self.assertEqual(faults.calls["groq"], 3)
+        self.assertEqual(client.stats()["test-model"]["retries"], 2)
+
+    def test_retries_5xx_until_exhausted(self):
+        faults = FailFirst(10)
+        client = self.make_client(self.start_server(faults, failure_status=503), max_retries=2)
+        with self.assertRaises(LLMError) as raised:
+            client.chat(MESSAGES, model="test-model")
+        self.assertEqual(raised.exception.status_code, 503)
+        self.assertEqual(faults.calls["groq"], 3)
+        self.assertEqual(client.stats()["test-model"]["errors"], 1)
+
+    def test_client_errors_are_not_retried(self):
+        faults = FailFirst(10)
+        client = self.make_client(self.start_server(faults, failure_status=400))
+        with self.assertRaises(LLMError) as raised:
+            client.chat(MESSAGES, model="test-model")
+        self.assertEqual(raised.exception.status_code, 400)
+        self.assertEqual(faults.calls["groq"], 1)
+
+    def test_timeouts_are_not_retried(self):
+        faults = FailFirst(0, latency_ms=500)
+        client = self.make_client(self.start_server(faults), read_timeout=0.1)
+        with self.assertRaises(LLMError) as raised:
+            client.chat(MESSAGES, model="test-model")
+        self.assertIsNone(raised.exception.status_code)
+        self.assertIn("timed out", str(raised.exception))
+        self.assertEqual(faults.calls["groq"], 1)
+
+    def test_stream_yields_deltas(self):
+        faults = FailFirst(1)
+        client = self.make_client(self.start_server(faults, failure_status=429))
+        answer = "".join(client.chat_stream(MESSAGES, model="test-model"))
+        self.assertIn("<answer>", answer)
+        self.assertEqual(faults.calls["groq"], 2)
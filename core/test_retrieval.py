@@ -0,0 +1,67 @@
+import numpy as np
+from django.test import SimpleTestCase, override_settings
+from langchain_community.embeddings import FakeEmbeddings
+from langchain_community.vectorstores import FAISS
+from langchain_community.vectorstores.utils import maximal_marginal_relevance
+
+from core.retrieval import cosine_relevance, fusion_scores, mmr_select, reciprocal_rank_fusion, select_fused
+
+
+def random_vectors(seed, n, d=16):
+    return np.random.default_rng(seed).normal(size=(n, d)).astype(np.float32)
+
+
+class MMRSelectTests(SimpleTestCase):
+    def test_matches_langchain_maximal_marginal_relevance(self):
+        for seed in range(20):
+            vectors = random_vectors(seed, 40)
+            query = random_vectors(seed + 1000, 1)[0]
+            for lambda_mult in (0.0, 0.25, 0.5, 0.9, 1.0):
+                for k in (1, 5, 40):
+                    with self.subTest(seed=seed, lambda_mult=lambda_mult, k=k):
+                        expected = maximal_marginal_relevance(query, list(vectors), lambda_mult=lambda_mult, k=k)
+                        selected = mmr_select(cosine_relevance(query, vectors), vectors, k, lambda_mult)
+                        self.assertEqual(selected, expected)
+
+    def test_duplicates_are_skipped_when_diversity_counts(self):
+        base = random_vectors(1, 3)
+        vectors = np.vstack([base[0], base[0] * 2, base[1], base[2]])
+        query = base[0] + 0.1 * base[1]
+        selected = mmr_select(cosine_relevance(query, vectors), vectors, 2, 0.5)
+        self.assertEqual(selected[0], 0)
+        self.assertNotEqual(selected[1], 1)
+
+    def test_k_larger_than_candidates_and_empty(self):
+        vectors = random_vectors(2, 3)
+        self.assertEqual(sorted(mmr_select(cosine_relevance(vectors[0], vectors), vectors, 10, 0.5)), [0, 1, 2])
+        self.assertEqual(mmr_select(np.zeros(0), np.zeros((0, 16)), 5, 0.5), [])
+
+
+class ReciprocalRankFusionTests(SimpleTestCase):
+    def test_scores_sum_over_rankings(self):
+        scores = fusion_scores([[3, 1, 2], [1, 4]], rrf_k=60)
+        self.assertAlmostEqual(scores[1], 1 / 62 + 1 / 61)
+        self.assertAlmostEqual(scores[3], 1 / 61)
+        self.assertAlmostEqual(scores[4], 1 / 62)
+        self.assertAlmostEqual(scores[2], 1 / 63)
+
+    def test_order_and_ties(self):
+        # 1 is in both lists; 3 and 5 tie at rank 1 and are ordered by position
+        self.assertEqual(reciprocal_rank_fusion([[5, 1, 2], [3, 1]], rrf_k=60), [1, 3, 5, 2])
+        self.assertEqual(reciprocal_rank_fusion([], rrf_k=60), [])
+
+    def test_low_rrf_k_favours_top_ranks(self):
+        rankings = [[7, 8, 9], [9, 8, 7], [7]]
+        self.assertEqual(reciprocal_rank_fusion(rankings, rrf_k=1)[0], 7)
+
+    @override_settings(RETRIEVAL_RRF_K=60)
+    def test_select_fused_keeps_fusion_order_at_lambda_one(self):
+        vectors = random_vectors(3, 6)
+        texts = [f"chunk {i}" for i in range(6)]
+        vectorstore = FAISS.from_embeddings(list(zip(texts, vectors.tolist())), FakeEmbeddings(size=16))
+        rankings = [[4, 2, 0], [2, 5]]
+        docs = select_fused(vectorstore, rankings, k=3, fetch_k=10, lambda_mult=1.0)
+        self.assertEqual([doc.page_content for doc in docs], ["chunk 2", "chunk 4", "chunk 5"])
+        diverse = select_fused(vectorstore, rankings, k=3, fetch_k=10, lambda_mult=0.5)
+        self.assertEqual(diverse[0].page_content, "chunk 2")
+        self.assertEqual(len({doc.page_content for doc in diverse}), 3)
@@ -0,0 +1,57 @@
+from django.test import SimpleTestCase
+
+from core.streaming import NO_THINKING, SectionSplitter, split_sections
+
+RESPONSES = {
+    "tagged": "<thinking>The enzyme lowers activation energy.</thinking>\n<answer>It speeds up the reaction.</answer>",
+    "reasoning_model": (
+        "<think>The user asks about enzymes; answer from the context.</think>\n"
+        "<thinking>Chapter 3 covers catalysis.</thinking><answer>Enzymes are catalysts.</answer>"
+    ),
+    "untagged": "Enzymes are proteins that catalyse reactions.",
+    "answer_only": "<answer>Only an answer, no thinking section.</answer>",
+    "text_between_sections": "Sure! <thinking>a < b</thinking> Here you go: <answer>Use 2 < 3.</answer> Bye",
+}
+
+
+def stream(response, delta_size):
+    """Feed response to a SectionSplitter in delta_size pieces, as a provider would stream it"""
+    splitter = SectionSplitter()
+    events = []
+    for start in range(0, len(response), delta_size):
+        events += splitter.feed(response[start:start + delta_size])
+    events += splitter.close()
+    return splitter, events
+
+
+def streamed_text(events, section):
+    return "".join(text for event, text in events if event == section).strip()
+
+
+class SectionSplitterTests(SimpleTestCase):
+    def test_result_matches_blocking_parser(self):
+        for name, response in RESPONSES.items():
+            for delta_size in (1, 3, 7, len(response)):
+                with self.subTest(response=name, delta_size=delta_size):
+                    splitter, _ = stream(response, delta_size)
+                    self.assertEqual(splitter.result(), split_sections(response))
+
+    def test_streamed_sections_match_blocking_parser(self):
+        for name in ("tagged", "reasoning_model", "text_between_sections"):
+            response = RESPONSES[name]
+            thinking, answer = split_sections(response)
+            for delta_size in (1, 3, 7):
+                with self.subTest(response=name, delta_size=delta_size):
+                    _, events = stream(response, delta_size)
+                    self.assertEqual(streamed_text(events, "thinking"), thinking)
+                    self.assertEqual(streamed_text(events, "answer"), answer)
+
+    def test_think_block_is_dropped(self):
+        _, events = stream(RESPONSES["reasoning_model"], 4)
+        self.assertNotIn("The user asks", "".join(text for _, text in events))
+
+    def test_untagged_response_is_the_answer(self):
+        response = RESPONSES["untagged"]
+        splitter, events = stream(response, 5)
+        self.assertEqual(events, [])
+        self.assertEqual(splitter.result(), (NO_THINKING, response))
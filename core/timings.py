@@ -0,0 +1,63 @@
+import threading
+import time
+from collections import defaultdict, deque
+from contextlib import contextmanager
+from typing import Dict, Optional
+
+import numpy as np
+
+# Questions kept per stage for the percentiles in stats()
+TIMING_WINDOW = 1000
+
+
+@contextmanager
+def timed(timings: Optional[Dict], stage: str):
+    """Add the block's wall time in ms to timings[stage] (no-op when timings is None)"""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        if timings is not None:
+            timings[stage] = round(timings.get(stage, 0.0) + (time.perf_counter() - start) * 1000, 1)
+
+
+class StageTimings:
+    """Recent per-question stage timings (ms) and counts of other string-valued outcomes"""
+
+    def __init__(self):
+        self.samples = defaultdict(lambda: deque(maxlen=TIMING_WINDOW))
+        self.outcomes = defaultdict(int)
+        self._lock = threading.Lock()
+
+    def record(self, timings: Dict):
+        with self._lock:
+            for stage, value in timings.items():
+                if isinstance(value, str):
+                    self.outcomes[f"{stage}:{value}"] += 1
+                elif stage.endswith("_ms"):
+                    self.samples[stage].append(value)
+
+    def stats(self) -> Dict:
+        with self._lock:
+            stages = {}
+            for stage, values in self.samples.items():
+                values = np.array(values)
+                stages[stage] = {
+                    "count": len(values),
+                    "mean_ms": round(float(values.mean()), 1),
+                    "p50_ms": round(float(np.percentile(values, 50)), 1),
+                    "p95_ms": round(float(np.percentile(values, 95)), 1),
+                }
+            return {"stages": stages, "outcomes": dict(self.outcomes)}
+
+
+_stage_timings: Optional[StageTimings] = None
+_stage_timings_lock = threading.Lock()
+
+
+def get_stage_timings() -> StageTimings:
+    global _stage_timings
+    with _stage_timings_lock:
+        if _stage_timings is None:
+            _stage_timings = StageTimings()
+        return _stage_timings
@@ -0,0 +1,104 @@
+import os
+from typing import Optional
+
+import faiss
+from django.conf import settings
+from langchain_community.vectorstores import FAISS
+
+from .embeddings import check_embedding_identity, write_embedding_identity
+from .columnar_docstore import ColumnarDocstore, index_documents, is_columnar_docstore, write_columnar_docstore
+from .lexical_index import build_lexical_index, has_lexical_index, load_lexical_index
+from .mmap_store import (
+    FORMAT_FILE, FORMAT_VERSION, NORMS_FILE, VECTORS_FILE, PositionIds, is_mmap_store, load_mmap_store,
+    mmap_store_version, save_mmap_store
+)
+
+FAISS_INDEX_FILE = "index.faiss"
+# Pickled InMemoryDocstore written by LangChain's save_local (stores from before the columnar docstore)
+FAISS_PICKLE_FILE = "index.pkl"
+FAISS_FILES = (FAISS_INDEX_FILE, FAISS_PICKLE_FILE)
+
+
+def save_vector_store(vectorstore: FAISS, store_path, store_format: Optional[str] = None):
+    """Persist a store in store_format, by default settings.VECTORSTORE_FORMAT.
+
+    Both formats keep documents in the columnar docstore, with a BM25 index
+    of the chunk texts alongside for hybrid retrieval and a record of the
+    embedding backend that produced the vectors. Files of the other
+    format are removed so a rebuilt store is never shadowed by a stale copy.
+    """
+    store_format = store_format or settings.VECTORSTORE_FORMAT
+    documents = index_documents(vectorstore)
+    os.makedirs(store_path, exist_ok=True)
+    write_embedding_identity(store_path, vectorstore.embedding_function)
+    build_lexical_index(store_path, [doc.page_content for doc in documents])
+    if store_format == "mmap":
+        save_mmap_store(vectorstore, store_path, documents)
+        stale_files = FAISS_FILES
+    else:
+        index = vectorstore.index
+        if not isinstance(index, faiss.Index):
+            # A memory-mapped store being written back out as a faiss index
+            index = faiss.IndexFlatL2(index.d)
+            index.add(vectorstore.index.reconstruct_n(0, vectorstore.index.ntotal))
+        index_path = os.path.join(store_path, FAISS_INDEX_FILE)
+        faiss.write_index(index, index_path + ".tmp")
+        write_columnar_docstore(store_path, documents)
+        os.replace(index_path + ".tmp", index_path)
+        stale_files = (FAISS_PICKLE_FILE, FORMAT_FILE, VECTORS_FILE, NORMS_FILE)
+    for name in stale_files:
+        path = os.path.join(store_path, name)
+        if os.path.exists(path):
+            os.remove(path)
+
+
+def load_vector_store(store_path, embedding_model) -> FAISS:
+    """Open a store in whichever format it was saved in.
+
+    The store's BM25 index is attached as vectorstore.lexical_index (None for
+    stores saved before it existed) so it is cached together with the store,
+    and the store's directory name as vectorstore.store_id.
+    Raises EmbeddingMismatchError if embedding_model is not the backend that
+    built the store, since its query vectors would be meaningless there.
+    Loaded stores are shared through the store cache and treated as
+    read-only: nothing calls add/delete on them (the library builds its own
+    in-memory docstore), and the saved docstores raise ReadOnlyDocstoreError
+    if asked to delete. Changes are made by rebuilding and saving the store.
+    """
+    check_embedding_identity(store_path, embedding_model)
+    if is_mmap_store(store_path):
+        vectorstore = load_mmap_store(store_path, embedding_model)
+    elif is_columnar_docstore(store_path):
+        index = faiss.read_index(os.path.join(store_path, FAISS_INDEX_FILE))
+        vectorstore = FAISS(embedding_model, index, ColumnarDocstore(store_path), PositionIds(index.ntotal))
+    else:
+        vectorstore = FAISS.load_local(
+            store_path,
+            embedding_model,
+            allow_dangerous_deserialization=True
+        )
+    vectorstore.lexical_index = load_lexical_index(store_path)
+    # Stable per-store key for the query cache (the sharded directory name)
+    vectorstore.store_id = os.path.basename(os.path.normpath(store_path))
+    return vectorstore
+
+
+def is_current_format(store_path, store_format: str) -> bool:
+    if not has_lexical_index(store_path):
+        return False
+    if store_format == "mmap":
+        return is_mmap_store(store_path) and mmap_store_version(store_path) == FORMAT_VERSION
+    return not is_mmap_store(store_path) and is_columnar_docstore(store_path)
+
+
+def convert_vector_store(store_path, embedding_model, store_format: str) -> Optional[int]:
+    """Rewrite an existing store in place in store_format with the columnar docstore and BM25 index.
+
+    Returns the vector count, or None if the store was already in that format.
+    Only stored vectors are read; the embedding API is never called.
+    """
+    if is_current_format(store_path, store_format):
+        return None
+    vectorstore = load_vector_store(store_path, embedding_model)
+    save_vector_store(vectorstore, store_path, store_format)
+    return vectorstore.index.ntotal
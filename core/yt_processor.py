@@ -3,26 +3,52 @@ import re
 import json
 import hashlib
 import logging
-from typing import List, Dict, Optional, Union
+from bisect import bisect_left, bisect_right
+from typing import Callable, List, Dict, Optional, Union
 from yt_dlp import YoutubeDL
 from youtube_transcript_api import YouTubeTranscriptApi
 from youtube_transcript_api._errors import TranscriptsDisabled, NoTranscriptFound
 from langchain.schema import Document
-from langchain.text_splitter import RecursiveCharacterTextSplitter
-from langchain_google_genai import GoogleGenerativeAIEmbeddings
 from langchain_community.vectorstores import FAISS
 import google.generativeai as genai
-import requests
+from .embedding_cache import get_embedding_cache
+from .embeddings import get_embedding_backend
+from .embedding_scheduler import get_embedding_scheduler
+from .llm_router import get_llm_router
+from .streaming import SectionSplitter, split_sections
+from .timings import get_stage_timings, timed
+from .context import assemble_context, context_hash
+from .chunking import OffsetTextSplitter, CleanedText
+from .store_cache import get_store_cache
+from .quantized_index import compress_vector_store
+from .retrieval import retrieve_documents
+from .store_registry import get_store_path, persist_vector_store
+from .vector_store import load_vector_store
 
 # Disable yt-dlp logger to suppress ffmpeg warnings
 logging.getLogger('yt_dlp').setLevel(logging.ERROR)
 
+
+def video_reference(doc: Document) -> Dict:
+    """Reference to a transcript chunk as returned alongside answers"""
+    return {
+        "source": doc.metadata["source"],
+        "thumbnail": doc.metadata["thumbnail"],
+        "chunk_id": doc.metadata["chunk_id"],
+        "timestamp": doc.metadata["timestamp"],
+        "text": doc.page_content,
+        "preview": doc.metadata["preview"],
+        "video_title": doc.metadata.get("video_title", "Unknown"),
+        "language": doc.metadata.get("language", "en")
+    }
+
+
 class YouTubeProcessor:
     def __init__(self):
         self.groq_api_key = os.getenv("GROQ_API_KEY")
-        self.groq_model = "deepseek-r1-distill-llama-70b"
         genai.configure(api_key=os.getenv("GOOGLE_API_KEY"))
-        self.embedding_model = GoogleGenerativeAIEmbeddings(model="models/embedding-001")
+        self.embedding_model = get_embedding_backend()
+        self.embedding_model_name = self.embedding_model.name
         self.supported_languages = ['en', 'hi']  # English and Hindi (English first)
 
     @staticmethod
@@ -139,26 +165,31 @@ class YouTubeProcessor:
         
         # Process transcript into chunks with metadata
         full_text = " ".join([entry['text'] for entry in transcript])
-        text_splitter = RecursiveCharacterTextSplitter(chunk_size=800, chunk_overlap=200)
-        text_chunks = text_splitter.split_text(self.clean_text(full_text))
-        
+        video_hash = self.generate_text_hash(full_text)
+        cleaned = CleanedText(full_text)
+        text_chunks = OffsetTextSplitter().split_text_with_offsets(cleaned.text)
+
+        # Character range of every transcript entry in full_text (+1 for the joining space)
+        entry_starts = []
+        entry_ends = []
+        current_pos = 0
+        for entry in transcript:
+            entry_starts.append(current_pos)
+            current_pos += len(entry['text']) + 1
+            entry_ends.append(current_pos)
+
         chunks = []
-        for chunk_num, chunk_text in enumerate(text_chunks, start=1):
+        for chunk_num, (chunk_text, clean_start, clean_end) in enumerate(text_chunks, start=1):
             # Map chunk to timestamp range
-            start_pos = full_text.find(chunk_text)
-            end_pos = start_pos + len(chunk_text)
-            
+            start_pos = cleaned.source_offset(clean_start)
+            end_pos = cleaned.source_offset(clean_end)
+
             start_time = 0
             end_time = 0
-            current_pos = 0
-            matched_entries = []
-            
-            for entry in transcript:
-                entry_end = current_pos + len(entry['text']) + 1  # +1 for space
-                if current_pos <= end_pos and entry_end >= start_pos:
-                    matched_entries.append(entry)
-                current_pos = entry_end
-            
+            first_entry = bisect_left(entry_ends, start_pos)
+            last_entry = bisect_right(entry_starts, end_pos) - 1
+            matched_entries = transcript[first_entry:last_entry + 1]
+
             if matched_entries:
                 start_time = matched_entries[0]['start']
                 end_time = matched_entries[-1]['start'] + matched_entries[-1]['duration']
@@ -174,9 +205,14 @@ class YouTubeProcessor:
                         "end": end_time,
                         "length": end_time - start_time
                     },
+                    "position": {
+                        "start": start_pos,
+                        "end": end_pos,
+                        "length": end_pos - start_pos
+                    },
                     "preview": chunk_text[:50] + ("..." if len(chunk_text) > 50 else ""),
                     "text_hash": self.generate_text_hash(chunk_text),
-                    "video_hash": self.generate_text_hash(full_text),
+                    "video_hash": video_hash,
                     "video_title": video_info.get('title', 'Unknown'),
                     "video_id": video_id,
                     "language": transcript_lang  # Add language metadata
@@ -189,56 +225,50 @@ class YouTubeProcessor:
     def create_vector_store(self, chunks: List[Document], store_name: str) -> FAISS:
         """Create and save FAISS vector store from document chunks"""
         print("Creating embeddings and vector store...")
-        vectorstore = FAISS.from_documents(chunks, self.embedding_model)
+        texts = [chunk.page_content for chunk in chunks]
+        embeddings = get_embedding_cache().embed_documents(
+            texts,
+            get_embedding_scheduler(self.embedding_model),
+            self.embedding_model_name
+        )
+        vectorstore = FAISS.from_embeddings(
+            list(zip(texts, embeddings)),
+            self.embedding_model,
+            metadatas=[chunk.metadata for chunk in chunks]
+        )
         print(f"Vector store created with {vectorstore.index.ntotal} embeddings")
+        vectorstore = compress_vector_store(vectorstore)
         
-        # Save to specified path
-        store_path = os.path.join("vectorstores", store_name)
-        vectorstore.save_local(store_path)
+        # Save to the store's registry directory
+        store_path = persist_vector_store(vectorstore, store_name)
         print(f"Vector store saved at {store_path}")
         return vectorstore
 
+    def get_store_path(self, store_name: str) -> str:
+        return get_store_path(store_name)
+
     def load_vector_store(self, store_name: str) -> FAISS:
         """Load existing vector store from disk"""
-        store_path = os.path.join("vectorstores", store_name)
-        return FAISS.load_local(
+        store_path = self.get_store_path(store_name)
+        return get_store_cache().get_or_load(
+            store_name,
             store_path,
-            self.embedding_model,
-            allow_dangerous_deserialization=True
+            lambda: load_vector_store(store_path, self.embedding_model)
         )
 
-    def call_groq_llm(self, prompt: str, language: str = 'en') -> str:
-        """Call Groq LLM API with the given prompt"""
-        headers = {
-            "Authorization": f"Bearer {self.groq_api_key}",
-            "Content-Type": "application/json"
-        }
-        
+    def llm_messages(self, prompt: str, language: str = 'en') -> List[Dict]:
         system_message = {
             "en": "You are a helpful AI assistant. Answer questions using the provided context.",
             "hi": "आप एक सहायक AI सहायक हैं। प्रदान किए गए संदर्भ का उपयोग करके प्रश्नों का उत्तर दें।"
         }.get(language, "en")
-        
-        payload = {
-            "model": self.groq_model,
-            "messages": [
-                {
-                    "role": "system", 
-                    "content": system_message
-                },
-                {"role": "user", "content": prompt}
-            ]
-        }
+        return [
+            {"role": "system", "content": system_message},
+            {"role": "user", "content": prompt}
+        ]
 
-        response = requests.post(
-            "https://api.groq.com/openai/v1/chat/completions", 
-            json=payload, 
-            headers=headers
-        )
-        if response.status_code != 200:
-            raise Exception(f"Groq LLM error: {response.status_code} - {response.text}")
-        
-        return response.json()["choices"][0]["message"]["content"]
+    def call_groq_llm(self, prompt: str, language: str = 'en', hedge: bool = False) -> str:
+        """Call the LLM with the given prompt: Groq first, failing over to Gemini (settings.LLM_PROVIDERS)"""
+        return get_llm_router().chat(self.llm_messages(prompt, language), hedge=hedge)
 
     def expand_query_with_llm(self, query: str, language: str = 'en') -> str:
         """Expand short queries for better semantic search"""
@@ -258,23 +288,53 @@ Expanded Version:""",
         }
         
         prompt = prompt_templates.get(language, 'en').format(query=query)
-        return self.call_groq_llm(prompt, language)
+        # Retrieval waits on the expansion, so a slow provider is hedged
+        return self.call_groq_llm(prompt, language, hedge=True)
+
+    def answer_prompt(self, question: str, full_context: str) -> str:
+        return f"""Analyze the question and provide:
+1. Your thinking process (marked with <thinking> tags)
+2. A detailed answer in English based strictly on the context
+3. Key points from each relevant chunk
+4. Include timestamps where this information appears in the video
+
+Question: {question}
+
+Context:
+{full_context}
+
+IMPORTANT: Your answer must be in English, even if the context is in another language.
 
-    def answer_question(self, vectorstore: FAISS, question: str) -> Dict:
+Format your response as:
+<thinking>Your analytical process here</thinking>
+<answer>Your structured answer in English here</answer>"""
+
+    def answer_question(self, vectorstore: FAISS, question: str, k: Optional[int] = None,
+                        fetch_k: Optional[int] = None, lambda_mult: Optional[float] = None,
+                        lookup_answer: Optional[Callable[[str, Optional[str]], Optional[Dict]]] = None) -> Dict:
         """Answer question using vector store context. Always returns answer in English."""
         # Detect language of the question (but we'll always answer in English)
         question_lang = 'hi' if any('\u0900' <= char <= '\u097F' for char in question) else 'en'
         
-        # Step 1: Expand the query (can be in original language)
-        expanded_query = self.expand_query_with_llm(question, question_lang)
-        
-        # Step 2: Semantic search on expanded query
-        similar_docs = vectorstore.max_marginal_relevance_search(
-            query=expanded_query, 
-            k=5, 
-            fetch_k=25
+        # Step 1: Retrieve context, expanding the query (in its original language) when needed
+        timings = {}
+        similar_docs, expanded_query = retrieve_documents(
+            vectorstore,
+            question,
+            lambda query: self.expand_query_with_llm(query, question_lang),
+            k=k,
+            fetch_k=fetch_k,
+            lambda_mult=lambda_mult,
+            language=question_lang,
+            timings=timings
         )
+        return self.answer_from_documents(question, similar_docs, expanded_query, lookup_answer, timings)
 
+    def answer_from_documents(self, question: str, similar_docs: List[Document], expanded_query: str,
+                              lookup_answer: Optional[Callable[[str, Optional[str]], Optional[Dict]]] = None,
+                              timings: Optional[Dict] = None) -> Dict:
+        """The LLM half of answer_question, for chunks already retrieved (also used by answer_batch)"""
+        timings = {} if timings is None else timings
         if not similar_docs:
             return {
                 "answer": "No relevant context found in the video.",
@@ -283,70 +343,107 @@ Expanded Version:""",
             }
 
         # Prepare context for LLM (can be in any language)
-        full_context = "\n\n".join([doc.page_content for doc in similar_docs])
+        full_context = assemble_context(similar_docs)
+        # Reuse an earlier answer generated from this exact context for a similar question
+        if lookup_answer is not None:
+            cached = lookup_answer(context_hash(full_context), expanded_query)
+            if cached is not None:
+                return cached
         context_lang = similar_docs[0].metadata.get('language', 'en')
 
         # Generate answer - always in English regardless of context language
-        prompt_template = """Analyze the question and provide:
-1. Your thinking process (marked with <thinking> tags)
-2. A detailed answer in English based strictly on the context
-3. Key points from each relevant chunk
-4. Include timestamps where this information appears in the video
-
-Question: {question}
-
-Context:
-{context}
-
-IMPORTANT: Your answer must be in English, even if the context is in another language.
-
-Format your response as:
-<thinking>Your analytical process here</thinking>
-<answer>Your structured answer in English here</answer>"""
-        
-        prompt = prompt_template.format(
-            question=question,
-            context=full_context
-        )
+        prompt = self.answer_prompt(question, full_context)
         
         # Force English response by setting language to 'en'
-        llm_response = self.call_groq_llm(prompt, 'en')
+        with timed(timings, "answer_ms"):
+            llm_response = self.call_groq_llm(prompt, 'en')
         
         # Extract thinking and answer parts
-        thinking_process = ""
-        answer = ""
-        try:
-            thinking_process = llm_response.split("<thinking>")[1].split("</thinking>")[0].strip()
-            answer = llm_response.split("<answer>")[1].split("</answer>")[0].strip()
-        except:
-            thinking_process = "The model did not provide a separate thinking process."
-            answer = llm_response
+        thinking_process, answer = split_sections(llm_response)
 
+        get_stage_timings().record(timings)
         return {
             "question": question,
             "expanded_query": expanded_query,
             "thinking_process": thinking_process,
             "answer": answer,
-            "references": [
-                {
-                    "source": doc.metadata["source"],
-                    "thumbnail": doc.metadata["thumbnail"],
-                    "chunk_id": doc.metadata["chunk_id"],
-                    "timestamp": doc.metadata["timestamp"],
-                    "text": doc.page_content,
-                    "preview": doc.metadata["preview"],
-                    "video_title": doc.metadata.get("video_title", "Unknown"),
-                    "language": doc.metadata.get("language", "en")
-                } for doc in similar_docs
-            ],
-            "context_hash": self.generate_text_hash(full_context),
-            "language": "en"  # Always return English as the response language
-    }
+            "references": [video_reference(doc) for doc in similar_docs],
+            "context_hash": context_hash(full_context),
+            "language": "en",  # Always return English as the response language
+            "timings": timings
+        }
 
-    def process_video(self, video_url: str, store_name: str) -> Dict:
-        """Full processing pipeline for a YouTube video"""
+    def stream_answer(self, vectorstore: FAISS, question: str, k: Optional[int] = None,
+                      fetch_k: Optional[int] = None, lambda_mult: Optional[float] = None,
+                      lookup_answer: Optional[Callable[[str, Optional[str]], Optional[Dict]]] = None):
+        """answer_question as a stream of (event, data) pairs: "references", then "thinking"/"answer" text, then "done" """
+        question_lang = 'hi' if any('\u0900' <= char <= '\u097F' for char in question) else 'en'
+        timings = {}
+        similar_docs, expanded_query = retrieve_documents(
+            vectorstore,
+            question,
+            lambda query: self.expand_query_with_llm(query, question_lang),
+            k=k,
+            fetch_k=fetch_k,
+            lambda_mult=lambda_mult,
+            language=question_lang,
+            timings=timings
+        )
+        references = [video_reference(doc) for doc in similar_docs]
+        yield "references", {"question": question, "expanded_query": expanded_query, "references": references}
+
+        if not similar_docs:
+            yield "done", {
+                "answer": "No relevant context found in the video.",
+                "references": [],
+                "thinking_process": ""
+            }
+            return
+
+        full_context = assemble_context(similar_docs)
+        if lookup_answer is not None:
+            cached = lookup_answer(context_hash(full_context), expanded_query)
+            if cached is not None:
+                if cached.get("thinking_process"):
+                    yield "thinking", cached["thinking_process"]
+                yield "answer", cached["answer"]
+                yield "done", cached
+                return
+        splitter = SectionSplitter()
+        with timed(timings, "answer_ms"):
+            for delta in get_llm_router().chat_stream(
+                self.llm_messages(self.answer_prompt(question, full_context), 'en')
+            ):
+                yield from splitter.feed(delta)
+            yield from splitter.close()
+
+        # Extract thinking and answer parts
+        thinking_process, answer = split_sections(llm_response)
+        get_stage_timings().record(timings)
+
+        yield "done", {
+            "question": question,
+            "expanded_query": expanded_query,
+            "thinking_process": thinking_process,
+            "answer": answer,
+            "references": references,
+            "context_hash": context_hash(full_context),
+            "language": "en",
+            "timings": timings
+        }
+
+    def process_video(self, video_url: str, store_name: str, progress=None) -> Dict:
+        """Full processing pipeline for a YouTube video.
+
+        progress, if given, is called with keyword counters (chunks_total,
+        chunks_embedded) after each stage.
+        """
         chunks = self.load_youtube_transcript(video_url)
+        if progress:
+            progress(chunks_total=len(chunks))
         vectorstore = self.create_vector_store(chunks, store_name)
+        if progress:
+            progress(chunks_embedded=len(chunks))
         video_info = self.get_youtube_video_info(video_url)
         
         return {
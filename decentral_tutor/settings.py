@@ -93,6 +93,12 @@ DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
+        'OPTIONS': {
+            # Wait for a concurrent writer instead of failing with "database is locked",
+            # and take the write lock when a transaction starts so it can't deadlock on upgrade
+            'timeout': 20,
+            'transaction_mode': 'IMMEDIATE',
+        },
     }
 }
 
@@ -178,6 +184,151 @@ CORS_ALLOW_CREDENTIALS = True
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'uploads')
 
-# Create vectorstores directory
-VECTORSTORES_DIR = os.path.join(BASE_DIR, 'vectorstores')
-os.makedirs(VECTORSTORES_DIR, exist_ok=True)
\ No newline at end of file
+# Create vectorstores directory. Stores live in hash-sharded subdirectories
+# (ab/cd/<sha256 of the store name>); move older flat stores with `manage.py migrate_vectorstores`
+VECTORSTORES_DIR = os.getenv("VECTORSTORES_DIR", os.path.join(BASE_DIR, 'vectorstores'))
+os.makedirs(VECTORSTORES_DIR, exist_ok=True)
+
+# PDF ingestion
+# Number of processes used to parse and chunk large PDFs (1 disables the pool).
+# Defaults to the CPUs this process may run on; more workers than cores only adds start-up cost
+PDF_INGEST_WORKERS = int(os.getenv(
+    "PDF_INGEST_WORKERS",
+    len(os.sched_getaffinity(0)) if hasattr(os, "sched_getaffinity") else os.cpu_count() or 1
+))
+# Smaller documents are chunked in-process. A spawned page worker takes ~0.75s to
+# start (interpreter, pypdf, opening the PDF) against ~20ms to parse a page, so two
+# workers only break even past ~70 pages
+PDF_PARALLEL_MIN_PAGES = int(os.getenv("PDF_PARALLEL_MIN_PAGES", 100))
+# Uploads at least this large are embedded page by page instead of all at once
+PDF_STREAMING_MIN_BYTES = int(os.getenv("PDF_STREAMING_MIN_BYTES", 20 * 1024 * 1024))
+# Chunks embedded and added to the index per step of the streaming path
+PDF_STREAMING_BATCH_SIZE = int(os.getenv("PDF_STREAMING_BATCH_SIZE", 64))
+# An upload building a shared store holds a claim on it for this long, renewed every
+# third of it while the build runs; uploads of the same file poll for the claim to clear
+PDF_BUILD_LEASE_SECONDS = int(os.getenv("PDF_BUILD_LEASE_SECONDS", 120))
+PDF_BUILD_POLL_INTERVAL = float(os.getenv("PDF_BUILD_POLL_INTERVAL", 2))
+
+# Embeddings
+# Backend for chunk and query embeddings: "google" (Gemini API), "local"
+# (sentence-transformers on CPU, optional dependency) or "hashing" (deterministic,
+# offline; for tests and benchmarks). Stores record their backend and refuse others.
+EMBEDDING_BACKEND = os.getenv("EMBEDDING_BACKEND", "google")
+# Model for the google/local backends (defaults: models/embedding-001, all-MiniLM-L6-v2)
+EMBEDDING_MODEL = os.getenv("EMBEDDING_MODEL", "")
+EMBEDDING_LOCAL_DEVICE = os.getenv("EMBEDDING_LOCAL_DEVICE", "cpu")
+# Texts per forward pass of the local model
+EMBEDDING_LOCAL_BATCH_SIZE = int(os.getenv("EMBEDDING_LOCAL_BATCH_SIZE", 64))
+EMBEDDING_HASHING_DIMENSION = int(os.getenv("EMBEDDING_HASHING_DIMENSION", 384))
+# SQLite file caching chunk embeddings by content hash and embedding model
+EMBEDDING_CACHE_PATH = os.getenv("EMBEDDING_CACHE_PATH", os.path.join(BASE_DIR, 'embedding_cache.sqlite3'))
+# Texts per embedding API request
+EMBEDDING_BATCH_SIZE = int(os.getenv("EMBEDDING_BATCH_SIZE", 100))
+# Embedding requests in flight at once per upload
+EMBEDDING_MAX_CONCURRENCY = int(os.getenv("EMBEDDING_MAX_CONCURRENCY", 4))
+# Process-wide budget shared by all uploads
+EMBEDDING_REQUESTS_PER_MINUTE = int(os.getenv("EMBEDDING_REQUESTS_PER_MINUTE", 600))
+# Rate-limited batches are retried this many times before the upload fails
+EMBEDDING_MAX_RETRIES = int(os.getenv("EMBEDDING_MAX_RETRIES", 8))
+
+# Background ingestion jobs (queued in the database, no broker)
+# Threads per process running queued PDF/YouTube ingestion
+INGESTION_WORKERS = int(os.getenv("INGESTION_WORKERS", 2))
+# Jobs left queued or running by a stopped process (and leases that expired) are
+# picked up by the worker: run `python manage.py process_ingestion_jobs` next to the web server.
+# Also hand new jobs to the web process's own pool as soon as they are queued;
+# set to False when the worker should run every job
+INGESTION_RUN_IN_PROCESS = os.getenv("INGESTION_RUN_IN_PROCESS", "true").lower() == "true"
+# Poll the queue from each web process too (started by wsgi.py/asgi.py). Off by
+# default: every server process imports the WSGI module, so each would start a poller
+INGESTION_START_POLLER = os.getenv("INGESTION_START_POLLER", "false").lower() == "true"
+# A running job whose worker hasn't renewed its lease for this long is requeued
+INGESTION_LEASE_SECONDS = int(os.getenv("INGESTION_LEASE_SECONDS", 120))
+# Seconds between polls of the job table by the in-process poller
+INGESTION_POLL_INTERVAL = float(os.getenv("INGESTION_POLL_INTERVAL", 5))
+
+# Loaded vector stores kept in memory per process for repeat questions
+VECTORSTORE_CACHE_MAX_BYTES = int(os.getenv("VECTORSTORE_CACHE_MAX_BYTES", 512 * 1024 * 1024))
+# On-disk format for new stores: "faiss" (faiss index file) or "mmap" (shared across
+# workers via the page cache). Both keep chunks in a columnar docstore instead of a
+# pickle; rewrite older stores with `manage.py convert_vectorstores`.
+VECTORSTORE_FORMAT = os.getenv("VECTORSTORE_FORMAT", "faiss")
+# Index used for new faiss-format stores: "flat" (exact float32), "fp16", "sq8"
+# (scalar-quantized), "ivfpq", or "auto" (flat below VECTORSTORE_QUANTIZE_MIN_CHUNKS).
+# Compare them with `manage.py benchmark_index`.
+VECTORSTORE_INDEX_TYPE = os.getenv("VECTORSTORE_INDEX_TYPE", "auto")
+VECTORSTORE_QUANTIZE_MIN_CHUNKS = int(os.getenv("VECTORSTORE_QUANTIZE_MIN_CHUNKS", 20000))
+# Compressed index chosen by "auto" for large stores
+VECTORSTORE_QUANTIZED_INDEX_TYPE = os.getenv("VECTORSTORE_QUANTIZED_INDEX_TYPE", "sq8")
+# IVF lists scanned per query (higher is slower and more accurate)
+VECTORSTORE_IVF_NPROBE = int(os.getenv("VECTORSTORE_IVF_NPROBE", 16))
+
+# Retrieval for answers: "hybrid" fuses BM25 and vector rankings (reciprocal rank
+# fusion) for stores with a BM25 index; "vector" is MMR search only
+RETRIEVAL_MODE = os.getenv("RETRIEVAL_MODE", "hybrid")
+# Chunks passed to the LLM and nearest-neighbour candidates they are picked from
+RETRIEVAL_K = int(os.getenv("RETRIEVAL_K", 5))
+RETRIEVAL_FETCH_K = int(os.getenv("RETRIEVAL_FETCH_K", 25))
+# Upper limits for the k / fetch_k a question request may ask for
+RETRIEVAL_MAX_K = int(os.getenv("RETRIEVAL_MAX_K", 20))
+RETRIEVAL_MAX_FETCH_K = int(os.getenv("RETRIEVAL_MAX_FETCH_K", 200))
+# MMR relevance/diversity trade-off for vector and hybrid search (1 = relevance only,
+# which in hybrid mode keeps the plain fusion order)
+RETRIEVAL_MMR_LAMBDA = float(os.getenv("RETRIEVAL_MMR_LAMBDA", 0.5))
+# Estimated tokens of retrieved text sent to the LLM per question, after overlapping
+# chunks are merged (about 4 characters per token)
+CONTEXT_TOKEN_BUDGET = int(os.getenv("CONTEXT_TOKEN_BUDGET", 3000))
+# Rank offset in reciprocal rank fusion; higher flattens the difference between ranks
+RETRIEVAL_RRF_K = int(os.getenv("RETRIEVAL_RRF_K", 60))
+# LLM query expansion before retrieval: "always", "never", "auto" (hybrid mode
+# only expands questions sharing no content terms with the store), or "speculative" (search
+# with the raw question while expansion runs; wait for it only below the threshold)
+QUERY_EXPANSION = os.getenv("QUERY_EXPANSION", "auto")
+# Cosine similarity of the raw question's nearest chunk above which "speculative"
+# skips the expansion
+RETRIEVAL_CONFIDENCE_THRESHOLD = float(os.getenv("RETRIEVAL_CONFIDENCE_THRESHOLD", 0.75))
+# Threads per process running speculative expansions
+RETRIEVAL_EXPANSION_WORKERS = int(os.getenv("RETRIEVAL_EXPANSION_WORKERS", 8))
+# Query expansions and query embeddings reused for repeated questions (normalized
+# text, language and store); entries expire after the TTL, least recently used first
+QUERY_CACHE_MAX_ENTRIES = int(os.getenv("QUERY_CACHE_MAX_ENTRIES", 10000))
+QUERY_CACHE_TTL_SECONDS = int(os.getenv("QUERY_CACHE_TTL_SECONDS", 24 * 60 * 60))
+# SQLite file shared by all worker processes; empty keeps the cache in-process only
+QUERY_CACHE_PATH = os.getenv("QUERY_CACHE_PATH", "")
+
+# LLM calls (chat completions, OpenAI-compatible; point at a stub server for tests)
+LLM_API_BASE = os.getenv("LLM_API_BASE", "https://api.groq.com/openai/v1")
+# Seconds to open a connection / to wait for the completion
+LLM_CONNECT_TIMEOUT = float(os.getenv("LLM_CONNECT_TIMEOUT", 5))
+LLM_READ_TIMEOUT = float(os.getenv("LLM_READ_TIMEOUT", 120))
+# Retries on 429/5xx and dropped connections, with jittered exponential backoff
+LLM_MAX_RETRIES = int(os.getenv("LLM_MAX_RETRIES", 3))
+# Keep-alive connections held open to the API per process
+LLM_POOL_SIZE = int(os.getenv("LLM_POOL_SIZE", 10))
+# Providers for Q&A calls in order of preference; later ones are failed over to when
+# a call fails or a provider's circuit is open (groq, gemini)
+LLM_PROVIDERS = os.getenv("LLM_PROVIDERS", "groq,gemini")
+LLM_GROQ_MODEL = os.getenv("LLM_GROQ_MODEL", "deepseek-r1-distill-llama-70b")
+LLM_GEMINI_MODEL = os.getenv("LLM_GEMINI_MODEL", "gemini-2.5-flash")
+# Consecutive failures that open a provider's circuit, and seconds before it is retried
+LLM_CIRCUIT_FAILURES = int(os.getenv("LLM_CIRCUIT_FAILURES", 5))
+LLM_CIRCUIT_COOLDOWN_SECONDS = float(os.getenv("LLM_CIRCUIT_COOLDOWN_SECONDS", 30))
+# Hedged calls (query expansion) go to the next provider too once the first has taken
+# its recent p95 latency, bounded by these; the default applies until enough samples
+LLM_HEDGE_MIN_MS = float(os.getenv("LLM_HEDGE_MIN_MS", 500))
+LLM_HEDGE_MAX_MS = float(os.getenv("LLM_HEDGE_MAX_MS", 10000))
+LLM_HEDGE_DEFAULT_MS = float(os.getenv("LLM_HEDGE_DEFAULT_MS", 3000))
+# Threads per process running hedged calls
+LLM_HEDGE_WORKERS = int(os.getenv("LLM_HEDGE_WORKERS", 16))
+
+# Batch question endpoints: questions per request, and answer LLM calls in flight per request
+BATCH_QA_MAX_QUESTIONS = int(os.getenv("BATCH_QA_MAX_QUESTIONS", 50))
+BATCH_QA_CONCURRENCY = int(os.getenv("BATCH_QA_CONCURRENCY", 4))
+
+# Semantic answer cache: a question is answered from an earlier conversation on the
+# same document when retrieval returns the same context and the questions' embeddings
+# are at least this cosine-similar. Requests can skip it with bypass_cache=true.
+ANSWER_CACHE_ENABLED = os.getenv("ANSWER_CACHE_ENABLED", "true").lower() == "true"
+ANSWER_CACHE_SIMILARITY = float(os.getenv("ANSWER_CACHE_SIMILARITY", 0.92))
+# Most recent matching conversations compared per question
+ANSWER_CACHE_MAX_CANDIDATES = int(os.getenv("ANSWER_CACHE_MAX_CANDIDATES", 200))
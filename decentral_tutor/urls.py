@@ -3,7 +3,8 @@ from django.urls import path, include
 from core.api import FirebaseLoginAPI, DashboardAPI, ChapterAPI, VideoResourcesAPI, WebResourcesAPI, PDFQAAPI, QuestionAnswerAPI, UserPDFListAPI, DeletePDFAPI, PDFConversationHistoryAPI, YouTubeQuestionAPI, YouTubeVideoAPI, YouTubeVideoListAPI, YouTubeVideoDeleteAPI, ChapterGenerationHistoryAPI, ChapterResourcesAPI, DeleteChapterGenerationAPI
 from django.views.generic import TemplateView
 from core.api import get_csrf_token
-from core.api import MultiVideoMCQAPI
+from core.api import MultiVideoMCQAPI, IngestionJobStatusAPI, CacheStatsAPI, LibrarySearchAPI
+from core.api import BatchQuestionAnswerAPI, YouTubeBatchQuestionAPI
 
 urlpatterns = [
     # Existing URLs
@@ -24,6 +25,7 @@ urlpatterns = [
     # PDF-related URLs
     path('api/process-pdf/', PDFQAAPI.as_view(), name='api_process_pdf'),
     path('api/answer-question/', QuestionAnswerAPI.as_view(), name='api_answer_question'),
+    path('api/answer-questions/', BatchQuestionAnswerAPI.as_view(), name='api_answer_questions'),
     path('api/user/pdfs/', UserPDFListAPI.as_view(), name='api_user_pdfs'),
     path('api/user/pdfs/<int:pdf_id>/', DeletePDFAPI.as_view(), name='api_delete_pdf'),
     path('api/user/pdfs/<int:pdf_id>/conversations/', PDFConversationHistoryAPI.as_view(), name='api_pdf_conversations'),
@@ -31,9 +33,19 @@ urlpatterns = [
     # YouTube-related URLs
     path('api/process-youtube/', YouTubeVideoAPI.as_view(), name='api_process_youtube'),
     path('api/ask-youtube-question/', YouTubeQuestionAPI.as_view(), name='api_ask_youtube_question'),
+    path('api/ask-youtube-questions/', YouTubeBatchQuestionAPI.as_view(), name='api_ask_youtube_questions'),
     path('api/user/youtube-videos/', YouTubeVideoListAPI.as_view(), name='api_user_youtube_videos'),
     path('api/user/youtube-videos/<int:video_id>/', YouTubeVideoDeleteAPI.as_view(), name='api_delete_youtube_video'),
     
+    # Cross-document search over a user's PDFs and videos
+    path('api/library/search/', LibrarySearchAPI.as_view(), name='api_library_search'),
+    
+    # Background ingestion jobs
+    path('api/jobs/<uuid:job_id>/', IngestionJobStatusAPI.as_view(), name='api_ingestion_job'),
+    
+    # Operational stats (staff only)
+    path('api/cache-stats/', CacheStatsAPI.as_view(), name='api_cache_stats'),
+    
     # CSRF and frontend
     path('api/csrf/', get_csrf_token, name='api_csrf'),
     path('', TemplateView.as_view(template_name='index.html')),
@@ -14,3 +14,12 @@ from django.core.wsgi import get_wsgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'decentral_tutor.settings')
 
 application = get_wsgi_application()
+
+# Optionally poll the ingestion queue from this process as well (off by default;
+# run `manage.py process_ingestion_jobs` as the worker instead)
+from django.conf import settings  # noqa: E402
+
+if settings.INGESTION_START_POLLER:
+    from core.jobs import start_in_process_worker
+
+    start_in_process_worker()